@@ -1,3 +1,7 @@
+import threading
+from collections import OrderedDict
+
+
 class SmartDict(dict):
     def __getattr__(self, item):
         return self.get(item)
@@ -7,4 +11,42 @@ class SmartDict(dict):
 
     def __delattr__(self, item):
         if item in self:
-            del self[item]
\ No newline at end of file
+            del self[item]
+
+
+class LRUCache(object):
+    """Thread safe bounded cache, least recently used items are dropped first"""
+
+    def __init__(self, maxsize=1024):
+        """Initialization
+
+        :param maxsize: max count of items, 0 - cache is disabled
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -1,14 +1,32 @@
+import logging
+
+
 class InstanceMessage(object):
+    """Message with prefix of instance, it's formatted only by handler"""
+
+    __slots__ = ('instance', 'delimiter', 'message')
 
-    def __init__(self, instance, logger, name, delimiter):
+    def __init__(self, instance, delimiter, message):
         self.instance = instance
-        self.name = name
-        self.logger = logger
         self.delimiter = delimiter
+        self.message = message
+
+    def __str__(self):
+        return '{}{}{}'.format(self.instance, self.delimiter, self.message)
+
 
-    def __call__(self, message, *args, **kwargs):
-        msg = getattr(self.logger, self.name)
-        msg('{}{}{}'.format(self.instance, self.delimiter, message), *args, **kwargs)
+def _level_method(level, exc_info=False):
+    def method(self, message, *args, **kwargs):
+        logger = self.logger
+        if not logger.isEnabledFor(level):
+            return
+        if exc_info:
+            kwargs.setdefault('exc_info', True)
+        logger.log(level, InstanceMessage(self.instance, self.delimiter, message),
+                   *args, **kwargs)
+
+    method.__name__ = logging.getLevelName(level).lower()
+    return method
 
 
 class InstanceLogger(object):
@@ -25,19 +43,29 @@ class InstanceLogger(object):
     you will see:
         'test class - Hello, world!'
 
-    Instance Logger use method __str__
+    Instance Logger use method __str__, only if level is enabled and message is handled
     """
 
-    _message_methods = ('log', 'debug', 'exception', 'info', 'warning',
-                        'error', 'warn', 'fatal', 'critical')
-
     def __init__(self, instance, logger, delimiter=' - '):
         self.instance = instance
         self.logger = logger
         self.delimiter = delimiter
 
-    def __getattr__(self, item):
-        if item in self._message_methods:
-            return InstanceMessage(self.instance, self.logger, item, self.delimiter)
-        else:  # pragma: no cover
-            return getattr(self.logger, item)
\ No newline at end of file
+    debug = _level_method(logging.DEBUG)
+    info = _level_method(logging.INFO)
+    warning = warn = _level_method(logging.WARNING)
+    error = _level_method(logging.ERROR)
+    exception = _level_method(logging.ERROR, exc_info=True)
+    critical = fatal = _level_method(logging.CRITICAL)
+
+    def log(self, level, message, *args, **kwargs):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(
+                level, InstanceMessage(self.instance, self.delimiter, message),
+                *args, **kwargs)
+
+    def isEnabledFor(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def __getattr__(self, item):  # pragma: no cover
+        return getattr(self.logger, item)
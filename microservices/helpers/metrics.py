@@ -0,0 +1,319 @@
+import bisect
+import threading
+
+import six
+from six.moves import BaseHTTPServer, socketserver
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10)
+
+
+class Counter(object):
+    """Monotonic counter"""
+
+    type = 'counter'
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def collect(self):
+        return self.value
+
+
+class Gauge(object):
+    """Current value, function() is called on collecting, if function is set"""
+
+    type = 'gauge'
+
+    def __init__(self, function=None):
+        self.value = 0
+        self.function = function
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def collect(self):
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+
+class Histogram(object):
+    """Distribution of values, ex. latency in seconds"""
+
+    type = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # the last one is +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def collect(self):
+        """:return: dict with count, sum and cumulative buckets [(le, count)]"""
+        with self._lock:
+            counts = list(self.counts)
+            result = {'count': self.count, 'sum': self.sum}
+        buckets = []
+        total = 0
+        for le, count in zip(self.buckets + (float('inf'),), counts):
+            total += count
+            buckets.append((le, total))
+        result['buckets'] = buckets
+        return result
+
+
+class _NullMetric(object):
+    """Metric without collecting"""
+
+    value = 0
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+class NullRegistry(object):
+    """Registry without metrics, every metric is no-op"""
+
+    _metric = _NullMetric()
+
+    def counter(self, name, description='', **labels):
+        return self._metric
+
+    def gauge(self, name, description='', function=None, **labels):
+        return self._metric
+
+    def histogram(self, name, description='', buckets=None, **labels):
+        return self._metric
+
+    def collect(self):
+        return []
+
+
+null_metrics = NullRegistry()
+
+
+class MetricsRegistry(object):
+    """In-process registry of metrics, thread safe
+
+    >>>metrics = MetricsRegistry(prefix='myservice_')
+    >>>requests = metrics.counter('requests_total', 'Count of requests', path='/')
+    >>>requests.inc()
+    >>>metrics.get('requests_total', path='/')
+    1
+
+    Metric with the same name and labels is created once, so it can be got anywhere.
+    metrics.prometheus() - text for Prometheus, metrics.serve(port) - http server for it.
+    """
+
+    def __init__(self, prefix='', buckets=DEFAULT_BUCKETS):
+        """Initialization
+
+        :param prefix: prefix for names of metrics
+        :param buckets: default buckets for histograms
+        """
+        self.prefix = prefix
+        self.buckets = buckets
+        # name: (type, description, {labels: metric})
+        self.families = {}
+        self._lock = threading.Lock()
+
+    def _get(self, metric_class, name, description, labels, **options):
+        name = self.prefix + name
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self.families.get(name)
+            if family is None:
+                family = self.families[name] = (metric_class.type,
+                                                description, {})
+            elif family[0] != metric_class.type:
+                raise ValueError('Metric {} is {}, not {}'.format(
+                    name, family[0], metric_class.type))
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = metric_class(**options)
+            return metric
+
+    def counter(self, name, description='', **labels):
+        """Get or create counter
+
+        :param name: name of metric
+        :param description: help for metric
+        :param labels: labels of metric
+        :return: Counter
+        """
+        return self._get(Counter, name, description, labels)
+
+    def gauge(self, name, description='', function=None, **labels):
+        """Get or create gauge
+
+        :param function: function without params, for value on collecting
+        :return: Gauge
+        """
+        gauge = self._get(Gauge, name, description, labels)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name, description='', buckets=None, **labels):
+        """Get or create histogram
+
+        :param buckets: upper bounds of buckets, default - buckets of registry
+        :return: Histogram
+        """
+        return self._get(Histogram, name, description, labels,
+                         buckets=buckets or self.buckets)
+
+    def get(self, name, **labels):
+        """Collected value of metric, name without prefix
+
+        :return: value, dict for histogram, None if metric is not found
+        """
+        family = self.families.get(self.prefix + name)
+        if family is None:
+            return None
+        metric = family[2].get(tuple(sorted(labels.items())))
+        if metric is None:
+            return None
+        return metric.collect()
+
+    def collect(self):
+        """:return: list of (name, type, description, [(labels, value)])"""
+        with self._lock:
+            families = sorted((name, family[0], family[1], list(family[2].items()))
+                              for name, family in self.families.items())
+        return [
+            (name, metric_type, description,
+             [(dict(labels), metric.collect()) for labels, metric in metrics])
+            for name, metric_type, description, metrics in families
+        ]
+
+    def prometheus(self):
+        """Metrics in Prometheus text format"""
+        return prometheus_text(self.collect())
+
+    def wsgi_app(self, environ, start_response):
+        """WSGI application with metrics in Prometheus text format"""
+        content = self.prometheus().encode('utf8')
+        start_response('200 OK', [
+            ('Content-Type', PROMETHEUS_CONTENT_TYPE),
+            ('Content-Length', str(len(content))),
+        ])
+        return [content]
+
+    def serve(self, port=9100, address=''):
+        """Serve metrics over http in daemon thread, any path
+
+        :param port: port for listen, int, default: 9100
+        :param address: address for listen, str, default: ""
+        :return: http server, server.shutdown() for stop
+        """
+        registry = self
+
+        class Handler(_MetricsHandler):
+            metrics = registry
+
+        server = _MetricsServer((address, port), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    value = float(value)
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    return repr(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, six.text_type(value).replace('\\', r'\\')
+                         .replace('\n', r'\n').replace('"', r'\"'))
+        for name, value in sorted(labels.items())) + '}'
+
+
+def prometheus_text(families):
+    """Format collected metrics in Prometheus text format
+
+    :param families: result of MetricsRegistry.collect()
+    :return: str
+    """
+    lines = []
+    for name, metric_type, description, metrics in families:
+        if description:
+            lines.append('# HELP {} {}'.format(
+                name, description.replace('\\', r'\\').replace('\n', r'\n')))
+        lines.append('# TYPE {} {}'.format(name, metric_type))
+        for labels, value in metrics:
+            if metric_type != 'histogram':
+                lines.append('{}{} {}'.format(name, _format_labels(labels),
+                                              _format_value(value)))
+                continue
+            for le, count in value['buckets']:
+                bucket_labels = dict(labels, le=_format_value(le))
+                lines.append('{}_bucket{} {}'.format(
+                    name, _format_labels(bucket_labels), count))
+            lines.append('{}_sum{} {}'.format(name, _format_labels(labels),
+                                              _format_value(value['sum'])))
+            lines.append('{}_count{} {}'.format(name, _format_labels(labels),
+                                                value['count']))
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    metrics = null_metrics
+
+    def do_GET(self):
+        content = prometheus_text(self.metrics.collect()).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args, **kwargs):
+        pass
+
+
+class _MetricsServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
@@ -0,0 +1,210 @@
+import multiprocessing
+import os
+import signal
+import sys
+from time import sleep, time
+
+from microservices.utils import get_logger
+
+
+def get_context(method='fork'):
+    """Context of multiprocessing with start method
+
+    Children get target and args without pickling only with fork,
+    ex. flask app and listening socket.
+
+    :param method: start method, default - fork
+    :return: multiprocessing context
+    :raise ValueError: if start method is not available on the platform
+    """
+    if not hasattr(multiprocessing, 'get_context'):  # pragma: no cover
+        # python 2, processes are always forked on posix
+        if method != 'fork' or sys.platform == 'win32':
+            raise ValueError('Start method "{}" is not available '
+                             'on this platform'.format(method))
+        return multiprocessing
+    try:
+        return multiprocessing.get_context(method)
+    except ValueError:
+        raise ValueError('Start method "{}" is not available on this '
+                         'platform, use one of: {}'.format(
+                             method, ', '.join(
+                                 multiprocessing.get_all_start_methods())))
+
+
+class PreforkSupervisor(object):
+    """Supervisor of worker processes
+
+    Every child calls target(*args, **kwargs), crashed children are restarted,
+    stop() stops children with SIGTERM, reload() replaces all children with new ones.
+    Children are forked, target and args are not pickled.
+
+    With timeout, target(*args, heartbeat=multiprocessing.Value, **kwargs) is called,
+    child should update heartbeat.value = time.time(), hung children are killed and restarted.
+    """
+
+    def __init__(self, target, args=(), kwargs=None, processes=None,
+                 restart_timeout=1, stop_timeout=30, check_interval=0.5,
+                 timeout=None, logger=None, context='fork'):
+        """Initialization
+
+        :param target: function for child process
+        :param args: params for target
+        :param kwargs: named params for target
+        :param processes: count of processes, default - count of cpu
+        :param restart_timeout: seconds before restart of crashed child, exited with code 0 child is restarted immediately
+        :param stop_timeout: seconds for graceful stop of children, after it children are killed
+        :param check_interval: seconds between checks of children
+        :param timeout: seconds, child without heartbeat is killed, default - None (without heartbeat)
+        :param logger: logging instance
+        :param context: start method of multiprocessing, default - fork
+        :raise ValueError: if start method is not available on the platform
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self.context = get_context(context)
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.processes = processes
+        self.restart_timeout = restart_timeout
+        self.stop_timeout = stop_timeout
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.logger = logger or get_logger(__name__)
+        self.children = [None] * processes
+        self.heartbeats = [None] * processes
+        self.restart_at = [0] * processes
+        self.restarts = 0
+        self.reloads = 0
+        self._stop = False
+        self._stopped = False
+        self._reload = False
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def child_kwargs(self, index):
+        """Named params for target in child with index"""
+        kwargs = dict(self.kwargs)
+        if self.timeout is not None:
+            heartbeat = self.context.Value('d', time())
+            self.heartbeats[index] = kwargs['heartbeat'] = heartbeat
+        return kwargs
+
+    def spawn(self, index):
+        kwargs = self.child_kwargs(index)
+        process = self.context.Process(target=self.target, args=self.args,
+                                       kwargs=kwargs)
+        process.start()
+        self.children[index] = process
+        self.logger.info('Process %s started, pid: %s', index, process.pid)
+
+    def start(self):
+        self._stop = False
+        self._stopped = False
+        for index in range(self.processes):
+            self.spawn(index)
+
+    def hung(self, index):
+        heartbeat = self.heartbeats[index]
+        return self.timeout is not None and heartbeat is not None and \
+            time() - heartbeat.value > self.timeout
+
+    def check(self):
+        """Restart exited children, kill hung children"""
+        for index, process in enumerate(self.children):
+            if self._stop:
+                return
+            if process.is_alive():
+                if not self.hung(index):
+                    continue
+                self.logger.error('Process %s (pid: %s) has no heartbeat for '
+                                  '%s seconds, kill it', index, process.pid,
+                                  self.timeout)
+                self.kill(process)
+            if not self.restart_at[index]:
+                restart_timeout = self.restart_timeout
+                if process.exitcode == 0:
+                    # recycled, ex. after max requests
+                    self.logger.info('Process %s (pid: %s) exited, restart it',
+                                     index, process.pid)
+                    restart_timeout = 0
+                else:
+                    self.logger.error(
+                        'Process %s (pid: %s) exited with code %s, '
+                        'restart after %s seconds', index, process.pid,
+                        process.exitcode, restart_timeout)
+                self.restart_at[index] = time() + restart_timeout
+            if time() >= self.restart_at[index]:
+                self.restart_at[index] = 0
+                self.restarts += 1
+                self.spawn(index)
+
+    def stop(self):
+        self._stop = True
+        self.logger.info('Try to stop processes')
+
+    def reload(self):
+        """Replace children with new ones, old children are stopped gracefully"""
+        self._reload = True
+        self.logger.info('Try to reload processes')
+
+    def kill(self, process):
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+
+    def stop_processes(self, processes):
+        """Stop processes gracefully, kill them after stop_timeout"""
+        processes = [process for process in processes
+                     if process is not None and process.is_alive()]
+        for process in processes:
+            process.terminate()
+        deadline = time() + self.stop_timeout
+        for process in processes:
+            process.join(max(deadline - time(), 0))
+            if process.is_alive():
+                self.logger.error('Process (pid: %s) was not stopped '
+                                  'in %s seconds, kill it', process.pid,
+                                  self.stop_timeout)
+                self.kill(process)
+
+    def do_reload(self):
+        self._reload = False
+        old = list(self.children)
+        for index in range(self.processes):
+            self.spawn(index)
+        self.stop_processes(old)
+        self.reloads += 1
+        self.logger.info('Processes were reloaded')
+
+    def join(self):
+        """Stop all children"""
+        self.stop_processes(self.children)
+        self._stopped = True
+        self.logger.info('Processes were stopped')
+
+    def run(self):
+        """Start children and supervise them until stop()"""
+        self.start()
+        while not self._stop:
+            if self._reload:
+                self.do_reload()
+            self.check()
+            sleep(self.check_interval)
+        self.join()
+
+    def handle_signals(self):
+        """SIGTERM/SIGINT - stop, SIGHUP - reload"""
+
+        def stop(signum, frame):
+            self.stop()
+
+        def reload(signum, frame):
+            self.reload()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, reload)
@@ -0,0 +1,140 @@
+import json
+import threading
+from collections import OrderedDict
+
+import six
+
+
+class JSONSerializer(object):
+    """Serializer via standard json module"""
+
+    name = 'json'
+
+    def __init__(self, default=None):
+        """Initialization
+
+        :param default: function for not serializable objects, ex. flask JSONEncoder().default
+        """
+        self.default = default
+
+    def dumps(self, data, indent=None):
+        """Serialize data to str
+
+        :param data: python object
+        :param indent: int, indent for pretty output, default - None (one line)
+        :return: str
+        """
+        return json.dumps(data, default=self.default, ensure_ascii=False,
+                          indent=indent)
+
+    def dumps_bytes(self, data, indent=None):
+        """Serialize data to utf8 bytes, ready for body of response
+
+        :param data: python object
+        :param indent: int, indent for pretty output, default - None (one line)
+        :return: bytes
+        """
+        content = self.dumps(data, indent=indent)
+        if isinstance(content, six.text_type):
+            content = content.encode('utf8')
+        return content
+
+    def loads(self, content):
+        """Deserialize str or utf8 bytes
+
+        :param content: str or bytes
+        :return: python object
+        """
+        if isinstance(content, (bytes, bytearray)) and not six.PY2:
+            content = content.decode('utf8')
+        return json.loads(content)
+
+
+class OrjsonSerializer(JSONSerializer):
+    """Serializer via orjson, output is the same as for JSONSerializer,
+    except whitespace (without spaces after separators)
+
+    Data, which orjson can't serialize (ex. int > 64 bits, indent != 2),
+    is serialized by standard json module.
+    """
+
+    name = 'orjson'
+
+    def __init__(self, default=None):
+        import orjson
+
+        super(OrjsonSerializer, self).__init__(default=default)
+        self.orjson = orjson
+        self.option = orjson.OPT_NON_STR_KEYS
+        if default is not None:
+            # datetime is formatted by default, like in standard json
+            self.option |= orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, data, indent=None):
+        return self.dumps_bytes(data, indent=indent).decode('utf8')
+
+    def dumps_bytes(self, data, indent=None):
+        if indent not in (None, 2):
+            return self.fallback(data, indent=indent)
+        option = self.option
+        if indent:
+            option |= self.orjson.OPT_INDENT_2
+        try:
+            return self.orjson.dumps(data, default=self.default, option=option)
+        except TypeError:
+            return self.fallback(data, indent=indent)
+
+    def fallback(self, data, indent=None):
+        """Serialize data to bytes via standard json module"""
+        return JSONSerializer.dumps(self, data, indent=indent).encode('utf8')
+
+    def loads(self, content):
+        return self.orjson.loads(content)
+
+
+# name: class, "auto" uses the first installed
+serializers = OrderedDict([
+    ('orjson', OrjsonSerializer),
+    ('json', JSONSerializer),
+])
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_serializer(serializer='json', default=None):
+    """Get serializer instance
+
+    Instances for names are cached, so it's cheap to call it for every response
+
+    :param serializer: name from serializers ("json", "orjson"), "auto" - the fastest installed,
+        class or instance with dumps, dumps_bytes and loads methods, None - "json"
+    :param default: function for not serializable objects
+    :return: serializer instance
+    """
+    if serializer is None:
+        serializer = 'json'
+    if isinstance(serializer, type):
+        return serializer(default=default)
+    if not isinstance(serializer, six.string_types):
+        return serializer
+    key = (serializer, default)
+    instance = _instances.get(key)
+    if instance is not None:
+        return instance
+    if serializer == 'auto':
+        names = list(serializers)
+    elif serializer in serializers:
+        names = [serializer]
+    else:
+        raise ValueError('Unknown serializer: {}, available: {}'.format(
+            serializer, ', '.join(['auto'] + list(serializers))))
+    for name in names:
+        try:
+            instance = serializers[name](default=default)
+            break
+        except ImportError:
+            if serializer != 'auto':
+                raise
+    with _instances_lock:
+        return _instances.setdefault(key, instance)
@@ -21,3 +21,155 @@ class TestSmartDict(TestCase):
         del d['a']
         self.assertEqual(d.a, None)
         self.assertEqual('a' not in d, True)
+
+
+class TestLRUCache(TestCase):
+    def test_lru_cache(self):
+        from microservices.helpers import LRUCache
+
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        cache.clear()
+        self.assertEqual(cache.get('a', 'default'), 'default')
+
+        cache = LRUCache(0)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), None)
+
+
+class TestSerializers(TestCase):
+    def test_serializers(self):
+        import datetime
+        from microservices.helpers.serializers import JSONSerializer, \
+            get_serializer
+
+        data = {'id': 1, 'name': u'тест', 'tags': ['a', 'b'], 'nested': {'ok': True}}
+        serializer = get_serializer('json')
+        self.assertIs(get_serializer('json'), serializer)
+        self.assertEqual(serializer.loads(serializer.dumps_bytes(data)), data)
+        self.assertEqual(serializer.loads(serializer.dumps(data)), data)
+        self.assertIn(u'тест'.encode('utf8'), serializer.dumps_bytes(data))
+        self.assertRaises(ValueError, get_serializer, 'unknown')
+        self.assertIsInstance(get_serializer(JSONSerializer), JSONSerializer)
+
+        when = datetime.datetime(2016, 6, 20, 14, 2, 50)
+
+        def default(value):
+            return value.isoformat()
+
+        for name in ('auto', 'json'):
+            serializer = get_serializer(name, default=default)
+            self.assertEqual(serializer.loads(serializer.dumps_bytes({'when': when})),
+                             {'when': '2016-06-20T14:02:50'})
+            # not supported by orjson
+            self.assertEqual(serializer.loads(serializer.dumps({'big': 2 ** 70})),
+                             {'big': 2 ** 70})
+            self.assertEqual(serializer.dumps([1], indent=4), '[\n    1\n]')
+
+    def test_orjson(self):
+        try:
+            import orjson  # noqa
+        except ImportError:  # pragma: no cover
+            self.skipTest('orjson is not installed')
+        from microservices.helpers.serializers import OrjsonSerializer, \
+            get_serializer
+
+        serializer = get_serializer('orjson')
+        self.assertIsInstance(serializer, OrjsonSerializer)
+        self.assertIsInstance(get_serializer('auto'), OrjsonSerializer)
+        self.assertEqual(serializer.dumps_bytes({1: 'a'}), b'{"1":"a"}')
+        self.assertEqual(serializer.dumps({'a': [1]}, indent=2),
+                         '{\n  "a": [\n    1\n  ]\n}')
+
+
+class TestInstanceLogger(TestCase):
+    def test_instance_logger(self):
+        import logging
+        from microservices.helpers.logs import InstanceLogger
+
+        class Instance(object):
+            calls = 0
+
+            def __str__(self):
+                self.calls += 1
+                return 'instance'
+
+        class Handler(logging.Handler):
+            def __init__(self):
+                super(Handler, self).__init__()
+                self.messages = []
+
+            def emit(self, record):
+                self.messages.append((record.levelno, record.getMessage(),
+                                      record.exc_info is not None))
+
+        handler = Handler()
+        logger = logging.getLogger('test_instance_logger')
+        logger.propagate = False
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        instance = Instance()
+        instance_logger = InstanceLogger(instance, logger)
+
+        instance_logger.debug('skipped %s', 1)
+        self.assertEqual(instance.calls, 0)
+        self.assertEqual(handler.messages, [])
+
+        instance_logger.info('info %s', 1)
+        instance_logger.log(logging.WARNING, 'log %s', 2)
+        try:
+            raise ValueError('tested')
+        except ValueError:
+            instance_logger.exception('error')
+        self.assertEqual(handler.messages, [
+            (logging.INFO, 'instance - info 1', False),
+            (logging.WARNING, 'instance - log 2', False),
+            (logging.ERROR, 'instance - error', True),
+        ])
+        self.assertEqual(instance.calls, 3)
+        self.assertFalse(instance_logger.isEnabledFor(logging.DEBUG))
+
+
+class TestMetrics(TestCase):
+    def test_registry(self):
+        from microservices.helpers.metrics import MetricsRegistry, null_metrics
+
+        metrics = MetricsRegistry(prefix='test_', buckets=(0.1, 1))
+        counter = metrics.counter('requests_total', 'Count of requests', path='/')
+        self.assertIs(metrics.counter('requests_total', path='/'), counter)
+        counter.inc()
+        counter.inc(2)
+        metrics.gauge('depth', function=lambda: 7)
+        histogram = metrics.histogram('latency_seconds', 'Latency')
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+        self.assertEqual(metrics.get('requests_total', path='/'), 3)
+        self.assertEqual(metrics.get('requests_total', path='/missing'), None)
+        self.assertEqual(metrics.get('latency_seconds'), {
+            'count': 3, 'sum': 5.55,
+            'buckets': [(0.1, 1), (1, 2), (float('inf'), 3)]})
+        self.assertRaises(ValueError, metrics.gauge, 'requests_total')
+        self.assertEqual(metrics.prometheus().splitlines(), [
+            '# TYPE test_depth gauge',
+            'test_depth 7.0',
+            '# HELP test_latency_seconds Latency',
+            '# TYPE test_latency_seconds histogram',
+            'test_latency_seconds_bucket{le="0.1"} 1',
+            'test_latency_seconds_bucket{le="1.0"} 2',
+            'test_latency_seconds_bucket{le="+Inf"} 3',
+            'test_latency_seconds_sum 5.55',
+            'test_latency_seconds_count 3',
+            '# HELP test_requests_total Count of requests',
+            '# TYPE test_requests_total counter',
+            'test_requests_total{path="/"} 3.0',
+        ])
+
+        null_metrics.counter('requests_total').inc()
+        self.assertEqual(null_metrics.collect(), [])
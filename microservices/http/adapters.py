@@ -0,0 +1,117 @@
+import threading
+import time
+
+from requests.adapters import HTTPAdapter, DEFAULT_POOLBLOCK, \
+    DEFAULT_POOLSIZE
+from requests.packages.urllib3.connection import HTTPConnection, HTTPSConnection
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# seconds of connecting in current request of thread, see PoolAdapter.send
+_connect_timing = threading.local()
+
+
+class ConnectTimingMixin(object):
+    """Connection adds time of connect (with TLS handshake) to current request"""
+
+    def connect(self):
+        started = time.time()
+        try:
+            return super(ConnectTimingMixin, self).connect()
+        finally:
+            _connect_timing.seconds = getattr(_connect_timing, 'seconds', 0) + \
+                time.time() - started
+
+
+class TimedHTTPConnection(ConnectTimingMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(ConnectTimingMixin, HTTPSConnection):
+    pass
+
+
+class KeepAlivePoolMixin(object):
+    """Recycle pooled connections by idle time and by count of requests
+
+    Connection is closed (and will be reopened on next usage) if:
+        - it was idle more than keep_alive_timeout seconds
+        - it has served max_requests requests
+    """
+
+    keep_alive_timeout = None
+    max_requests = None
+
+    def _is_expired(self, conn):
+        if self.keep_alive_timeout is not None:
+            released = getattr(conn, '_microservices_released', None)
+            if released is not None and \
+                    time.time() - released > self.keep_alive_timeout:
+                return True
+        if self.max_requests is not None:
+            if getattr(conn, '_microservices_requests', 0) >= self.max_requests:
+                return True
+        return False
+
+    def _get_conn(self, timeout=None):
+        conn = super(KeepAlivePoolMixin, self)._get_conn(timeout=timeout)
+        if conn is not None and self._is_expired(conn):
+            conn.close()
+            conn._microservices_requests = 0
+            conn._microservices_released = None
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn._microservices_requests = getattr(
+                conn, '_microservices_requests', 0) + 1
+            conn._microservices_released = time.time()
+        return super(KeepAlivePoolMixin, self)._put_conn(conn)
+
+
+class PoolAdapter(HTTPAdapter):
+    """requests adapter with per-host keep-alive connection pool"""
+
+    __attrs__ = HTTPAdapter.__attrs__ + ['keep_alive_timeout', 'max_requests']
+
+    def __init__(self, pool_connections=DEFAULT_POOLSIZE,
+                 pool_maxsize=DEFAULT_POOLSIZE, pool_block=DEFAULT_POOLBLOCK,
+                 keep_alive_timeout=None, max_requests=None, **kwargs):
+        """Initialization
+
+        :param pool_connections: count of hosts for caching pools
+        :param pool_maxsize: max count of keep-alive connections per host
+        :param pool_block: if True - wait a free connection, when pool is full
+        :param keep_alive_timeout: seconds, close connection if it was idle longer, default - None (never)
+        :param max_requests: close connection after count of requests, default - None (never)
+        """
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_requests = max_requests
+        super(PoolAdapter, self).__init__(pool_connections=pool_connections,
+                                          pool_maxsize=pool_maxsize,
+                                          pool_block=pool_block, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(PoolAdapter, self).init_poolmanager(*args, **kwargs)
+        bases = ()
+        options = {}
+        if self.keep_alive_timeout is not None or self.max_requests is not None:
+            bases = (KeepAlivePoolMixin,)
+            options = {
+                'keep_alive_timeout': self.keep_alive_timeout,
+                'max_requests': self.max_requests,
+            }
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('PoolAdapterHTTPConnectionPool',
+                         bases + (HTTPConnectionPool,),
+                         dict(options, ConnectionCls=TimedHTTPConnection)),
+            'https': type('PoolAdapterHTTPSConnectionPool',
+                          bases + (HTTPSConnectionPool,),
+                          dict(options, ConnectionCls=TimedHTTPSConnection)),
+        }
+
+    def send(self, request, **kwargs):
+        """Send request, response.connect_seconds - time of connecting, 0 for kept alive connection"""
+        _connect_timing.seconds = 0
+        response = super(PoolAdapter, self).send(request, **kwargs)
+        response.connect_seconds = _connect_timing.seconds
+        return response
@@ -0,0 +1,303 @@
+import asyncio
+import codecs
+import datetime
+import json
+import time
+
+from microservices.http.client import Client, ResponseError
+from microservices.http.stream import JSONStreamDecoder, is_ndjson
+from microservices.utils import get_logger
+
+
+async def empty_stream():
+    for item in ():
+        yield item
+
+
+class AsyncResponse(object):
+    def __init__(self, status_code, content, headers=None, url=None,
+                 elapsed=None):
+        """Response with already read body, compatible with Client.handle_response
+
+        :param status_code: int, status code
+        :param content: bytes, body of response
+        :param headers: dict, headers of response
+        :param url: str, url of request
+        :param elapsed: datetime.timedelta, time to headers of response, like in requests
+        """
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.url = url
+        self.elapsed = elapsed
+
+    @property
+    def text(self):
+        return self.content.decode('utf8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncClient(Client):
+    """Asyncio http client, aiohttp based
+
+    Surface of Client, but every request is awaitable:
+    >>>client = AsyncClient('http://localhost:5000')
+    >>>response = await client.get('one', 'two', key='response')
+    >>>resource = client.resource('one')
+    >>>response = await resource.post(data={'test': 'tested'})
+
+    All requests are sent through one aiohttp.ClientSession with
+    shared connection pool, session is created on the first request.
+    """
+
+    def __init__(self, endpoint, session=None, pool_connections=100,
+                 pool_maxsize=10, pool_block=True, keep_alive_timeout=15,
+                 max_requests_per_connection=None, **kwargs):
+        """Create a client
+
+        :param endpoint: str, ex. http://localhost:5000 or http://localhost:5000/api/
+        :param session: aiohttp.ClientSession, default - new session on the first request
+        :param pool_connections: max count of connections for all hosts, default - 100
+        :param pool_maxsize: max count of connections per host, default - 10
+        :param pool_block: aiohttp always waits a free connection, only True is supported
+        :param keep_alive_timeout: seconds, close connection if it was idle longer, default - 15
+        :param max_requests_per_connection: not supported by aiohttp, only None
+        :param kwargs: params for Client
+        """
+        if not pool_block:
+            raise ValueError('AsyncClient supports only pool_block=True')
+        if max_requests_per_connection is not None:
+            raise ValueError('AsyncClient does not support '
+                             'max_requests_per_connection')
+        if kwargs.get('logger') is None:
+            kwargs['logger'] = get_logger(__name__)
+        super(AsyncClient, self).__init__(
+            endpoint, session=session,
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+            pool_block=pool_block, keep_alive_timeout=keep_alive_timeout,
+            max_requests_per_connection=max_requests_per_connection,
+            **kwargs)
+
+    def build_session(self, pool_connections, pool_maxsize,
+                      keep_alive_timeout, **options):
+        """Save options for aiohttp session, it will be built on the first request
+
+        aiohttp.ClientSession should be created inside of running event loop
+        """
+        self.pool_options = {
+            'limit': pool_connections,
+            'limit_per_host': pool_maxsize,
+            'keepalive_timeout': keep_alive_timeout,
+        }
+        return None
+
+    def get_session(self):
+        """Get (or build) aiohttp.ClientSession with shared connection pool
+
+        :return: aiohttp.ClientSession
+        """
+        if self.session is None or self.session.closed:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(**self.pool_options)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    async def close(self):
+        """Close all pooled connections"""
+        if self.session is not None:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def request(self, method, *resources, **kwargs):
+        template = kwargs.pop('template', None)
+        method, url, response_key, kwargs = self.prepare_request(
+            method, resources, kwargs)
+        self.logger.info('Request %s for %s', method, url)
+        if self.before_request_hooks or self.after_request_hooks:
+            response = await self.send_with_hooks(method, url, resources,
+                                                  template, kwargs)
+        else:
+            response = await self.send(method, url, **kwargs)
+        if kwargs.get('stream'):
+            return await self.handle_stream(response, response_key=response_key)
+        return self.handle_response(response, response_key=response_key)
+
+    async def send_with_hooks(self, method, url, resources, template, kwargs):
+        info = self.start_request(method, url, resources, template, kwargs)
+        started = time.time()
+        try:
+            response = await self.send(method, url, **kwargs)
+        except Exception as e:
+            self.finish_request(info, started, kwargs, error=e)
+            raise
+        try:
+            self.finish_request(info, started, kwargs, response)
+        except Exception:
+            if kwargs.get('stream'):
+                response.release()
+            raise
+        return response
+
+    async def send(self, method, url, stream=False, **kwargs):
+        """Send request via pooled aiohttp session
+
+        :param method: http method, GET, POST, etc.
+        :param url: full url
+        :param stream: if True - body is not read, aiohttp.ClientResponse is returned
+        :param kwargs: params for aiohttp.ClientSession.request, timeout in seconds - for whole request, for stream - for connect and every read like in Client
+        :return: AsyncResponse or aiohttp.ClientResponse for stream
+        """
+        import aiohttp
+
+        timeout = kwargs.pop('timeout', None)
+        if timeout is not None and not isinstance(timeout, aiohttp.ClientTimeout):
+            if stream:
+                # body of stream can be read longer than timeout
+                timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout,
+                                                sock_read=timeout)
+            else:
+                timeout = aiohttp.ClientTimeout(total=timeout)
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        session = self.get_session()
+        if stream:
+            return await session.request(method, url, **kwargs)
+        started = time.time()
+        async with session.request(method, url, **kwargs) as response:
+            elapsed = datetime.timedelta(seconds=time.time() - started)
+            content = await response.read()
+            return AsyncResponse(response.status, content,
+                                 headers=dict(response.headers),
+                                 url=str(response.url), elapsed=elapsed)
+
+    async def handle_stream(self, response, response_key=None):
+        """Handler for response object in stream mode
+
+        >>>async for item in await client.get('export', stream=True):
+        >>>    pass
+
+        :param response: aiohttp.ClientResponse
+        :param response_key: key for array in response obj
+        :return: async iterator of python objects
+        """
+        status_code = response.status
+        if status_code not in self.ok_statuses:
+            if status_code not in self.to_none_statuses:
+                content = await response.read()
+                response.release()
+                raise ResponseError(
+                    AsyncResponse(status_code, content, dict(response.headers),
+                                  str(response.url)),
+                    'Status code {} not in ok_statuses {}'.format(
+                        status_code, self.ok_statuses))
+            if response_key is not None:
+                response.release()
+                return empty_stream()
+        return self.iter_stream(response, response_key=response_key)
+
+    async def iter_stream(self, response, response_key=None):
+        """Decode items of body chunk by chunk, response is released at the end
+
+        :param response: aiohttp.ClientResponse
+        :param response_key: key for array in response obj
+        :return: async generator of python objects
+        """
+        decoder = JSONStreamDecoder(
+            response_key,
+            ndjson=is_ndjson(response.headers.get('Content-Type')))
+        text_decoder = codecs.getincrementaldecoder(
+            response.charset or 'utf8')()
+        error_response = AsyncResponse(response.status, None,
+                                       dict(response.headers),
+                                       str(response.url))
+        try:
+            async for chunk in response.content.iter_chunked(
+                    self.stream_chunk_size):
+                try:
+                    items = decoder.feed(text_decoder.decode(chunk))
+                except ValueError as e:
+                    self.logger.exception(e)
+                    raise ResponseError(error_response, e)
+                for item in items:
+                    yield item
+            try:
+                items = decoder.feed(text_decoder.decode(b'', final=True))
+                items += decoder.close()
+            except ValueError as e:
+                self.logger.exception(e)
+                raise ResponseError(error_response, e)
+            for item in items:
+                yield item
+        finally:
+            response.release()
+
+    async def _gather_call(self, method, resources, kwargs):
+        import aiohttp
+
+        try:
+            return await self.request(method, *resources, **kwargs)
+        except ResponseError as e:
+            return e
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.error('Request %s for %s failed: %s', method,
+                              resources, e)
+            return ResponseError(None, e)
+
+    async def gather(self, calls, concurrency=10, timeout=None):
+        """Run many requests at the same time
+
+        >>>users, orders = await client.gather([
+        >>>    ('get', ('users', '1'), {'key': 'response'}),
+        >>>    ('get', ('orders',), {'query': {'user': '1'}}),
+        >>>])
+
+        :param calls: list of (method, resources) or (method, resources, kwargs for request)
+        :param concurrency: max count of requests in flight, default - 10
+        :param timeout: seconds for whole batch, default - None (without limit)
+        :return: list of results in order of requests, result is value or ResponseError
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(item):
+            async with semaphore:
+                return await self._gather_call(*item)
+
+        tasks = [asyncio.ensure_future(call(self._gather_item(item)))
+                 for item in calls]
+        if not tasks:
+            return []
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            self.logger.error('Batch timeout %s seconds', timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.wait(pending)
+        return [
+            task.result() if task in done else ResponseError(None, 'Batch timeout')
+            for task in tasks
+        ]
+
+    async def map(self, method, resources_list, concurrency=10, timeout=None,
+                  **kwargs):
+        """Run one method for many resources at the same time
+
+        >>>users = await client.map('get', [('users', '1'), ('users', '2')], key='response')
+
+        :param method: http method, get, post, etc.
+        :param resources_list: list of resources: [('one', 'two'), ('one', 'three')]
+        :param concurrency: max count of requests in flight, default - 10
+        :param timeout: seconds for whole batch, default - None (without limit)
+        :param kwargs: params for every request
+        :return: list of results in order of resources, result is value or ResponseError
+        """
+        return await self.gather([(method, resources, kwargs)
+                                  for resources in resources_list],
+                                 concurrency=concurrency, timeout=timeout)
@@ -0,0 +1,62 @@
+"""Application and ASGI calls for tests of AsyncMicroservice, python 3.5+ only"""
+import asyncio
+import json
+
+from flask import request
+
+from microservices.http.async_service import AsyncMicroservice
+from microservices.http.resources import ResourceMarker, ResourceSchema
+
+
+def create_app():
+    app = AsyncMicroservice(__name__)
+
+    @app.route('/users/<int:user_id>/',
+               resource=ResourceMarker(update={'kind': 'user'}))
+    async def user(user_id):
+        await asyncio.sleep(0.1)
+        return {'id': user_id, 'query': request.args.get('q')}
+
+    @app.route('/echo/', methods=['GET', 'POST'], resource=ResourceMarker(
+        schema=ResourceSchema(request='request')))
+    def echo():
+        return {'method': request.method}
+
+    @app.route('/error/')
+    async def error():
+        raise ValueError('tested')
+
+    return app
+
+
+async def call(app, method, path, body=b'', query=b''):
+    """Call ASGI application
+
+    :return: (status, content), content is decoded from json, if it's possible
+    """
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http', 'method': method, 'path': path,
+        'query_string': query, 'http_version': '1.1',
+        'headers': [(b'content-type', b'application/json'),
+                    (b'accept', b'application/json')],
+        'server': ('localhost', 80),
+    }
+    await app.asgi(scope, receive, send)
+    content = messages[1]['body'].decode('utf8')
+    try:
+        content = json.loads(content)
+    except ValueError:
+        pass
+    return messages[0]['status'], content
+
+
+async def gather(*calls):
+    return await asyncio.gather(*calls)
@@ -0,0 +1,382 @@
+import asyncio
+import inspect
+import io
+import sys
+
+import werkzeug
+from flask import request, request_started
+from six.moves.http_client import responses
+from six.moves.urllib.parse import unquote
+
+from microservices.http.service import Microservice
+from microservices.http.timings import get_timings
+from microservices.utils import get_logger
+
+_logger = get_logger(__name__)
+
+
+def asgi_environ(scope, body):
+    """Build WSGI environ for ASGI http scope
+
+    :param scope: dict, ASGI http scope
+    :param body: bytes, body of request
+    :return: dict, WSGI environ
+    """
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = client[0], str(client[1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').lower()
+        if name in ('content-length', 'transfer-encoding'):
+            # body is already read and decoded
+            continue
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_{}'.format(name.upper().replace('-', '_'))
+        value = value.decode('latin1')
+        if key in environ:
+            value = '{},{}'.format(environ[key], value)
+        environ[key] = value
+    return environ
+
+
+class AsyncMicroservice(Microservice):
+    """Microservice with ASGI interface, views can be coroutines
+
+    >>>app = AsyncMicroservice(__name__)
+    >>>
+    >>>@app.route('/users/<user_id>/', resource=ResourceMarker())
+    >>>async def user(user_id):
+    >>>    return await users.get(user_id)
+
+    Response is rendered like in WSGI mode: renderers, SchemaRenderer, ResourceMarker.
+    app.asgi - ASGI application for any ASGI server, or use runners.asyncio_run(app).
+    Not async views are called in the event loop, they block other requests.
+    WSGI interface (app.run(), gevent_run, etc.) still works.
+    """
+
+    def __init__(self, *args, **kwargs):
+        version = getattr(werkzeug, '__version__', '2')
+        if int(version.split('.')[0]) < 2:  # pragma: no cover
+            # request context should be stored in contextvars, not in thread locals
+            raise RuntimeError('AsyncMicroservice requires werkzeug>=2.0')
+        super(AsyncMicroservice, self).__init__(*args, **kwargs)
+
+    async def dispatch_request_async(self):
+        """Dispatch request to view, coroutine result of view is awaited"""
+        timings = get_timings()
+        if timings is None:
+            return await self._dispatch_request_async()
+        started = timings.start()
+        try:
+            return await self._dispatch_request_async()
+        finally:
+            timings.stop('view', started)
+
+    async def _dispatch_request_async(self):
+        req = request._get_current_object()
+        if req.routing_exception is not None:
+            self.raise_routing_exception(req)
+        rule = req.url_rule
+        if getattr(rule, 'provide_automatic_options', False) \
+                and req.method == 'OPTIONS':
+            return self.make_default_options_response()
+        rv = self.view_functions[rule.endpoint](**req.view_args)
+        if inspect.isawaitable(rv):
+            rv = await rv
+        return rv
+
+    async def full_dispatch_request_async(self):
+        timings = self.start_timings()
+        if timings is None:
+            return await self._full_dispatch_request_async()
+        response = None
+        try:
+            response = await self._full_dispatch_request_async()
+            return response
+        finally:
+            self.observe_timings(timings, response)
+
+    async def _full_dispatch_request_async(self):
+        try:
+            request_started.send(self)
+            rv = self.preprocess_request()
+            if rv is None:
+                rv = await self.dispatch_request_async()
+        except Exception as e:
+            rv = self.handle_user_exception(e)
+        return self.finalize_request(rv)
+
+    async def handle_request_async(self, environ):
+        """Handle request in request context
+
+        :param environ: dict, WSGI environ
+        :return: (status, headers, body)
+        """
+        ctx = self.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                response = await self.full_dispatch_request_async()
+            except Exception as e:
+                error = e
+                response = self.handle_exception(e)
+            except:  # noqa
+                error = sys.exc_info()[1]
+                raise
+            started = []
+            body = response(environ, lambda status, headers, exc_info=None:
+                            started.append((status, headers)))
+            try:
+                content = b''.join(body)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+            status, headers = started[0]
+            return int(status.split(' ', 1)[0]), headers, content
+        finally:
+            if error is not None and self.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+    async def asgi(self, scope, receive, send):
+        """ASGI application
+
+        :param scope: dict, ASGI scope
+        :param receive: coroutine function, ASGI receive
+        :param send: coroutine function, ASGI send
+        """
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported ASGI scope: {}'.format(scope['type']))
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        status, headers, content = await self.handle_request_async(
+            asgi_environ(scope, b''.join(chunks)))
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                        for name, value in headers],
+        })
+        await send({'type': 'http.response.body', 'body': content})
+
+
+class ASGIServer(object):
+    """Minimal asyncio HTTP/1.1 server for ASGI application
+
+    Keep-alive, Content-Length and chunked bodies are supported,
+    use uvicorn, hypercorn, etc. for http/2, websockets and TLS.
+    """
+
+    def __init__(self, app, logger=None, max_body_size=64 * 1024 * 1024):
+        """Initialization
+
+        :param app: ASGI application, ex. AsyncMicroservice.asgi
+        :param logger: logging instance
+        :param max_body_size: max size of request body in bytes
+        """
+        self.app = app
+        self.logger = logger or _logger
+        self.max_body_size = max_body_size
+        self.server = None
+        self.connections = set()
+
+    async def start(self, port=5000, address=''):
+        """Start listening
+
+        :param port: port for listen, int, default: 5000
+        :param address: address for listen, str, default: ""
+        """
+        self.server = await asyncio.start_server(
+            self.handle_connection, address or None, port)
+        self.logger.info('Listen %s:%s', address, port)
+        return self.server
+
+    def close(self):
+        """Stop listening and close keep-alive connections"""
+        if self.server is not None:
+            self.server.close()
+        for task in self.connections:
+            task.cancel()
+
+    async def wait_closed(self):
+        if self.server is not None:
+            await self.server.wait_closed()
+        if self.connections:
+            await asyncio.gather(*self.connections, return_exceptions=True)
+
+    @property
+    def sockets(self):
+        return self.server.sockets if self.server is not None else []
+
+    async def read_body(self, reader, headers):
+        if headers.get(b'transfer-encoding', b'').lower() == b'chunked':
+            chunks = []
+            size = 0
+            while True:
+                line = await reader.readline()
+                length = int(line.split(b';', 1)[0].strip(), 16)
+                if not length:
+                    # trailer
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return b''.join(chunks)
+                size += length
+                if size > self.max_body_size:
+                    raise ValueError('Request body is too large')
+                chunks.append(await reader.readexactly(length))
+                await reader.readline()
+        length = int(headers.get(b'content-length') or 0)
+        if length > self.max_body_size:
+            raise ValueError('Request body is too large')
+        return await reader.readexactly(length) if length else b''
+
+    async def handle_connection(self, reader, writer):
+        client = writer.get_extra_info('peername')
+        server = writer.get_extra_info('sockname')
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, version = line.decode('latin1').rstrip(
+                    '\r\n').split(' ', 2)
+                headers = []
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin1').partition(':')
+                    headers.append((name.strip().lower().encode('latin1'),
+                                    value.strip().encode('latin1')))
+                header_map = dict(headers)
+                body = await self.read_body(reader, header_map)
+                connection = header_map.get(b'connection', b'').lower()
+                keep_alive = connection != b'close' if version == 'HTTP/1.1' \
+                    else connection == b'keep-alive'
+                path, _, query = target.partition('?')
+                scope = {
+                    'type': 'http',
+                    'asgi': {'version': '3.0'},
+                    'http_version': version[5:],
+                    'method': method,
+                    'scheme': 'http',
+                    'path': unquote(path),
+                    'raw_path': path.encode('latin1'),
+                    'query_string': query.encode('latin1'),
+                    'root_path': '',
+                    'headers': headers,
+                    'client': client[:2] if client else None,
+                    'server': server[:2] if server else None,
+                }
+                keep_alive = await self.handle_request(scope, body, writer,
+                                                       keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            self.logger.debug('Connection %s: %s', client, e)
+        except asyncio.CancelledError:
+            # server is closed
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def handle_request(self, scope, body, writer, keep_alive):
+        """Call ASGI app and write response
+
+        :return: True if connection can be used for next request
+        """
+        state = {'started': False, 'chunked': False, 'keep_alive': keep_alive}
+        http11 = scope['http_version'] == '1.1'
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+                state['headers'] = list(message.get('headers', []))
+                return
+            content = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if not state['started']:
+                state['started'] = True
+                headers = state['headers']
+                names = set(name.lower() for name, _ in headers)
+                if b'content-length' not in names:
+                    if not more_body:
+                        headers.append((b'content-length',
+                                        str(len(content)).encode('latin1')))
+                    elif http11:
+                        state['chunked'] = True
+                        headers.append((b'transfer-encoding', b'chunked'))
+                    else:
+                        state['keep_alive'] = False
+                if not state['keep_alive']:
+                    headers.append((b'connection', b'close'))
+                status = state['status']
+                lines = ['HTTP/{} {} {}'.format(
+                    scope['http_version'], status, responses.get(status, ''))]
+                lines.extend('{}: {}'.format(name.decode('latin1'),
+                                             value.decode('latin1'))
+                             for name, value in headers)
+                writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin1'))
+            if scope['method'] != 'HEAD':
+                if state['chunked']:
+                    if content:
+                        writer.write('{:x}\r\n'.format(len(content)).encode(
+                            'latin1') + content + b'\r\n')
+                    if not more_body:
+                        writer.write(b'0\r\n\r\n')
+                else:
+                    writer.write(content)
+            await writer.drain()
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception:
+            self.logger.exception('Error in ASGI application')
+            if state['started']:
+                return False
+            state['status'], state['headers'] = 500, []
+            state['keep_alive'] = False
+            await send({'type': 'http.response.body',
+                        'body': b'Internal Server Error'})
+        return state['keep_alive']
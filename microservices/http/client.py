@@ -1,9 +1,21 @@
+import codecs
+import multiprocessing
+import re
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
 import requests
 import six
 import six.moves.urllib.parse as urlparse
 from six.moves.urllib.parse import urlencode
 
+from microservices.helpers import LRUCache
 from microservices.helpers.logs import InstanceLogger
+from microservices.helpers.serializers import get_serializer
+from microservices.http.adapters import PoolAdapter
+from microservices.http.stats import ClientStats, RequestInfo
+from microservices.http.stream import JSONStreamDecoder, is_ndjson
 from microservices.utils import get_logger
 
 
@@ -15,18 +27,22 @@ class ResponseError(Exception):
         exception instance has:
             response, description, content and status_code
 
-        :param response: requests.response
+        :param response: requests.response or None, if response was not received
         :param description: str - description for error
         """
         self.response = response
         self.description = description
-        self.status_code = response.status_code
-        self.content = response.content
+        self.status_code = getattr(response, 'status_code', None)
+        try:
+            self.content = getattr(response, 'content', None)
+        except RuntimeError:
+            # body was already consumed in stream mode
+            self.content = None
         super(ResponseError, self).__init__(*args, **kwargs)
 
     def __repr__(self):  # pragma: no cover
         return 'Error status code: {}. Description: {}'.format(
-            self.response.status_code, self.description)
+            self.status_code, self.description)
 
     def __str__(self):  # pragma: no cover
         return self.__repr__()
@@ -35,6 +51,21 @@ class ResponseError(Exception):
         return self.__str__().decode()
 
 
+class OverloadError(ResponseError):
+    """Request was rejected without sending, downstream is unhealthy or overloaded"""
+
+    def __init__(self, description, *args, **kwargs):
+        super(OverloadError, self).__init__(None, description, *args, **kwargs)
+
+
+class CircuitOpenError(OverloadError):
+    """Circuit breaker of endpoint is open"""
+
+
+class ConcurrencyLimitError(OverloadError):
+    """Concurrency limit of endpoint is reached"""
+
+
 class Resource(object):
     def __init__(self, client, resources):
         """Resource
@@ -64,14 +95,31 @@ class Resource(object):
         return Resource(self.client, resources)
 
 
+def _body_size(body):
+    """Size of body of request in bytes, None for streams and files"""
+    if body is None:
+        return 0
+    if isinstance(body, six.text_type):
+        return len(body.encode('utf8'))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return None
+
+
 @six.python_2_unicode_compatible
 class Client(object):
     ok_statuses = (200, 201, 202,)
     to_none_statuses = (404,)
+    stream_chunk_size = 64 * 1024
 
     def __init__(self, endpoint, ok_statuses=None, to_none_statuses=None,
                  empty_to_none=True, close_slash=True,
-                 logger=None, name=None, keep_blank_values=True):
+                 logger=None, name=None, keep_blank_values=True,
+                 session=None, pool_connections=10, pool_maxsize=10,
+                 pool_block=False, keep_alive_timeout=None,
+                 max_requests_per_connection=None, url_cache_size=1024,
+                 serializer=None, before_request=None, after_request=None,
+                 stats=None, circuit_breaker=None, concurrency_limiter=None):
         """Create a client
 
         :param endpoint: str, ex. http://localhost:5000 or http://localhost:5000/api/
@@ -82,6 +130,24 @@ class Client(object):
         :param logger: logger instance
         :param name: name for client
         :type name: str
+        :param session: requests.Session, default - new session with keep-alive connection pool
+        :param pool_connections: count of hosts for caching connection pools, default - 10
+        :param pool_maxsize: max count of keep-alive connections per host, default - 10
+        :param pool_block: boolean, wait a free connection when pool is full, default - False
+        :param keep_alive_timeout: seconds, reconnect if connection was idle longer, default - None (never)
+        :param max_requests_per_connection: reconnect after count of requests, default - None (never)
+        :param url_cache_size: count of cached urls for resources, 0 - disable cache, default - 1024
+        :param serializer: json serializer for data and responses: "json", "orjson", "auto" - the fastest installed,
+            or instance, see microservices.helpers.serializers, default - None (json of requests)
+        :param before_request: list of hooks(client, info, kwargs) called before sending,
+            info - microservices.http.stats.RequestInfo, kwargs - params for sending, can be changed
+        :param after_request: list of hooks(client, info) called after response or error
+        :param stats: True or microservices.http.stats.ClientStats, collect stats of requests
+            in client.stats, default - None (without stats)
+        :param circuit_breaker: microservices.http.overload.CircuitBreaker, requests fail fast
+            with CircuitOpenError while endpoint is unhealthy, default - None
+        :param concurrency_limiter: microservices.http.overload.AdaptiveLimiter, requests over
+            limit fail fast with ConcurrencyLimitError, default - None
         """
         if name is None:
             name = '<client: {}>'.format(endpoint)
@@ -108,6 +174,39 @@ class Client(object):
         self.fragment = parsed_url.fragment
         self.params = parsed_url.params
         self.name = name
+        self.url_cache = LRUCache(url_cache_size)
+        self.serializer = None
+        if serializer is not None:
+            self.serializer = get_serializer(serializer)
+        self.before_request_hooks = list(before_request or ())
+        self.after_request_hooks = list(after_request or ())
+        self.circuit_breaker = circuit_breaker
+        self.concurrency_limiter = concurrency_limiter
+        # limiter is the last one: rejected request does not hold a slot,
+        # guards are released in finish_request, even if hooks are failed
+        self.guards = [guard for guard in (circuit_breaker, concurrency_limiter)
+                       if guard is not None]
+        self.before_request_hooks.extend(guard.before_request
+                                         for guard in self.guards)
+        if stats is True:
+            stats = ClientStats()
+        self.stats = stats
+        if stats is not None:
+            self.after_request_hooks.append(stats)
+        self.compile_endpoint()
+        if session is None:
+            session = self.build_session(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=pool_block,
+                keep_alive_timeout=keep_alive_timeout,
+                max_requests=max_requests_per_connection,
+            )
+        self.session = session
+        # threads of gather, the pool is created on the first call
+        self.gather_pool_size = pool_maxsize
+        self._gather_pool = None
+        self._gather_lock = threading.Lock()
         self.logger.debug(
             'Client built, endpoint: "%s", path: "%s", query: %s, params: %s, fragment: %s',
             self.endpoint, self.path,
@@ -116,21 +215,85 @@ class Client(object):
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def build_session(**options):
+        """Build requests.Session with keep-alive connection pool
+
+        :param options: params for PoolAdapter
+        :return: requests.Session
+        """
+        session = requests.Session()
+        adapter = PoolAdapter(**options)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def close(self):
+        """Close all pooled connections and threads of gather
+
+        Not started requests of gather are dropped, running requests are waited.
+        """
+        with self._gather_lock:
+            pool, self._gather_pool = self._gather_pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        self.session.close()
+
+    def get_gather_pool(self):
+        """:return: ThreadPool of client for gather, gather_pool_size threads"""
+        with self._gather_lock:
+            if self._gather_pool is None:
+                self._gather_pool = ThreadPool(self.gather_pool_size)
+            return self._gather_pool
+
     @staticmethod
     def get_endpoint_from_parsed_url(parsed_url):
         url_list = [(lambda: x if e < 2 else '')() for e, x in
                     enumerate(list(parsed_url))]
         return urlparse.urlunparse(url_list)
 
+    def compile_endpoint(self):
+        """Precompute parts of endpoint for url_for
+
+        Call it after changing of endpoint, path, query, params or fragment
+        """
+        self._endpoint_parts = tuple(urlparse.urlparse(self.endpoint))
+        self._query = urlencode(self.query, doseq=1) if self.query else ''
+        self.url_cache.clear()
+
     def build_resource(self, resources):
         """Build uri from list
 
         :param resources: ['one', 'two', 'three']
         :return: one/two/three
         """
-        resource = '/'.join(resources)
-        self.logger.debug('Resource "%s" built from %s', resource, resources)
-        return resource
+        return '/'.join(resources)
+
+    def url_prefix(self, resource='', params=''):
+        """Url for resource without query and fragment, cached
+
+        :param resource: str
+        :param params: params for last path url
+        :return: str, url
+        """
+        key = (resource, params)
+        url = self.url_cache.get(key)
+        if url is None:
+            if resource:
+                path = self.path + '/' + resource
+            else:
+                path = self.path
+            if self.close_slash:
+                if not path.endswith('/'):
+                    path += '/'
+            if not params:
+                params = self.params
+            scheme, netloc = self._endpoint_parts[:2]
+            url = urlparse.urlunparse((scheme, netloc, path, params, '', ''))
+            self.url_cache.set(key, url)
+            self.logger.debug('Url %s built for resource "%s"', url, resource)
+        return url
 
     def url_for(self, resource='', query=None, params='', fragment='',
                 keep_blank_values=None):
@@ -148,35 +311,24 @@ class Client(object):
         :param fragment: #fragment
         :return: str, url
         """
-        parsed_url = list(urlparse.urlparse(self.endpoint))
-        if resource:
-            path = self.path + '/' + resource
-        else:
-            path = self.path
-        if self.close_slash:
-            if not path.endswith('/'):
-                path += '/'
-        if not params:
-            params = self.params
-        if not fragment:
-            fragment = self.fragment
-        parsed_url[2] = path
-        parsed_url[3] = params
-        parsed_url[5] = fragment
-        if self.query:
-            parsed_url[4] = urlencode(self.query, doseq=1)
+        url = self.url_prefix(resource, params)
+        req_query = self._query
         if query is not None:
             if keep_blank_values is None:
                 keep_blank_values = self.keep_blank_values
             if isinstance(query, six.string_types):
                 query = urlparse.parse_qs(query,
                                           keep_blank_values=keep_blank_values)
-            req_query = dict(self.query)
-            req_query.update(query)
-            req_query = urlencode(req_query, doseq=1)
-            parsed_url[4] = req_query
-        url = urlparse.urlunparse(parsed_url)
-        self.logger.debug('Url %s built for resource "%s"', url, resource)
+            if query:
+                req_query = dict(self.query)
+                req_query.update(query)
+                req_query = urlencode(req_query, doseq=1)
+        if req_query:
+            url += '?' + req_query
+        if not fragment:
+            fragment = self.fragment
+        if fragment:
+            url += '#' + fragment
         return url
 
     def handle_response(self, response, response_key=None):
@@ -188,7 +340,7 @@ class Client(object):
         """
         status_code = response.status_code
         try:
-            result = response.json()
+            result = self.decode(response)
         except Exception as e:
             self.logger.exception(e)
             raise ResponseError(response, e)
@@ -210,11 +362,82 @@ class Client(object):
 
         return result
 
+    def decode(self, response):
+        """Decode json body of response
+
+        :param response: requests.response obj
+        :return: python obj
+        """
+        if self.serializer is None:
+            return response.json()
+        return self.serializer.loads(response.content)
+
+    def handle_stream(self, response, response_key=None):
+        """Handler for response object in stream mode
+
+        Status code is checked immediately, body is decoded lazily,
+        item by item, from json array, ndjson or response_key array
+
+        :param response: requests.response obj, sent with stream=True
+        :param response_key: key for array in response obj
+        :return: iterator of python objects
+        """
+        status_code = response.status_code
+        if status_code not in self.ok_statuses:
+            if status_code not in self.to_none_statuses:
+                response.close()
+                raise ResponseError(response,
+                                    'Status code {} not in ok_statuses {}'.format(
+                                        status_code, self.ok_statuses))
+            if response_key is not None:
+                response.close()
+                return iter(())
+        return self.iter_stream(response, response_key=response_key)
+
+    def iter_stream(self, response, response_key=None):
+        """Decode items of body chunk by chunk, response is closed at the end
+
+        :param response: requests.response obj, sent with stream=True
+        :param response_key: key for array in response obj
+        :return: generator of python objects
+        """
+        decoder = JSONStreamDecoder(
+            response_key,
+            ndjson=is_ndjson(response.headers.get('Content-Type')))
+        text_decoder = codecs.getincrementaldecoder(
+            response.encoding or 'utf8')()
+        try:
+            for chunk in response.iter_content(self.stream_chunk_size):
+                try:
+                    items = decoder.feed(text_decoder.decode(chunk))
+                except ValueError as e:
+                    self.logger.exception(e)
+                    raise ResponseError(response, e)
+                for item in items:
+                    yield item
+            try:
+                items = decoder.feed(text_decoder.decode(b'', final=True))
+                items += decoder.close()
+            except ValueError as e:
+                self.logger.exception(e)
+                raise ResponseError(response, e)
+            for item in items:
+                yield item
+        finally:
+            response.close()
+
     def __getattr__(self, method):
         return lambda *resources, **kwargs: self.request(method, *resources,
                                                          **kwargs)
 
-    def request(self, method, *resources, **kwargs):
+    def prepare_request(self, method, resources, kwargs):
+        """Build method, url and params for sending
+
+        :param method: http method, get, post, etc.
+        :param resources: ('one', 'two', 'three')
+        :param kwargs: params of Client.request
+        :return: (method, url, response_key, params for sending)
+        """
         method = method.upper()
         response_key = kwargs.pop('response_key', None)
         key = kwargs.pop('key', None)
@@ -225,21 +448,229 @@ class Client(object):
         fragment = kwargs.pop('fragment', '')
         params = kwargs.pop('params', '')
         keep_blank_values = kwargs.pop('keep_blank_values', None)
-        timeout = kwargs.pop('timeout', 60)
+        kwargs['timeout'] = kwargs.pop('timeout', 60)
         resource = self.build_resource(resources)
         content_type = kwargs.pop('content_type', 'json')
         if data is not None:
             if 'json' in content_type:
-                kwargs['json'] = data
+                if self.serializer is None:
+                    kwargs['json'] = data
+                else:
+                    kwargs['data'] = self.serializer.dumps_bytes(data)
+                    headers = dict(kwargs.get('headers') or {})
+                    headers.setdefault('Content-Type', 'application/json')
+                    kwargs['headers'] = headers
             if content_type == 'body':
                 kwargs['data'] = data
         url = self.url_for(resource, query, params=params,
                            fragment=fragment,
                            keep_blank_values=keep_blank_values)
+        return method, url, response_key, kwargs
+
+    _id_re = re.compile(r'^(\d+|[0-9a-fA-F-]{16,})$')
+
+    def resource_template(self, resources, template=None):
+        """Template of resource for stats, numbers and uuids are replaced by {id}
+
+        :param resources: ('users', '1')
+        :param template: template from params of request, ex. "users/{name}"
+        :return: str, ex. users/{id}
+        """
+        if template is not None:
+            return template
+        return '/'.join('{id}' if self._id_re.match(six.text_type(resource))
+                        else six.text_type(resource) for resource in resources)
+
+    def start_request(self, method, url, resources, template, kwargs):
+        """Call before_request hooks
+
+        :return: RequestInfo
+        """
+        info = RequestInfo(method, url, self.resource_template(resources, template))
+        for hook in self.before_request_hooks:
+            hook(self, info, kwargs)
+        return info
+
+    def finish_request(self, info, started, kwargs, response=None, error=None):
+        """Fill info by response and call after_request hooks
+
+        :param info: RequestInfo
+        :param started: time of sending
+        :param kwargs: params for sending
+        :param response: response or None if request is failed
+        :param error: exception of sending
+        """
+        try:
+            info.total = time.time() - started
+            info.error = error
+            if response is not None:
+                info.response = response
+                # aiohttp.ClientResponse of stream has status
+                info.status = getattr(response, 'status_code', None) or \
+                    getattr(response, 'status', None)
+                elapsed = getattr(response, 'elapsed', None)
+                if elapsed is not None:
+                    info.ttfb = elapsed.total_seconds()
+                info.connect = getattr(response, 'connect_seconds', None)
+                request = getattr(response, 'request', None)
+                if request is not None:
+                    info.request_size = _body_size(request.body)
+                elif kwargs.get('json') is None:
+                    info.request_size = _body_size(kwargs.get('data'))
+                if kwargs.get('stream'):
+                    length = response.headers.get('Content-Length')
+                    info.response_size = int(length) if length else None
+                else:
+                    info.response_size = len(response.content)
+            for hook in self.after_request_hooks:
+                hook(self, info)
+        finally:
+            for guard in self.guards:
+                guard.after_request(self, info)
+
+    def send_with_hooks(self, method, url, resources, template, kwargs):
+        info = self.start_request(method, url, resources, template, kwargs)
+        started = time.time()
+        try:
+            response = self.send(method, url, **kwargs)
+        except Exception as e:
+            self.finish_request(info, started, kwargs, error=e)
+            raise
+        try:
+            self.finish_request(info, started, kwargs, response)
+        except Exception:
+            if kwargs.get('stream'):
+                response.close()
+            raise
+        return response
+
+    def request(self, method, *resources, **kwargs):
+        template = kwargs.pop('template', None)
+        method, url, response_key, kwargs = self.prepare_request(
+            method, resources, kwargs)
         self.logger.info('Request %s for %s', method, url)
-        response = requests.request(method, url, timeout=timeout, **kwargs)
+        if self.before_request_hooks or self.after_request_hooks:
+            response = self.send_with_hooks(method, url, resources, template,
+                                            kwargs)
+        else:
+            response = self.send(method, url, **kwargs)
+        if kwargs.get('stream'):
+            return self.handle_stream(response, response_key=response_key)
         return self.handle_response(response, response_key=response_key)
 
+    def send(self, method, url, **kwargs):
+        """Send request via pooled session
+
+        :param method: http method, GET, POST, etc.
+        :param url: full url
+        :param kwargs: params for requests.Session.request
+        :return: requests.response
+        """
+        return self.session.request(method, url, **kwargs)
+
+    @staticmethod
+    def _gather_item(item):
+        method, resources = item[0], item[1]
+        kwargs = dict(item[2]) if len(item) > 2 and item[2] else {}
+        if isinstance(resources, six.string_types):
+            resources = (resources,)
+        return method, tuple(resources), kwargs
+
+    def _gather_call(self, method, resources, kwargs):
+        try:
+            return self.request(method, *resources, **kwargs)
+        except ResponseError as e:
+            return e
+        except requests.RequestException as e:
+            self.logger.error('Request %s for %s failed: %s', method,
+                              resources, e)
+            return ResponseError(e.response, e)
+
+    def gather(self, calls, concurrency=10, timeout=None):
+        """Run many requests at the same time
+
+        >>>users, orders = client.gather([
+        >>>    ('get', ('users', '1'), {'key': 'response'}),
+        >>>    ('get', ('orders',), {'query': {'user': '1'}}),
+        >>>])
+
+        :param calls: list of (method, resources) or (method, resources, kwargs for request)
+        :param concurrency: max count of requests in flight, default - 10, at most gather_pool_size (pool_maxsize)
+        :param timeout: seconds for whole batch, default - None (without limit)
+        :return: list of results in order of requests, result is value or ResponseError
+        """
+        items = [self._gather_item(item) for item in calls]
+        if not items:
+            return []
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        expired = threading.Event()
+        # threads of pool are shared by calls of gather, in flight requests of call are limited here
+        in_flight = threading.Condition()
+        running = [0]
+
+        def remaining():
+            if deadline is None:
+                return None
+            return max(deadline - time.time(), 0)
+
+        def call(item):
+            try:
+                if expired.is_set():
+                    return ResponseError(None, 'Batch timeout')
+                return self._gather_call(*item)
+            finally:
+                with in_flight:
+                    running[0] -= 1
+                    in_flight.notify()
+
+        def timed_out():
+            if not expired.is_set():
+                self.logger.error('Batch timeout %s seconds', timeout)
+                expired.set()
+            return ResponseError(None, 'Batch timeout')
+
+        pool = self.get_gather_pool()
+        try:
+            async_results = []
+            for item in items:
+                with in_flight:
+                    while running[0] >= concurrency and remaining() != 0:
+                        in_flight.wait(remaining())
+                    if running[0] >= concurrency:
+                        break
+                    running[0] += 1
+                async_results.append(pool.apply_async(call, (item,)))
+            results = []
+            for async_result in async_results:
+                try:
+                    results.append(async_result.get(remaining()))
+                except multiprocessing.TimeoutError:
+                    results.append(timed_out())
+            while len(results) < len(items):
+                results.append(timed_out())
+            return results
+        finally:
+            expired.set()
+
+    def map(self, method, resources_list, concurrency=10, timeout=None,
+            **kwargs):
+        """Run one method for many resources at the same time
+
+        >>>users = client.map('get', [('users', '1'), ('users', '2')], key='response')
+
+        :param method: http method, get, post, etc.
+        :param resources_list: list of resources: [('one', 'two'), ('one', 'three')]
+        :param concurrency: max count of requests in flight, default - 10
+        :param timeout: seconds for whole batch, default - None (without limit)
+        :param kwargs: params for every request
+        :return: list of results in order of resources, result is value or ResponseError
+        """
+        return self.gather([(method, resources, kwargs)
+                            for resources in resources_list],
+                           concurrency=concurrency, timeout=timeout)
+
     def resource(self, *resources):
         """Generate Resource object with resources
 
@@ -1,6 +1,31 @@
 import six
 from flask import request, url_for, current_app
-from werkzeug.routing import BuildError
+from werkzeug.routing import BuildError, Map, RuleFactory
+
+
+class _RecordingRuleFactory(RuleFactory):
+    def __init__(self, rulefactory, rules):
+        self.rulefactory = rulefactory
+        self.rules = rules
+
+    def get_rules(self, map):
+        for rule in self.rulefactory.get_rules(map):
+            self.rules.append(rule)
+            yield rule
+
+
+class IndexedMap(Map):
+    """Map with index of rules by path, rules_by_path[rule.rule] - list of rules"""
+
+    def __init__(self, *args, **kwargs):
+        self.rules_by_path = {}
+        super(IndexedMap, self).__init__(*args, **kwargs)
+
+    def add(self, rulefactory):
+        rules = []
+        super(IndexedMap, self).add(_RecordingRuleFactory(rulefactory, rules))
+        for rule in rules:
+            self.rules_by_path.setdefault(rule.rule, []).append(rule)
 
 
 def get_url_rule():
@@ -34,4 +59,71 @@ def url_resource(resource):
         )
     except BuildError:
         url = None
-    return url
\ No newline at end of file
+    return url
+
+
+class ResourcesIndex(object):
+    """Index of resources for `resources` field of response
+
+    Fields of resources are collected once, fragments of response are cached
+    for every url root (host dependent external urls) and rule.
+    Resources are not modified, call invalidate() after changing of resources.
+    """
+
+    def __init__(self, resources, max_fragments=1024):
+        """Initialization
+
+        :param resources: dict, rule: resource, ex. Microservice.resources
+        :param max_fragments: max count of cached fragments, host header can be anything
+        """
+        self.resources = resources
+        self.max_fragments = max_fragments
+        self.entries = None
+        self.fragments = {}
+
+    def invalidate(self):
+        self.entries = None
+        self.fragments = {}
+
+    def build(self):
+        self.entries = [
+            (resource['rule'], resource['in_resources'], resource)
+            for resource in self.resources.values()
+            if resource.get('in_resources') is not None
+        ]
+        return self.entries
+
+    @staticmethod
+    def resource_info(fields, resource):
+        info = {}
+        for field in fields:
+            if field == 'url' and resource.get('url'):
+                url = url_resource(resource)
+                if url is not None:
+                    info['url'] = url
+            elif field in resource:
+                info[field] = resource[field]
+        return info
+
+    def fragment(self, rule, url_root=''):
+        """Info about all resources, except resource of rule
+
+        :param rule: rule of current resource
+        :param url_root: root of external urls, ex. request.url_root
+        :return: dict, rule: info, should not be modified
+        """
+        key = (url_root, rule)
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            entries = self.entries
+            if entries is None:
+                entries = self.build()
+            fragment = {
+                another_rule: self.resource_info(fields, resource)
+                for another_rule, fields, resource in entries
+                if another_rule != rule
+            }
+            if len(self.fragments) >= self.max_fragments:
+                self.fragments = {}
+            self.fragments[key] = fragment
+        return fragment
@@ -0,0 +1,261 @@
+import collections
+import threading
+import time
+
+from microservices.http.client import CircuitOpenError, ConcurrencyLimitError
+
+
+def is_failure(info, latency_threshold=None):
+    """Request is failed: error of sending, 5xx or slower than latency_threshold
+
+    :param info: microservices.http.stats.RequestInfo
+    :param latency_threshold: seconds, None - latency is not checked
+    """
+    if info.error is not None or info.status is None or info.status >= 500:
+        return True
+    return latency_threshold is not None and info.total is not None and \
+        info.total > latency_threshold
+
+
+class CircuitBreaker(object):
+    """Circuit breaker for endpoint of Client
+
+    closed - requests are sent, results of last `window` requests are counted,
+    circuit is opened if rate of failures (errors, 5xx, slower than latency_threshold)
+    is bigger than failure_threshold.
+    open - requests fail fast with CircuitOpenError for reset_timeout seconds.
+    half_open - `probes` requests are sent, circuit is closed if all of them are ok,
+    else it's opened again.
+
+    >>>client = Client('http://users:5000', circuit_breaker=CircuitBreaker())
+
+    Share one instance between clients of the same endpoint.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=0.5, latency_threshold=None,
+                 window=20, min_calls=10, reset_timeout=30, probes=1):
+        """Initialization
+
+        :param failure_threshold: rate of failures for opening, 0..1, default - 0.5
+        :param latency_threshold: seconds, slower requests are failures, default - None
+        :param window: count of last requests for rate of failures, default - 20
+        :param min_calls: min count of requests in window for opening, default - 10
+        :param reset_timeout: seconds in open state before probing, default - 30
+        :param probes: count of requests in half open state, default - 1
+        """
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.state = self.CLOSED
+        self.results = collections.deque(maxlen=window)
+        self.failures = 0
+        self.opened_at = None
+        self.probes_started = 0
+        self.probes_passed = 0
+        self.rejected = 0
+        self.opened = 0
+        self._lock = threading.Lock()
+
+    def is_failure(self, info):
+        return is_failure(info, self.latency_threshold)
+
+    def allow(self):
+        """:return: True if request can be sent"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.time()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self.probes_started = self.probes_passed = 0
+                self.opened_at = now
+            elif self.probes_started >= self.probes and \
+                    now - self.opened_at >= self.reset_timeout:
+                # results of probes were lost, probe again
+                self.probes_started = self.probes_passed = 0
+                self.opened_at = now
+            if self.probes_started >= self.probes:
+                self.rejected += 1
+                return False
+            self.probes_started += 1
+            return True
+
+    def record(self, failure):
+        """Add result of request
+
+        :param failure: boolean, request is failed
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if failure:
+                    self._open()
+                else:
+                    self.probes_passed += 1
+                    if self.probes_passed >= self.probes:
+                        self._close()
+                return
+            if self.state == self.OPEN:
+                # request was sent before opening
+                return
+            if len(self.results) == self.results.maxlen and self.results[0]:
+                self.failures -= 1
+            self.results.append(failure)
+            self.failures += failure
+            if len(self.results) >= self.min_calls and \
+                    self.failures >= self.failure_threshold * len(self.results):
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.time()
+        self.opened += 1
+
+    def _close(self):
+        self.state = self.CLOSED
+        self.results.clear()
+        self.failures = 0
+
+    def before_request(self, client, info, kwargs):
+        if not self.allow():
+            raise CircuitOpenError('Circuit breaker is open for {}'.format(
+                client.endpoint))
+
+    def after_request(self, client, info):
+        self.record(self.is_failure(info))
+
+    def stats(self):
+        """Counters of breaker
+
+        :return: dict with state, failures (in window), calls (in window), rejected, opened
+        """
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'calls': len(self.results),
+            'rejected': self.rejected,
+            'opened': self.opened,
+        }
+
+
+class AdaptiveLimiter(object):
+    """Adaptive limit of requests in flight for endpoint of Client, AIMD
+
+    Limit grows by 1 for every `limit` successful requests while it's used,
+    and is multiplied by backoff on failure (errors, 5xx, 429) or when smoothed latency
+    is bigger than min latency * latency_tolerance, at most once per smoothed latency.
+    Requests over limit fail fast with ConcurrencyLimitError.
+
+    >>>client = Client('http://users:5000', concurrency_limiter=AdaptiveLimiter())
+    """
+
+    def __init__(self, initial_limit=10, min_limit=1, max_limit=200,
+                 backoff=0.9, latency_tolerance=2.0, smoothing=0.2,
+                 baseline_window=1000):
+        """Initialization
+
+        :param initial_limit: limit at start, default - 10
+        :param min_limit: default - 1
+        :param max_limit: default - 200, keep it <= pool_maxsize with pool_block
+        :param backoff: multiplier of limit on overload, default - 0.9
+        :param latency_tolerance: smoothed latency / min latency for overload, default - 2.0
+        :param smoothing: weight of new latency in smoothed latency, default - 0.2
+        :param baseline_window: min latency is recalculated after count of requests, default - 1000
+        """
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline_window = baseline_window
+        self.in_flight = 0
+        self.min_latency = None
+        self.latency = None
+        self.samples = 0
+        self.last_decrease = 0
+        self.accepted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def is_failure(self, info):
+        return is_failure(info) or info.status == 429
+
+    def acquire(self):
+        """Take slot for request
+
+        :return: True if request can be sent, False if limit is reached
+        """
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            self.accepted += 1
+            return True
+
+    def release(self, failure, latency=None):
+        """Free slot and adapt limit
+
+        :param failure: boolean, request is failed
+        :param latency: seconds, None - unknown
+        """
+        with self._lock:
+            used = self.in_flight >= self.limit / 2
+            self.in_flight -= 1
+            if latency is not None and not failure:
+                self._add_latency(latency)
+            overload = failure
+            if not overload and self.latency is not None:
+                overload = self.latency > self.min_latency * self.latency_tolerance
+            if overload:
+                now = time.time()
+                if now - self.last_decrease >= (self.latency or 0):
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self.last_decrease = now
+            elif used:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _add_latency(self, latency):
+        self.samples += 1
+        if self.samples > self.baseline_window:
+            # downstream could become slower for good, find new baseline
+            self.samples = 1
+            self.min_latency = None
+        if self.min_latency is None or latency < self.min_latency:
+            self.min_latency = latency
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+
+    def before_request(self, client, info, kwargs):
+        if not self.acquire():
+            raise ConcurrencyLimitError(
+                'Concurrency limit {} is reached for {}'.format(
+                    int(self.limit), client.endpoint))
+
+    def after_request(self, client, info):
+        self.release(self.is_failure(info), info.total)
+
+    def stats(self):
+        """Counters of limiter
+
+        :return: dict with limit, in_flight, latency (smoothed), min_latency, accepted, rejected
+        """
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'latency': self.latency,
+            'min_latency': self.min_latency,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+        }
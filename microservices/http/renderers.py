@@ -1,24 +1,46 @@
-import json
+from collections import namedtuple
 
-import six
 from flask import current_app, request
 from flask.json import JSONEncoder
 from flask_api.renderers import BrowsableAPIRenderer, JSONRenderer
 
-from microservices.http.helpers import url_resource, get_url_rule, \
+from microservices.helpers.serializers import get_serializer
+from microservices.http.helpers import ResourcesIndex, get_url_rule, \
     get_rule_resource
+from microservices.http.timings import get_timings
 from microservices.utils import get_logger
 
 logger = get_logger('Microservices renderers')
 
+# datetime, uuid, etc. like in flask
+json_default = JSONEncoder().default
+
+
+RenderPlan = namedtuple('RenderPlan', ['ignore_for_methods', 'steps'])
+
 
 class SchemaRenderer(object):
-    def __init__(self, options, resource, data, browser=False):
+    steps = (
+        'update_by_name',
+        'update_by_info',
+        'update_by_request',
+        'update_by_status',
+        'update_by_status_code',
+        'update_by_headers',
+        'update_by_resource',
+        'update_by_methods',
+        'update_by_resources',
+        'update_by_update',
+        'update_by_data',
+    )
+
+    def __init__(self, options, resource, data, browser=False, plan=None):
         self._schema = None
         self.options = options
         self.resource = resource
         self.data = data
         self.browser = browser
+        self.plan = plan
 
     @property
     def schema(self):
@@ -27,11 +49,48 @@ class SchemaRenderer(object):
         return self._schema
 
     def _get_schema(self):
-        schema = self.resource['schema']
-        if self.browser:
+        return self.get_resource_schema(self.resource, self.browser)
+
+    @staticmethod
+    def get_resource_schema(resource, browser=False):
+        schema = resource['schema']
+        if browser:
             schema = schema['browser']
         return schema
 
+    @classmethod
+    def compile_plan(cls, resource, browser=False):
+        """Plan of rendering for resource, only steps enabled by schema
+
+        :param resource: dict, resource of rule
+        :param browser: boolean, plan for browser schema
+        :return: RenderPlan
+        """
+        schema = cls.get_resource_schema(resource, browser)
+        names = {
+            'update_by_name': 'response',
+            'update_by_request': 'request',
+            'update_by_status': 'status',
+            'update_by_status_code': 'status_code',
+            'update_by_headers': 'headers',
+            'update_by_resource': 'resource',
+            'update_by_methods': 'methods',
+            'update_by_resources': 'resources',
+        }
+        enabled = {
+            step: schema.get(name, None) is not None
+            for step, name in names.items()
+        }
+        enabled['update_by_info'] = resource.get('info', None) is not None \
+            and schema.get('info', None) is not None
+        enabled['update_by_update'] = isinstance(resource.get('update', None),
+                                                 dict)
+        enabled['update_by_data'] = bool(schema.get('response_update', True))
+        return RenderPlan(
+            ignore_for_methods=frozenset(schema.get('ignore_for_methods', [])),
+            steps=tuple(step for step in cls.steps if enabled[step]),
+        )
+
     def check_response_update(self):
         return self.schema.get('response_update', True)
 
@@ -93,24 +152,11 @@ class SchemaRenderer(object):
     def update_by_resources(self, response):
         resources_name = self.schema.get('resources', None)
         if resources_name is not None:
-            another_resources_info = {}
-            for another_resource in [
-                value for value in current_app.resources.values()
-                if value.get('in_resources') is not None
-                and value['rule'] != self.resource['rule']
-                ]:
-                resource_url = another_resource.get('url')
-                if resource_url:
-                    url = url_resource(another_resource)
-                    if url is not None:
-                        another_resource['url'] = url
-                    else:
-                        del another_resource['url']
-                another_resources_info[another_resource['rule']] = {
-                    field: another_resource[field]
-                    for field in another_resource.get('in_resources', [])
-                    if field in another_resource
-                    }
+            index = getattr(current_app, 'resources_index', None)
+            if index is None:
+                index = ResourcesIndex(current_app.resources)  # pragma: no cover
+            another_resources_info = index.fragment(self.resource['rule'],
+                                                    request.url_root)
             if another_resources_info:
                 response[resources_name] = another_resources_info
 
@@ -125,26 +171,44 @@ class SchemaRenderer(object):
             response.update(self.data)
 
     def render(self):
-        if self.check_ignore_method():
+        plan = self.plan
+        if plan is None:
+            plan = self.plan = self.compile_plan(self.resource, self.browser)
+        if request.method in plan.ignore_for_methods:
             return self.data  # pragma: no cover
         response = {}
-        self.update_by_name(response)
-        self.update_by_info(response)
-        self.update_by_request(response)
-        self.update_by_status(response)
-        self.update_by_status_code(response)
-        self.update_by_headers(response)
-        self.update_by_resource(response)
-        self.update_by_methods(response)
-        self.update_by_resources(response)
-        self.update_by_update(response)
-        self.update_by_data(response)
+        for step in plan.steps:
+            getattr(self, step)(response)
         return response
 
 
+def get_render_plan(rule, resource, browser=False):
+    """Compiled plan of rendering for rule, see Microservice.render_plans"""
+    plans = getattr(current_app, 'render_plans', None)
+    if plans is None:
+        return SchemaRenderer.compile_plan(resource, browser)  # pragma: no cover
+    key = (rule, browser)
+    cached = plans.get(key)
+    # resource can be replaced in app.resources without add_resource
+    if cached is None or cached[0] is not resource:
+        cached = plans[key] = (resource,
+                               SchemaRenderer.compile_plan(resource, browser))
+    return cached[1]
+
+
 class MicroserviceRendererMixin(object):
     def pre_render(self, data, media_type, browser=False, **options):
+        timings = get_timings()
+        if timings is None:
+            return self._pre_render(data, browser, options)
+        started = timings.start()
+        try:
+            return self._pre_render(data, browser, options)
+        finally:
+            timings.stop('render', started)
 
+    @staticmethod
+    def _pre_render(data, browser, options):
         rule = get_url_rule()
         if rule is None:
             return data  # pragma: no cover
@@ -153,7 +217,9 @@ class MicroserviceRendererMixin(object):
         if not resource:
             return data  # pragma: no cover
 
-        response = SchemaRenderer(options, resource, data, browser).render()
+        plan = get_render_plan(rule, resource, browser)
+        response = SchemaRenderer(options, resource, data, browser,
+                                  plan=plan).render()
         return response
 
 
@@ -171,12 +237,28 @@ class MicroserviceJSONRenderer(JSONRenderer, MicroserviceRendererMixin):
             indent = None
         # Indent may be set explicitly, eg when rendered by the browsable API.
         indent = options.get('indent', indent)
-        if six.PY2:  # pragma: no cover
-            return json.dumps(data, cls=JSONEncoder, ensure_ascii=False,
-                              indent=indent, encoding=self.charset)
-        else:  # pragma: no cover
-            return json.dumps(data, cls=JSONEncoder, ensure_ascii=False,
-                              indent=indent)
+        timings = get_timings()
+        if timings is None:
+            return self.serialize(data, indent, options)
+        started = timings.start()
+        try:
+            return self.serialize(data, indent, options)
+        finally:
+            timings.stop('serialize', started)
+
+    def serialize(self, data, indent, options):
+        serializer = self.get_serializer()
+        if 'indent' in options:
+            # text for BrowsableAPIRenderer
+            return serializer.dumps(data, indent=indent)
+        return serializer.dumps_bytes(data, indent=indent)
+
+    @staticmethod
+    def get_serializer():
+        settings = getattr(current_app, 'api_settings', None)
+        if settings is None:
+            return get_serializer('json', default=json_default)  # pragma: no cover
+        return settings.JSON_SERIALIZER
 
 
 class MicroserviceBrowsableAPIRenderer(BrowsableAPIRenderer,
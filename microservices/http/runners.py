@@ -1,3 +1,81 @@
+import threading
+
+
+class InFlightLimiter(object):
+    """Bounded count of requests in flight for async containers
+
+    overload='reject' - request over limit gets fast 503 response
+    overload='block' - server waits free slot and does not accept new connections
+    """
+
+    def __init__(self, max_in_flight=None, overload='reject'):
+        """Initialization
+
+        :param max_in_flight: max count of handled and queued requests, None - without limit
+        :param overload: 'reject' or 'block'
+        """
+        if overload not in ('reject', 'block'):
+            raise ValueError('overload should be "reject" or "block"')
+        self.max_in_flight = max_in_flight
+        self.overload = overload
+        self.in_flight = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self._condition = threading.Condition()
+
+    @property
+    def full(self):
+        return bool(self.max_in_flight) and \
+            self.in_flight >= self.max_in_flight
+
+    def acquire(self):
+        """Take slot for request
+
+        :return: True if request can be handled, False if it should be rejected
+        """
+        with self._condition:
+            if self.full and self.overload == 'reject':
+                self.rejected += 1
+                return False
+            while self.full:
+                self._condition.wait()
+            self.in_flight += 1
+            self.accepted += 1
+            return True
+
+    def release(self):
+        """Free slot after request"""
+        with self._condition:
+            self.in_flight -= 1
+            self.completed += 1
+            self._condition.notify()
+
+    def stats(self):
+        """Counters of limiter
+
+        :return: dict with in_flight (queue depth), max_in_flight, accepted, rejected, completed
+        """
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'completed': self.completed,
+        }
+
+
+def service_unavailable(environ, start_response):
+    """WSGI application for requests over limit"""
+    body = b'{"error": "Service Unavailable"}'
+    start_response('503 Service Unavailable', [
+        ('Content-Type', 'application/json'),
+        ('Content-Length', str(len(body))),
+        ('Retry-After', '1'),
+    ])
+    return [body]
+
+
 def base_run(app, port=5000, **kwargs):  # pragma: no cover
     """Run app in base run, for debugging and testing
 
@@ -10,7 +88,8 @@ def base_run(app, port=5000, **kwargs):  # pragma: no cover
 
 
 def gevent_run(app, port=5000, log=None, error_log=None, address='',
-               monkey_patch=True, start=True, **kwargs):  # pragma: no cover
+               monkey_patch=True, start=True, max_in_flight=None,
+               **kwargs):  # pragma: no cover
     """Run your app in gevent.wsgi.WSGIServer
 
     :param app: wsgi application, ex. Microservice instance
@@ -20,6 +99,7 @@ def gevent_run(app, port=5000, log=None, error_log=None, address='',
     :param error_log: logger instance, default app.logger
     :param monkey_patch: boolean, use gevent.monkey.patch_all() for patching standard modules, default: True
     :param start: boolean, if True, server will be start (server.serve_forever())
+    :param max_in_flight: max count of handled requests, server does not accept connections over limit
     :param kwargs: other params for WSGIServer(**kwargs)
     :return: server
     """
@@ -33,6 +113,10 @@ def gevent_run(app, port=5000, log=None, error_log=None, address='',
         monkey.patch_all()
 
     from gevent.wsgi import WSGIServer
+    if max_in_flight:
+        from gevent.pool import Pool
+
+        kwargs['spawn'] = Pool(max_in_flight)
     http_server = WSGIServer((address, port), app, log=log, error_log=error_log,
                              **kwargs)
     if start:
@@ -57,7 +141,8 @@ def tornado_stop():  # pragma: no cover
 
 def tornado_run(app, port=5000, address="", use_gevent=False, start=True,
                 monkey_patch=None, Container=None,
-                Server=None, threadpool=None):  # pragma: no cover
+                Server=None, threadpool=None, max_in_flight=None,
+                overload='reject', limiter=None):  # pragma: no cover
     """Run your app in one tornado event loop process
 
     :param app: wsgi application, Microservice instance
@@ -68,7 +153,11 @@ def tornado_run(app, port=5000, address="", use_gevent=False, start=True,
     :param Container: your class, bases on tornado.wsgi.WSGIContainer, default: tornado.wsgi.WSGIContainer
     :param monkey_patch: boolean, use gevent.monkey.patch_all() for patching standard modules, default: use_gevent
     :param Server: your class, bases on tornado.httpserver.HTTPServer, default: tornado.httpserver.HTTPServer
-    :return: tornado server
+    :param threadpool: ThreadPool or count of threads, app.wsgi will be run in thread pool
+    :param max_in_flight: for gevent and threadpool, max count of handled and queued requests
+    :param overload: 'reject' - fast 503 over limit, 'block' - server does not accept requests until free slot
+    :param limiter: InFlightLimiter, shared between servers, default - new limiter
+    :return: tornado server, server.limiter - InFlightLimiter for gevent and threadpool
     """
     if Container is None:
         from tornado.wsgi import WSGIContainer
@@ -83,6 +172,9 @@ def tornado_run(app, port=5000, address="", use_gevent=False, start=True,
 
     CustomWSGIContainer = Container
 
+    def reject(*args, **kwargs):
+        Container(service_unavailable)(*args, **kwargs)
+
     if use_gevent:
         if monkey_patch:
             from gevent import monkey
@@ -92,8 +184,14 @@ def tornado_run(app, port=5000, address="", use_gevent=False, start=True,
 
         class GeventWSGIContainer(Container):
             def __call__(self, *args, **kwargs):
+                if not limiter.acquire():
+                    return reject(*args, **kwargs)
+
                 def async_task():
-                    super(GeventWSGIContainer, self).__call__(*args, **kwargs)
+                    try:
+                        super(GeventWSGIContainer, self).__call__(*args, **kwargs)
+                    finally:
+                        limiter.release()
 
                 gevent.spawn(async_task)
 
@@ -107,14 +205,24 @@ def tornado_run(app, port=5000, address="", use_gevent=False, start=True,
 
         class ThreadPoolWSGIContainer(Container):
             def __call__(self, *args, **kwargs):
+                if not limiter.acquire():
+                    return reject(*args, **kwargs)
+
                 def async_task():
-                    super(ThreadPoolWSGIContainer, self).__call__(*args, **kwargs)
+                    try:
+                        super(ThreadPoolWSGIContainer, self).__call__(*args, **kwargs)
+                    finally:
+                        limiter.release()
 
                 threadpool.apply_async(async_task)
 
         CustomWSGIContainer = ThreadPoolWSGIContainer
 
+    if limiter is None and (use_gevent or threadpool is not None):
+        # after monkey patching, limiter waits greenlets
+        limiter = InFlightLimiter(max_in_flight, overload)
     http_server = Server(CustomWSGIContainer(app))
+    http_server.limiter = limiter
     http_server.listen(port, address)
     if start:
         tornado_start()
@@ -122,7 +230,8 @@ def tornado_run(app, port=5000, address="", use_gevent=False, start=True,
 
 
 def tornado_combiner(configs, use_gevent=False, start=True, monkey_patch=None,
-                     Container=None, Server=None, threadpool=None):  # pragma: no cover
+                     Container=None, Server=None, threadpool=None,
+                     max_in_flight=None, overload='reject'):  # pragma: no cover
     """Combine servers in one tornado event loop process
 
     :param configs: [
@@ -138,6 +247,8 @@ def tornado_combiner(configs, use_gevent=False, start=True, monkey_patch=None,
     :param Container: your class, bases on tornado.wsgi.WSGIContainer, default: tornado.wsgi.WSGIContainer
     :param Server: your class, bases on tornado.httpserver.HTTPServer, default: tornado.httpserver.HTTPServer
     :param monkey_patch: boolean, use gevent.monkey.patch_all() for patching standard modules, default: use_gevent
+    :param max_in_flight: for gevent and threadpool, max count of handled and queued requests for all servers
+    :param overload: 'reject' - fast 503 over limit, 'block' - servers do not accept requests until free slot
     :return: list of tornado servers
     """
     servers = []
@@ -155,6 +266,11 @@ def tornado_combiner(configs, use_gevent=False, start=True, monkey_patch=None,
         if not isinstance(threadpool, ThreadPool):
             threadpool = ThreadPool(threadpool)
 
+    limiter = None
+    if use_gevent or threadpool is not None:
+        # servers share one pool, so limit is shared too
+        limiter = InFlightLimiter(max_in_flight, overload)
+
     for config in configs:
         app = config['app']
         port = config.get('port', 5000)
@@ -162,8 +278,234 @@ def tornado_combiner(configs, use_gevent=False, start=True, monkey_patch=None,
         server = tornado_run(app, use_gevent=use_gevent, port=port,
                              monkey_patch=False, address=address, start=False,
                              Container=Container,
-                             Server=Server, threadpool=threadpool)
+                             Server=Server, threadpool=threadpool,
+                             limiter=limiter)
         servers.append(server)
     if start:
         tornado_start()
     return servers
+
+
+class MaxRequestsMiddleware(object):
+    """Count requests of worker, call on_limit() after max_requests"""
+
+    def __init__(self, app, max_requests, on_limit):
+        self.app = app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self.requests = 0
+
+    def __call__(self, environ, start_response):
+        self.requests += 1
+        if self.max_requests and self.requests == self.max_requests:
+            self.on_limit()
+        return self.app(environ, start_response)
+
+
+def _base_worker(app, sock, heartbeat=None, **kwargs):  # pragma: no cover
+    """Serve shared socket with werkzeug server, request by request"""
+    import signal
+    import time
+    from werkzeug.serving import make_server
+
+    state = {'stop': False}
+
+    def stop(*args):
+        state['stop'] = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, MaxRequestsMiddleware(
+        app, kwargs.get('max_requests'), stop), fd=sock.fileno(), **kwargs.get('server_options', {}))
+    server.timeout = 1
+    while not state['stop']:
+        if heartbeat is not None:
+            heartbeat.value = time.time()
+        server.handle_request()
+    server.server_close()
+
+
+def _gevent_worker(app, sock, heartbeat=None, **kwargs):  # pragma: no cover
+    """Serve shared socket with gevent.pywsgi.WSGIServer"""
+    if kwargs.get('monkey_patch', True):
+        from gevent import monkey
+
+        monkey.patch_all()
+
+    import signal
+    import time
+    import gevent
+    from gevent.pywsgi import WSGIServer
+
+    def stop(*args):
+        gevent.spawn(server.stop, timeout=kwargs.get('stop_timeout'))
+
+    server = WSGIServer(sock, MaxRequestsMiddleware(
+        app, kwargs.get('max_requests'), stop), log=app.logger,
+        error_log=app.logger, **kwargs.get('server_options', {}))
+
+    def beat():
+        while True:
+            heartbeat.value = time.time()
+            gevent.sleep(1)
+
+    if heartbeat is not None:
+        gevent.spawn(beat)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    server.serve_forever()
+
+
+def _tornado_worker(app, sock, heartbeat=None, **kwargs):  # pragma: no cover
+    """Serve shared socket with tornado HTTPServer in new ioloop"""
+    import signal
+    import time
+    from tornado.httpserver import HTTPServer
+    from tornado.ioloop import IOLoop, PeriodicCallback
+    from tornado.wsgi import WSGIContainer
+
+    loop = IOLoop.current()
+
+    def stop_loop():
+        server.stop()
+        loop.stop()
+
+    def stop(*args):
+        loop.add_callback_from_signal(stop_loop)
+
+    def limit():
+        loop.add_callback(stop_loop)
+
+    server = HTTPServer(WSGIContainer(MaxRequestsMiddleware(
+        app, kwargs.get('max_requests'), limit)),
+        **kwargs.get('server_options', {}))
+    server.add_sockets([sock])
+
+    def beat():
+        heartbeat.value = time.time()
+
+    if heartbeat is not None:
+        PeriodicCallback(beat, 1000).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    loop.start()
+
+
+prefork_workers = {
+    'base': _base_worker,
+    'gevent': _gevent_worker,
+    'tornado': _tornado_worker,
+}
+
+
+def _prefork_worker(server, app, sock, max_requests=None,
+                    max_requests_jitter=0, heartbeat=None,
+                    **kwargs):  # pragma: no cover
+    import random
+
+    if max_requests and max_requests_jitter:
+        max_requests += random.randint(0, max_requests_jitter)
+    prefork_workers[server](app, sock, heartbeat=heartbeat,
+                            max_requests=max_requests, **kwargs)
+
+
+def bind_socket(port=5000, address='', backlog=2048):
+    """Create listening socket for sharing between workers
+
+    :param port: port for listen, int, default: 5000
+    :param address: address for listen, str, default: ""
+    :param backlog: size of queue of not accepted connections
+    :return: non blocking socket.socket
+    """
+    import socket
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((address, port))
+    sock.listen(backlog)
+    # workers accept on one socket, accept should not block, if other worker got connection
+    sock.setblocking(False)
+    return sock
+
+
+def prefork_run(app, port=5000, address='', workers=None, server='base',
+                max_requests=None, max_requests_jitter=0, timeout=None,
+                restart_timeout=1, stop_timeout=30, start=True,
+                monkey_patch=True, backlog=2048, **kwargs):  # pragma: no cover
+    """Bind socket once and serve it in forked worker processes
+
+    SIGTERM/SIGINT - graceful stop of workers, SIGHUP - graceful reload (new workers are started, old are stopped)
+    Workers are forked with app and socket, platform without fork (ex. Windows) is not supported.
+
+    :param app: wsgi application, Microservice instance
+    :param port: port for listen, int, default: 5000
+    :param address: address for listen, str, default: ""
+    :param workers: count of worker processes, default - count of cpu
+    :param server: backend of worker: 'base' (werkzeug), 'gevent' or 'tornado', default: 'base'
+    :param max_requests: worker is restarted after max_requests, default - None (without limit)
+    :param max_requests_jitter: random 0..jitter is added to max_requests, workers are not restarted at the same time
+    :param timeout: seconds, worker without heartbeat is killed and restarted, default - None
+    :param restart_timeout: seconds before restart of exited worker
+    :param stop_timeout: seconds for graceful stop of worker, after it worker is killed
+    :param start: if True, supervisor will be run in current process until SIGTERM/SIGINT
+    :param monkey_patch: for gevent, use gevent.monkey.patch_all() in workers, default: True
+    :param backlog: size of queue of not accepted connections
+    :param kwargs: other params for server (make_server, WSGIServer or HTTPServer)
+    :return: microservices.helpers.prefork.PreforkSupervisor, supervisor.socket - listening socket
+    :raise ValueError: if fork is not available on the platform
+    """
+    from microservices.helpers.prefork import PreforkSupervisor
+
+    if server not in prefork_workers:
+        raise ValueError('Unknown server "{}", use one of: {}'.format(
+            server, ', '.join(sorted(prefork_workers))))
+    sock = bind_socket(port, address, backlog)
+    options = {
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests_jitter,
+        'server_options': kwargs,
+    }
+    if server == 'gevent':
+        options['monkey_patch'] = monkey_patch
+        options['stop_timeout'] = stop_timeout
+    supervisor = PreforkSupervisor(
+        _prefork_worker, args=(server, app, sock), kwargs=options,
+        processes=workers, restart_timeout=restart_timeout,
+        stop_timeout=stop_timeout, timeout=timeout, logger=app.logger)
+    supervisor.socket = sock
+    if start:
+        supervisor.handle_signals()
+        try:
+            supervisor.run()
+        finally:
+            sock.close()
+    return supervisor
+
+
+def asyncio_run(app, port=5000, address='', start=True,
+                **kwargs):  # pragma: no cover
+    """Run AsyncMicroservice (or any ASGI application) in asyncio event loop
+
+    :param app: AsyncMicroservice instance or ASGI application
+    :param port: port for listen, int, default: 5000
+    :param address: address for listen, str, default: ""
+    :param start: if True, event loop will be run forever
+    :param kwargs: other params for ASGIServer
+    :return: microservices.http.async_service.ASGIServer
+    """
+    import asyncio
+    from microservices.http.async_service import ASGIServer
+
+    server = ASGIServer(getattr(app, 'asgi', app),
+                        logger=getattr(app, 'logger', None), **kwargs)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(server.start(port, address))
+    if start:
+        try:
+            loop.run_forever()
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+    return server
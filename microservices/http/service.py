@@ -1,12 +1,16 @@
 # coding=utf-8
+import copy
 
-from flask import Blueprint
+from flask import Blueprint, request
 from flask_api import FlaskAPI
 from microservices.utils import dict_update
 
+from microservices.http.helpers import IndexedMap, ResourcesIndex
 from microservices.http.settings import MicroserviceAPISettings
+from microservices.http.renderers import SchemaRenderer
 from microservices.http.resources import ResourceSchema
-from functools import reduce
+from microservices.http.timings import HTTPMetrics, MicroserviceRequest, \
+    RequestTimings, get_timings
 
 from flask_api import app
 
@@ -22,7 +26,18 @@ except ImportError:  # pragma: no cover
 
 
 class Microservice(FlaskAPI):
+    url_map_class = IndexedMap
+    request_class = MicroserviceRequest
+
     def __init__(self, *args, **kwargs):
+        """Initialization, arguments of Flask and:
+
+        :param api_resources: Blueprint for static files of browsable api
+        :param metrics: MetricsRegistry for latency of requests per rule,
+            see microservices.http.timings.HTTPMetrics, default - without timing
+        """
+        metrics = kwargs.pop('metrics', None)
+        self.http_metrics = HTTPMetrics(metrics) if metrics is not None else None
         api_resources = kwargs.pop('api_resources', None)
         if api_resources is None:
             api_resources = Blueprint(
@@ -32,6 +47,9 @@ class Microservice(FlaskAPI):
             )
         app.api_resources = api_resources
         self.resources = {}
+        # (rule, browser): (resource, RenderPlan), compiled in add_resource
+        self.render_plans = {}
+        self.resources_index = ResourcesIndex(self.resources)
         super(Microservice, self).__init__(*args, **kwargs)
         self.api_settings = MicroserviceAPISettings(self.config)
 
@@ -47,42 +65,96 @@ class Microservice(FlaskAPI):
             resource_schema = resource.get('schema', {})
             if resource_schema:
                 schema.update(resource_schema)
+            if schema.get('browser') is self.api_settings.SCHEMA.get('browser'):
+                # SCHEMA of settings is shared
+                schema['browser'] = copy.copy(schema['browser'])
             resource['schema'] = schema
             in_resources = resource.get('in_resources')
             if in_resources is None:
                 in_resources = self.api_settings.IN_RESOURCES[:]
             resource['in_resources'] = in_resources
             self.resources[rule] = dict_update(orig_resource, resource)
+            self.resources_index.invalidate()
+            self.compile_render_plans(rule)
+
+    def compile_render_plans(self, rule):
+        """Compile plans of SchemaRenderer for resource of rule
+
+        Call it after changing of resource schema in place
+        """
+        resource = self.resources[rule]
+        for browser in (False, True):
+            self.render_plans.pop((rule, browser), None)
+        self.render_plans[(rule, False)] = (
+            resource, SchemaRenderer.compile_plan(resource))
+        if 'browser' in resource['schema']:
+            self.render_plans[(rule, True)] = (
+                resource, SchemaRenderer.compile_plan(resource, browser=True))
+
+    def get_path_rules(self, rule):
+        """Rules of url_map for path"""
+        rules_by_path = getattr(self.url_map, 'rules_by_path', None)
+        if rules_by_path is None:
+            # url_map was replaced
+            return [rule_info for rule_info in self.url_map.iter_rules()
+                    if rule_info.rule == rule]  # pragma: no cover
+        return rules_by_path.get(rule, [])
 
     def add_url_rule(self, rule, endpoint=None, view_func=None, **options):
         resource = options.pop('resource_marker', options.pop('resource', None))
         super(Microservice, self).add_url_rule(rule, endpoint=endpoint,
                                                view_func=view_func, **options)
         if resource is not None:
-            rule_infos = [
-                rule_info
-                for rule_info in self.url_map._rules
-                if rule_info.rule == rule
-                ]
-            methods = list(
-                set(
-                    reduce(
-                        lambda i, j: list(i) + list(j),
-                        [
-                            rule_info.methods
-                            for rule_info in rule_infos
-                            ]
-                    )
-                )
-            )
-            endpoints = reduce(
-                lambda i, j: [i, j],
-                [
-                    rule_info.endpoint
-                    for rule_info in rule_infos
-                    ]
-            )
-            if not isinstance(endpoints, list):
-                endpoints = [endpoints]
+            rule_infos = self.get_path_rules(rule)
+            methods = set()
+            for rule_info in rule_infos:
+                methods.update(rule_info.methods or ())
+            endpoints = [rule_info.endpoint for rule_info in rule_infos]
             self.add_resource(resource, rule, endpoints=endpoints,
-                              methods=methods)
+                              methods=list(methods))
+
+    def add_metrics_resource(self, rule='/metrics/', endpoint='metrics'):
+        """Add resource with metrics in Prometheus text format
+
+        :param rule: path of resource, default: "/metrics/"
+        :param endpoint: endpoint of resource, default: "metrics"
+        """
+        if self.http_metrics is None:
+            raise ValueError('Microservice is created without metrics')
+        self.add_url_rule(rule, endpoint, self.http_metrics.view,
+                          methods=['GET'])
+
+    def start_timings(self):
+        """Timings for current request, None if metrics are disabled"""
+        if self.http_metrics is None:
+            return None
+        timings = request.timings = RequestTimings()
+        return timings
+
+    def observe_timings(self, timings, response):
+        url_rule = request.url_rule
+        self.http_metrics.observe(
+            timings, url_rule.rule if url_rule is not None else None,
+            request.method,
+            response.status_code if response is not None else 500)
+
+    def full_dispatch_request(self):
+        timings = self.start_timings()
+        if timings is None:
+            return super(Microservice, self).full_dispatch_request()
+        response = None
+        try:
+            response = super(Microservice, self).full_dispatch_request()
+            return response
+        finally:
+            self.observe_timings(timings, response)
+
+    def dispatch_request(self):
+        timings = get_timings()
+        if timings is None:
+            return super(Microservice, self).dispatch_request()
+        started = timings.start()
+        try:
+            return super(Microservice, self).dispatch_request()
+        finally:
+            timings.stop('view', started)
@@ -1,40 +1,81 @@
 from flask_api import settings
 
-from microservices.http.renderers import MicroserviceJSONRenderer, MicroserviceBrowsableAPIRenderer
+from microservices.helpers.serializers import get_serializer
+from microservices.http.renderers import MicroserviceJSONRenderer, MicroserviceBrowsableAPIRenderer, \
+    json_default
 from microservices.http.resources import ResourceSchema
 
 
+def cached_setting(resolve):
+    """Property of settings, resolve(settings, config value or None) is called once
+
+    Value is resolved again when config value is replaced (app.config['SCHEMA'] = ...)
+    or after settings.invalidate()
+    """
+    name = resolve.__name__
+
+    def getter(self):
+        value = self.user_config.get(name)
+        cached = self._cache.get(name)
+        if cached is None or cached[0] is not value:
+            cached = self._cache[name] = (value, resolve(self, value))
+        return cached[1]
+
+    return property(getter, doc=resolve.__doc__)
+
+
 class MicroserviceAPISettings(settings.APISettings):
-    @property
-    def IN_RESOURCES(self):
-        default = [
-            'methods',
-            'url',
-        ]
-        return self.user_config.get('IN_RESOURCES', default)
-
-    @property
-    def DEFAULT_PARSERS(self):
-        default = [
-            'flask_api.parsers.JSONParser',
-            'flask_api.parsers.URLEncodedParser',
-            'flask_api.parsers.MultiPartParser'
-        ]
-        val = self.user_config.get('DEFAULT_PARSERS', default)
+    """Settings from app.config, resolved values are cached and shared, don't modify them
+
+    Call invalidate() after changing of config value in place, ex. app.config['SCHEMA'].update(...)
+    """
+
+    def __init__(self, user_config=None):
+        super(MicroserviceAPISettings, self).__init__(user_config)
+        self._cache = {}
+
+    def invalidate(self):
+        """Drop resolved values, they will be resolved from config again"""
+        self._cache = {}
+
+    @cached_setting
+    def IN_RESOURCES(self, val):
+        if val is None:
+            val = [
+                'methods',
+                'url',
+            ]
+        return val
+
+    @cached_setting
+    def DEFAULT_PARSERS(self, val):
+        if val is None:
+            val = [
+                'flask_api.parsers.JSONParser',
+                'flask_api.parsers.URLEncodedParser',
+                'flask_api.parsers.MultiPartParser'
+            ]
         return settings.perform_imports(val, 'DEFAULT_PARSERS')
 
-    @property
-    def DEFAULT_RENDERERS(self):
-        default = [
-            MicroserviceJSONRenderer,
-            MicroserviceBrowsableAPIRenderer,
-        ]
-        val = self.user_config.get('DEFAULT_RENDERERS', default)
+    @cached_setting
+    def DEFAULT_RENDERERS(self, val):
+        if val is None:
+            val = [
+                MicroserviceJSONRenderer,
+                MicroserviceBrowsableAPIRenderer,
+            ]
         return settings.perform_imports(val, 'DEFAULT_RENDERERS')
 
-    @property
-    def SCHEMA(self):
+    @cached_setting
+    def SCHEMA(self, val):
         default = ResourceSchema()
-        user_schema = self.user_config.get('SCHEMA', default)
-        default.update(user_schema)
-        return default
\ No newline at end of file
+        if val is not None:
+            default.update(val)
+        return default
+
+    @cached_setting
+    def JSON_SERIALIZER(self, val):
+        """Serializer for MicroserviceJSONRenderer: "json", "orjson", "auto" or instance"""
+        if val is None:
+            val = 'json'
+        return get_serializer(val, default=json_default)
@@ -0,0 +1,166 @@
+import threading
+
+import six
+
+from microservices.helpers.metrics import DEFAULT_BUCKETS, Histogram
+
+
+class RequestInfo(object):
+    """Information about request of Client for hooks, times in seconds
+
+    connect - time of connecting with TLS handshake, 0 for kept alive connection,
+    ttfb - time to the first byte (headers of response), total - time of request,
+    None - not measured, ex. connection error.
+    """
+
+    __slots__ = ('method', 'url', 'resource', 'status', 'connect', 'ttfb',
+                 'total', 'request_size', 'response_size', 'response', 'error')
+
+    def __init__(self, method, url, resource):
+        """Initialization
+
+        :param method: http method, GET, POST, etc.
+        :param url: full url
+        :param resource: template of resource, ex. users/{id}
+        """
+        self.method = method
+        self.url = url
+        self.resource = resource
+        self.status = None
+        self.connect = None
+        self.ttfb = None
+        self.total = None
+        self.request_size = None
+        self.response_size = None
+        self.response = None
+        self.error = None
+
+    def __repr__(self):  # pragma: no cover
+        return '<RequestInfo {} {} {}: {}>'.format(
+            self.method, self.resource, self.status, self.total)
+
+
+class StatsRecord(object):
+    """Aggregated stats of requests with the same key"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.count = 0
+        self.total = Histogram(buckets)
+        self.max_total = 0
+        self.ttfb_sum = 0
+        self.ttfb_count = 0
+        self.connect_sum = 0
+        self.connections = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def add(self, info):
+        self.count += 1
+        if info.total is not None:
+            self.total.observe(info.total)
+            self.max_total = max(self.max_total, info.total)
+        if info.ttfb is not None:
+            self.ttfb_sum += info.ttfb
+            self.ttfb_count += 1
+        if info.connect:
+            self.connect_sum += info.connect
+            self.connections += 1
+        self.request_bytes += info.request_size or 0
+        self.response_bytes += info.response_size or 0
+
+    def percentile(self, q):
+        """Upper bound of bucket with q-percentile of total time
+
+        :param q: float, 0..1, ex. 0.95
+        :return: seconds, inf if it's bigger than last bucket, None without requests
+        """
+        value = self.total.collect()
+        rank = q * value['count']
+        for le, count in value['buckets']:
+            if count and count >= rank:
+                return le
+        return None
+
+    def summary(self):
+        total = self.total.collect()
+        return {
+            'count': self.count,
+            'total': total['sum'],
+            'avg_total': total['sum'] / total['count'] if total['count'] else None,
+            'max_total': self.max_total,
+            'p95_total': self.percentile(0.95),
+            'avg_ttfb': (self.ttfb_sum / self.ttfb_count
+                         if self.ttfb_count else None),
+            'connect': self.connect_sum,
+            'connections': self.connections,
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+        }
+
+
+class ClientStats(object):
+    """Stats of requests by (method, resource template, status), hook for Client
+
+    >>>stats = ClientStats()
+    >>>client = Client('http://localhost:5000', after_request=[stats])
+    >>>client.get('users', '1')
+    >>>stats.get('GET', 'users/{id}', 200).count
+    1
+    >>>stats.summary()  # the slowest first
+
+    Status is None for requests without response, ex. connection error.
+    """
+
+    def __init__(self, metrics=None, buckets=DEFAULT_BUCKETS):
+        """Initialization
+
+        :param metrics: MetricsRegistry, http_client_request_seconds is observed too, default - None
+        :param buckets: buckets of histograms of total time
+        """
+        self.metrics = metrics
+        self.buckets = buckets
+        self.records = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, client, info):
+        self.add(info, client)
+
+    def add(self, info, client=None):
+        """Add finished request
+
+        :param info: RequestInfo
+        :param client: Client, name of client is label of metrics
+        """
+        key = (info.method, info.resource, info.status)
+        with self._lock:
+            record = self.records.get(key)
+            if record is None:
+                record = self.records[key] = StatsRecord(self.buckets)
+            record.add(info)
+        if self.metrics is not None and info.total is not None:
+            status = info.status if info.status is not None else 'error'
+            self.metrics.histogram(
+                'http_client_request_seconds', 'Time of request of client, seconds',
+                client=six.text_type(client), method=info.method,
+                resource=info.resource, status=status,
+            ).observe(info.total)
+
+    def get(self, method, resource, status):
+        """:return: StatsRecord or None"""
+        return self.records.get((method, resource, status))
+
+    def summary(self):
+        """:return: list of dicts with stats, sorted by sum of total time, desc"""
+        with self._lock:
+            items = list(self.records.items())
+        result = []
+        for (method, resource, status), record in items:
+            summary = record.summary()
+            summary.update(method=method, resource=resource, status=status)
+            result.append(summary)
+        result.sort(key=lambda summary: summary['total'], reverse=True)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self.records = {}
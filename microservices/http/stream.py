@@ -0,0 +1,298 @@
+import json
+import re
+
+import six
+
+NDJSON_CONTENT_TYPES = ('ndjson', 'jsonl', 'json-seq', 'jsonlines')
+
+
+def is_ndjson(content_type):
+    """Check content type of newline delimited json
+
+    :param content_type: str, value of Content-Type header
+    :return: bool
+    """
+    content_type = (content_type or '').lower()
+    return any(name in content_type for name in NDJSON_CONTENT_TYPES)
+
+
+class ValueScanner(object):
+    """Cheap check of end of incomplete json value, chunk by chunk, without decoding
+
+    Brackets out of strings are counted for arrays, objects and strings,
+    for ndjson the end of line is searched. Value is decoded only if it could be complete,
+    so big value in many chunks is decoded once, not on every chunk.
+    """
+
+    __slots__ = ('ndjson', 'depth', 'in_string', 'escape')
+
+    _token = re.compile(r'["\[\]{}]')
+    _string_token = re.compile(r'["\\]')
+
+    def __init__(self, ndjson=False):
+        self.ndjson = ndjson
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text):
+        """Scan next chunk of value
+
+        :param text: str, the first chunk starts with value
+        :return: True if value could be complete
+        """
+        if self.ndjson:
+            return '\n' in text
+        if not text:
+            return False
+        pos = 0
+        if self.escape:
+            self.escape = False
+            pos = 1
+        length = len(text)
+        while pos < length:
+            if self.in_string:
+                match = self._string_token.search(text, pos)
+                if match is None:
+                    return False
+                pos = match.end()
+                if match.group() == '\\':
+                    pos += 1
+                    self.escape = pos > length
+                    continue
+                self.in_string = False
+                if not self.depth:
+                    return True
+                continue
+            match = self._token.search(text, pos)
+            if match is None:
+                return False
+            pos = match.end()
+            char = match.group()
+            if char == '"':
+                self.in_string = True
+            elif char in '[{':
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth <= 0:
+                    return True
+        return False
+
+
+class JSONStreamDecoder(object):
+    """Incremental decoder for items of json body
+
+    Body can be:
+        - json array: [item, item, ...]
+        - json object with array in response_key: {"response_key": [item, item, ...], ...}
+        - newline delimited json (or any json values, one by one): item\\nitem\\n...
+
+    >>>decoder = JSONStreamDecoder()
+    >>>decoder.feed('[1, 2, ')
+    [1, 2]
+    >>>decoder.feed('3]')
+    [3]
+    >>>decoder.close()
+    []
+
+    Only the current item is kept in memory, incomplete item is decoded again only
+    when it could be complete (see ValueScanner).
+    """
+
+    _whitespace = ' \t\n\r'
+
+    def __init__(self, response_key=None, ndjson=False):
+        """Initialization
+
+        :param response_key: key of array in json object, for ndjson - key in every item
+        :param ndjson: if True - body is a newline delimited json
+        """
+        self.response_key = response_key
+        self.ndjson = ndjson
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        # chunks of incomplete value, they are added to buffer when value could be complete
+        self._chunks = []
+        self._scanner = None
+        self._closed = False
+        self._state = 'start'
+        self._name = None
+
+    def feed(self, text):
+        """Add text of body
+
+        :param text: str, next chunk of body
+        :return: list of decoded items
+        """
+        scanner = self._scanner
+        if scanner is not None:
+            self._chunks.append(text)
+            if not scanner.feed(text):
+                return []
+            text = self._flush_chunks()
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return list(self._parse())
+
+    def _flush_chunks(self):
+        text = ''.join(self._chunks)
+        self._chunks = []
+        self._scanner = None
+        return text
+
+    def close(self):
+        """End of body
+
+        :return: list of decoded items
+        :raise ValueError: if body is not complete
+        """
+        self._closed = True
+        if self._scanner is not None:
+            self._buffer = self._buffer[self._pos:] + self._flush_chunks()
+            self._pos = 0
+        items = list(self._parse())
+        if self._state not in ('start', 'values', 'end'):
+            raise ValueError('Unexpected end of json body')
+        return items
+
+    def _next_char(self):
+        buffer, pos = self._buffer, self._pos
+        length = len(buffer)
+        while pos < length and buffer[pos] in self._whitespace:
+            pos += 1
+        self._pos = pos
+        if pos < length:
+            return buffer[pos]
+        return None
+
+    def _value(self):
+        """Decode next json value
+
+        :return: (True, value) or (False, None) if more data is required
+        """
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except ValueError:
+            if self._closed or not self._wait():
+                raise
+            return False, None
+        # number at the end of buffer can be continued in the next chunk
+        if end == len(self._buffer) and not self._closed:
+            return False, None
+        self._pos = end
+        return True, value
+
+    def _wait(self):
+        """Wait next chunks of incomplete value
+
+        :return: False if value is complete, but invalid
+        """
+        if not self.ndjson and self._buffer[self._pos] not in '[{"':
+            # number or literal is short, it's decoded again on next chunk
+            return True
+        scanner = ValueScanner(self.ndjson)
+        if scanner.feed(self._buffer[self._pos:]) and not self.ndjson:
+            return False
+        # for ndjson the next line break is waited, value can be multiline
+        self._scanner = scanner
+        return True
+
+    def _key_value(self, value):
+        if not isinstance(value, dict) or self.response_key not in value:
+            raise ValueError('Response key not found!')
+        return value[self.response_key]
+
+    def _parse(self):
+        while True:
+            state = self._state
+            if state == 'end':
+                self._pos = len(self._buffer)
+                return
+            char = self._next_char()
+            if char is None:
+                return
+
+            if state == 'start':
+                if self.ndjson:
+                    self._state = 'values'
+                elif char == '[':
+                    if self.response_key is not None:
+                        raise ValueError('Response key not found!')
+                    self._pos += 1
+                    self._state = 'array'
+                elif char == '{' and self.response_key is not None:
+                    self._pos += 1
+                    self._state = 'object'
+                else:
+                    self._state = 'values'
+
+            elif state == 'values':
+                found, value = self._value()
+                if not found:
+                    return
+                if self.response_key is not None:
+                    value = self._key_value(value)
+                yield value
+
+            elif state == 'array':
+                if char == ']':
+                    self._pos += 1
+                    self._state = 'end'
+                    continue
+                found, value = self._value()
+                if not found:
+                    return
+                self._state = 'array_separator'
+                yield value
+
+            elif state == 'array_separator':
+                self._pos += 1
+                if char == ',':
+                    self._state = 'array'
+                elif char == ']':
+                    self._state = 'end'
+                else:
+                    raise ValueError('Invalid json array')
+
+            elif state == 'object':
+                if char == '}':
+                    raise ValueError('Response key not found!')
+                if char == ',':
+                    self._pos += 1
+                    continue
+                found, name = self._value()
+                if not found:
+                    return
+                if not isinstance(name, six.string_types):
+                    raise ValueError('Invalid json object')
+                self._name = name
+                self._state = 'object_colon'
+
+            elif state == 'object_colon':
+                if char != ':':
+                    raise ValueError('Invalid json object')
+                self._pos += 1
+                if self._name == self.response_key:
+                    self._state = 'key_value'
+                else:
+                    self._state = 'skip_value'
+
+            elif state == 'skip_value':
+                found, _ = self._value()
+                if not found:
+                    return
+                self._state = 'object'
+
+            elif state == 'key_value':
+                if char == '[':
+                    self._pos += 1
+                    self._state = 'array'
+                    continue
+                found, value = self._value()
+                if not found:
+                    return
+                self._state = 'end'
+                if value is not None:
+                    yield value
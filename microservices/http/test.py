@@ -1,4 +1,5 @@
 import json
+import sys
 import unittest
 
 import six
@@ -43,8 +44,19 @@ class MockRequest(object):
         return self.response
 
 
+_requests_request = requests.request
+_session_request = requests.Session.request
+
+
 def patch_requests(request):
     requests.request = request
+    requests.Session.request = lambda session, *args, **kwargs: request(
+        *args, **kwargs)
+
+
+def unpatch_requests():
+    requests.request = _requests_request
+    requests.Session.request = _session_request
 
 
 class TestService(TestHTTP):
@@ -78,8 +90,28 @@ class TestService(TestHTTP):
 
         self.assertEqual(data['test'], 'tested')
 
+    def test_rules_index(self):
+        from werkzeug.routing import Rule
+        from microservices.http.resources import ResourceMarker
+
+        self.app.url_map.add(Rule('/users/', endpoint='users_head',
+                                  methods=['HEAD']))
+        self.app.add_url_rule('/users/', 'users_list', lambda: [],
+                              methods=['GET'])
+        self.app.add_url_rule('/users/', 'users_create', lambda: {},
+                              methods=['POST'], resource=ResourceMarker())
+        resource = self.app.resources['/users/']
+        self.assertEqual(resource['endpoints'],
+                         ['users_head', 'users_list', 'users_create'])
+        self.assertEqual(sorted(resource['methods']),
+                         ['GET', 'HEAD', 'OPTIONS', 'POST'])
+        self.assertEqual(len(self.app.url_map.rules_by_path['/users/']), 3)
+
 
 class TestClient(unittest.TestCase):
+    def tearDown(self):
+        unpatch_requests()
+
     def test_client(self):
         from microservices.http.client import Client, ResponseError
 
@@ -181,6 +213,860 @@ class TestClient(unittest.TestCase):
 
         self.assertEqual(logger.name, 'jopa_test')
 
+    def test_serializer(self):
+        from microservices.http.client import Client
+
+        sent = []
+
+        def test_request(instance, method, url, **kwargs):
+            sent.append(kwargs)
+
+        patch_requests(
+            MockRequest(handler=test_request, _content=b'{"response": "tested"}',
+                        status_code=200))
+        try:
+            client = Client('http://endpoint/', serializer='auto')
+            response = client.post('one', data={'test': 'tested'}, key='response',
+                                   headers={'X-Test': 'tested'})
+            self.assertEqual(response, 'tested')
+            self.assertEqual(client.serializer.loads(sent[0]['data']),
+                             {'test': 'tested'})
+            self.assertNotIn('json', sent[0])
+            self.assertEqual(sent[0]['headers'], {
+                'X-Test': 'tested', 'Content-Type': 'application/json'})
+        finally:
+            unpatch_requests()
+
+
+class TestClientUrl(unittest.TestCase):
+    def test_url_for(self):
+        from microservices.http.client import Client
+
+        client = Client('http://endpoint/api;p?token=1&blank=#top',
+                        url_cache_size=2)
+        self.assertEqual(client.url_for(), 'http://endpoint/api/;p?token=1&blank=#top')
+        self.assertEqual(client.url_for('one/two', {'a': '1'}, params='x', fragment='f'),
+                         'http://endpoint/api/one/two/;x?token=1&blank=&a=1#f')
+        self.assertEqual(client.url_for('one', 'token=2&b='),
+                         'http://endpoint/api/one/;p?token=2&blank=&b=#top')
+        self.assertEqual(len(client.url_cache), 2)
+        self.assertEqual(client.url_for('one', {}),
+                         'http://endpoint/api/one/;p?token=1&blank=#top')
+
+        client = Client('http://endpoint', close_slash=False, url_cache_size=0)
+        self.assertEqual(client.url_for(), 'http://endpoint')
+        self.assertEqual(client.url_for('one', {'a': ['1', '2']}),
+                         'http://endpoint/one?a=1&a=2')
+        self.assertEqual(len(client.url_cache), 0)
+
+        client.path = '/api'
+        client.compile_endpoint()
+        self.assertEqual(client.url_for('one'), 'http://endpoint/api/one')
+
+
+class TestClientPool(unittest.TestCase):
+    def test_session(self):
+        from microservices.http.client import Client
+        from microservices.http.adapters import PoolAdapter
+
+        client = Client('http://endpoint/', pool_maxsize=3,
+                        keep_alive_timeout=5, max_requests_per_connection=2)
+        adapter = client.session.get_adapter('http://endpoint/')
+        self.assertIsInstance(adapter, PoolAdapter)
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertEqual(adapter.keep_alive_timeout, 5)
+        self.assertEqual(adapter.max_requests, 2)
+        self.assertIs(client.session.get_adapter('https://endpoint/'), adapter)
+
+        resource = client.resource('one').resource('two')
+        self.assertIs(resource.client.session, client.session)
+        client.close()
+
+    def test_keep_alive_pool(self):
+        import time
+        from microservices.http.adapters import PoolAdapter
+
+        class Connection(object):
+            closed = 0
+            is_connected = True
+            sock = False
+
+            def close(self):
+                self.closed += 1
+
+        adapter = PoolAdapter(pool_maxsize=1, keep_alive_timeout=60,
+                              max_requests=2)
+        pool = adapter.poolmanager.connection_from_url('http://endpoint/')
+        conn = Connection()
+        pool._get_conn()
+        pool._put_conn(conn)
+        self.assertIs(pool._get_conn(), conn)
+        self.assertEqual(conn.closed, 0)
+        pool._put_conn(conn)
+        self.assertIs(pool._get_conn(), conn)
+        self.assertEqual(conn.closed, 1)
+        pool._put_conn(conn)
+        conn._microservices_released = time.time() - 61
+        pool._get_conn()
+        self.assertEqual(conn.closed, 2)
+
+
+def start_server(handler):
+    """Start local keep-alive http server in thread
+
+    :param handler: function(request_handler) -> (status_code, body), body - bytes or iterator of chunks
+    :return: (server, endpoint)
+    """
+    import threading
+    from six.moves import BaseHTTPServer, socketserver
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def answer(self):
+            status_code, body = handler(self)
+            self.send_response(status_code)
+            self.send_header('Content-Type', 'application/json')
+            if isinstance(body, bytes):
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for chunk in body:
+                size = '{:x}\r\n'.format(len(chunk)).encode('ascii')
+                self.wfile.write(b''.join((size, chunk, b'\r\n')))
+                self.wfile.flush()
+            self.wfile.write(b'0\r\n\r\n')
+
+        do_GET = do_POST = answer
+
+        def log_message(self, *args, **kwargs):
+            pass
+
+    class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+def skip_without_aiohttp(test_case):
+    """AsyncClient requires python 3.5+ and aiohttp"""
+    if sys.version_info < (3, 5):
+        test_case.skipTest('async def is not available')
+    try:
+        import aiohttp  # noqa
+    except ImportError:  # pragma: no cover
+        test_case.skipTest('aiohttp is not installed')
+
+
+def gather_handler(request):
+    """/sleep/<seconds>/ - answer after delay, /status/<code>/ - answer with status,
+    /slow/<count>/<seconds>/ - stream count items with delay before every item
+    """
+    import time
+
+    parts = [part for part in request.path.split('/') if part]
+    if parts[0] == 'sleep':
+        time.sleep(float(parts[1]))
+        return 200, json.dumps({'response': parts[1]}).encode('utf8')
+    if parts[0] == 'slow':
+        def chunks():
+            yield b'{"response": ['
+            for i in range(int(parts[1])):
+                time.sleep(float(parts[2]))
+                yield (',' if i else '').encode('ascii') + str(i).encode('ascii')
+            yield b']}'
+
+        return 200, chunks()
+    return int(parts[1]), b'{"response": "status"}'
+
+
+class TestClientGather(unittest.TestCase):
+    def test_gather(self):
+        import time
+        from microservices.http.client import Client, ResponseError
+
+        server, endpoint = start_server(gather_handler)
+        client = Client(endpoint)
+        try:
+            start = time.time()
+            results = client.gather([
+                ('get', ('sleep', '0.3'), {'key': 'response'}),
+                ('get', ('sleep', '0.1'), {'key': 'response'}),
+                ('get', ('status', '500')),
+                ('get', 'status/404', {'key': 'response'}),
+            ])
+            self.assertLess(time.time() - start, 0.6)
+            self.assertEqual(results[:2], ['0.3', '0.1'])
+            self.assertIsInstance(results[2], ResponseError)
+            self.assertEqual(results[2].status_code, 500)
+            self.assertEqual(results[3], None)
+
+            results = client.map('get', [('sleep', '0.2')] * 4,
+                                 concurrency=2, key='response')
+            self.assertEqual(results, ['0.2'] * 4)
+
+            results = client.gather([
+                ('get', ('sleep', '0'), {'key': 'response'}),
+                ('get', ('sleep', '1'), {'key': 'response'}),
+                ('get', ('sleep', '0'), {'key': 'response'}),
+            ], concurrency=1, timeout=0.5)
+            self.assertEqual(results[0], '0')
+            self.assertIsInstance(results[1], ResponseError)
+            self.assertIsInstance(results[2], ResponseError)
+            self.assertEqual(results[2].status_code, None)
+            self.assertEqual(client.gather([]), [])
+
+            # threads are shared by calls, not created for every batch
+            pool = client.get_gather_pool()
+            client.map('get', [('sleep', '0')] * 3, key='response')
+            self.assertIs(client.get_gather_pool(), pool)
+        finally:
+            client.close()
+            server.shutdown()
+        self.assertIsNone(client._gather_pool)
+        self.assertFalse(any(thread.is_alive() for thread in pool._pool))
+
+
+class TestClientStats(unittest.TestCase):
+    def test_stats(self):
+        from microservices.helpers.metrics import MetricsRegistry
+        from microservices.http.client import Client, ResponseError
+        from microservices.http.stats import ClientStats
+
+        server, endpoint = start_server(gather_handler)
+        metrics = MetricsRegistry()
+        stats = ClientStats(metrics=metrics)
+        sent = []
+
+        def before_request(client, info, kwargs):
+            kwargs['headers'] = {'X-Request': info.resource}
+            sent.append((info.method, info.url))
+
+        client = Client(endpoint, name='gather', before_request=[before_request],
+                        stats=stats)
+        try:
+            self.assertEqual(client.get('sleep', '0.1', key='response'), '0.1')
+            client.get('sleep', '0', key='response')
+            self.assertRaises(ResponseError, client.get, 'status', '500')
+            # body is not read by server, so it's the last request
+            client.post('sleep', '0', data={'a': 1}, key='response',
+                        template='sleep/{seconds}')
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
+        client = Client('http://127.0.0.1:1', stats=True)
+        self.assertRaises(Exception, client.get, 'one', timeout=1)
+
+        self.assertEqual(sent[0], ('GET', endpoint + '/sleep/0.1/'))
+        self.assertEqual(client.resource_template(
+            ('users', '12', 'orders', '9b2c6e1a-53a0-4f1b-a8a2-3c8f29c1d4e5')),
+            'users/{id}/orders/{id}')
+        slow = stats.get('GET', 'sleep/0.1', 200)
+        self.assertEqual(slow.count, 1)
+        self.assertGreaterEqual(slow.max_total, 0.1)
+        self.assertEqual(slow.connections, 1)
+        fast = stats.get('GET', 'sleep/{id}', 200)
+        # kept alive connection
+        self.assertEqual(fast.connections, 0)
+        post = stats.get('POST', 'sleep/{seconds}', 200).summary()
+        self.assertEqual(post['request_bytes'], len(b'{"a": 1}'))
+        self.assertEqual(post['response_bytes'], len(b'{"response": "0"}'))
+        self.assertLessEqual(post['avg_ttfb'], post['avg_total'])
+        self.assertEqual(stats.get('GET', 'status/{id}', 500).count, 1)
+        self.assertEqual(stats.summary()[0]['resource'], 'sleep/0.1')
+        self.assertEqual(metrics.get('http_client_request_seconds', client='gather',
+                                     method='GET', resource='sleep/0.1',
+                                     status=200)['count'], 1)
+        self.assertEqual(client.stats.get('GET', 'one', None).count, 1)
+
+    def test_async_stats(self):
+        skip_without_aiohttp(self)
+        import asyncio
+        from microservices.http.async_client import AsyncClient
+
+        server, endpoint = start_server(gather_handler)
+        loop = asyncio.new_event_loop()
+        client = AsyncClient(endpoint, stats=True)
+        responses = []
+
+        def after_request(client, info):
+            responses.append(info.response)
+            if info.resource == 'status/{id}':
+                raise ValueError('tested')
+
+        try:
+            loop.run_until_complete(client.get('sleep', '0.1', key='response'))
+            items = loop.run_until_complete(client.get('sleep', '0', stream=True))
+            self.assertEqual(loop.run_until_complete(items.__anext__()),
+                             {'response': '0'})
+            self.assertRaises(StopAsyncIteration, loop.run_until_complete,
+                              items.__anext__())
+            stream = client.stats.get('GET', 'sleep/{id}', 200)
+            self.assertEqual(stream.count, 1)
+            self.assertEqual(stream.response_bytes, len(b'{"response": "0"}'))
+
+            # response of stream is released, if hook is failed
+            client.after_request_hooks.append(after_request)
+            self.assertRaises(ValueError, loop.run_until_complete,
+                              client.get('status', '200', stream=True))
+            self.assertTrue(responses[-1].closed)
+        finally:
+            loop.run_until_complete(client.close())
+            loop.close()
+            server.shutdown()
+            server.server_close()
+        summary = client.stats.summary()[0]
+        self.assertEqual((summary['method'], summary['resource'], summary['status']),
+                         ('GET', 'sleep/0.1', 200))
+        self.assertEqual(client.stats.get('GET', 'status/{id}', 200).count, 1)
+        self.assertGreaterEqual(summary['avg_ttfb'], 0.1)
+
+
+class TestOverload(unittest.TestCase):
+    @staticmethod
+    def info(status=200, total=0.01, error=None):
+        from microservices.http.stats import RequestInfo
+
+        info = RequestInfo('GET', 'http://endpoint/', '')
+        info.status, info.total, info.error = status, total, error
+        return info
+
+    def test_circuit_breaker(self):
+        import time
+        from microservices.http.overload import CircuitBreaker
+
+        breaker = CircuitBreaker(failure_threshold=0.5, latency_threshold=1,
+                                 window=4, min_calls=4, reset_timeout=0.1)
+        for info in (self.info(), self.info(), self.info(500),
+                     self.info(total=2)):
+            self.assertTrue(breaker.allow())
+            breaker.record(breaker.is_failure(info))
+        self.assertEqual(breaker.state, breaker.OPEN)
+        self.assertFalse(breaker.allow())
+        time.sleep(0.1)
+        # one probe in half open state
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, breaker.OPEN)
+        time.sleep(0.1)
+        self.assertTrue(breaker.allow())
+        breaker.record(False)
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        self.assertEqual(breaker.stats(), {'state': 'closed', 'failures': 0,
+                                           'calls': 0, 'rejected': 2, 'opened': 2})
+
+        # window is sliding
+        for failure in (True, False, False, False, True, False):
+            breaker.record(failure)
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        self.assertEqual(breaker.failures, 1)
+
+    def test_adaptive_limiter(self):
+        import time
+        from microservices.http.overload import AdaptiveLimiter
+
+        limiter = AdaptiveLimiter(initial_limit=4, min_limit=2, max_limit=5)
+        self.assertTrue(all(limiter.acquire() for _ in range(4)))
+        self.assertFalse(limiter.acquire())
+        for _ in range(4):
+            limiter.release(False, 0.01)
+        self.assertGreater(limiter.limit, 4)
+        for _ in range(50):
+            limiter.acquire()
+            limiter.release(False, 0.01)
+        # limit is not used, it does not grow
+        self.assertLess(limiter.limit, 5)
+
+        limit = limiter.limit
+        limiter.acquire()
+        limiter.release(True)
+        self.assertAlmostEqual(limiter.limit, limit * 0.9)
+        # latency grows, limit is decreased once per smoothed latency
+        for _ in range(8):
+            time.sleep(0.06)
+            limiter.acquire()
+            limiter.release(False, 0.05)
+        self.assertEqual(limiter.limit, 2)
+        stats = limiter.stats()
+        self.assertEqual((stats['limit'], stats['in_flight'], stats['rejected']),
+                         (2, 0, 1))
+
+    def test_client(self):
+        import threading
+        import time
+        from microservices.http.client import Client, CircuitOpenError, \
+            ConcurrencyLimitError, ResponseError
+        from microservices.http.overload import AdaptiveLimiter, CircuitBreaker
+
+        server, endpoint = start_server(gather_handler)
+        breaker = CircuitBreaker(failure_threshold=1, window=2, min_calls=2,
+                                 reset_timeout=60)
+        client = Client(endpoint, circuit_breaker=breaker, stats=True)
+        limiter = AdaptiveLimiter(initial_limit=1)
+        slow_client = Client(endpoint, concurrency_limiter=limiter)
+        try:
+            client.get('sleep', '0', key='response')
+            for _ in range(2):
+                self.assertRaises(ResponseError, client.get, 'status', '503')
+            with self.assertRaises(CircuitOpenError) as context:
+                client.get('sleep', '0')
+            self.assertIsNone(context.exception.status_code)
+            # rejected request is not sent
+            self.assertEqual(sum(summary['count']
+                                 for summary in client.stats.summary()), 3)
+            self.assertIsInstance(client.gather([('get', ('sleep', '0'))])[0],
+                                  CircuitOpenError)
+
+            thread = threading.Thread(target=slow_client.get,
+                                      args=('sleep', '0.2'))
+            thread.start()
+            time.sleep(0.1)
+            self.assertRaises(ConcurrencyLimitError, slow_client.get, 'sleep', '0')
+            thread.join()
+            self.assertEqual(slow_client.get('sleep', '0', key='response'), '0')
+            self.assertEqual(limiter.in_flight, 0)
+
+            # slot is released, even if hook is failed
+            def after_request(client, info):
+                raise ValueError('tested')
+
+            slow_client.after_request_hooks.append(after_request)
+            for _ in range(3):
+                self.assertRaises(ValueError, slow_client.get, 'sleep', '0')
+            self.assertEqual(limiter.in_flight, 0)
+            # and if response can't be measured
+            slow_client.send = lambda method, url, **kwargs: object()
+            for _ in range(3):
+                self.assertRaises(AttributeError, slow_client.get, 'sleep', '0')
+            self.assertEqual(limiter.in_flight, 0)
+        finally:
+            client.close()
+            slow_client.close()
+            server.shutdown()
+            server.server_close()
+
+
+class TestStream(unittest.TestCase):
+    def decode(self, body, chunk_size, **kwargs):
+        from microservices.http.stream import JSONStreamDecoder
+
+        decoder = JSONStreamDecoder(**kwargs)
+        items = []
+        for i in range(0, len(body), chunk_size):
+            items += decoder.feed(body[i:i + chunk_size])
+        return items + decoder.close()
+
+    def test_decoder(self):
+        cases = [
+            ('[1, 23, "a]", {"b": [1, {}]}, null]', {},
+             [1, 23, 'a]', {'b': [1, {}]}, None]),
+            (' [ ] ', {}, []),
+            ('{"meta": {"count": [3]}, "response": [1, 2, 345], "status": 200}',
+             {'response_key': 'response'}, [1, 2, 345]),
+            ('{"response": {"one": 1}}', {'response_key': 'response'},
+             [{'one': 1}]),
+            ('{"one": 1}\n{"one": 22}\n', {'ndjson': True}, [{'one': 1}, {'one': 22}]),
+            ('{"one": 1}\n{"one": 22}', {'ndjson': True, 'response_key': 'one'}, [1, 22]),
+            ('{"one": 1}', {}, [{'one': 1}]),
+            ('', {}, []),
+            ('[{"a\\"]": "\\\\", "b": ["}"]}, "\\"x"]', {},
+             [{'a"]': '\\', 'b': ['}']}, '"x']),
+            ('{"one": {"a": "\\n"}}\n{"one":\n 2}\n', {'ndjson': True},
+             [{'one': {'a': '\n'}}, {'one': 2}]),
+        ]
+        for body, kwargs, result in cases:
+            for chunk_size in range(1, len(body) + 2):
+                self.assertEqual(self.decode(body, chunk_size, **kwargs), result)
+
+        for body, kwargs in [
+            ('[1, 2', {}),
+            ('[1 2]', {}),
+            ('{"one": [1]}', {'response_key': 'response'}),
+            ('[1]', {'response_key': 'response'}),
+            ('{"one": 1} bad', {}),
+            ('[{"a" 1}]', {}),
+        ]:
+            self.assertRaises(ValueError, self.decode, body, 3, **kwargs)
+
+    def test_decoder_big_item(self):
+        from microservices.http.stream import JSONStreamDecoder
+
+        class CountingDecoder(json.JSONDecoder):
+            calls = 0
+
+            def raw_decode(self, s, idx=0):
+                CountingDecoder.calls += 1
+                return super(CountingDecoder, self).raw_decode(s, idx)
+
+        item = {'items': [{'name': 'a"[{\\', 'values': list(range(10))}] * 1000}
+        for kwargs in ({}, {'ndjson': True}):
+            CountingDecoder.calls = 0
+            body = json.dumps([item, 1]) if not kwargs else \
+                json.dumps(item) + '\n' + json.dumps(item) + '\n'
+            decoder = JSONStreamDecoder(**kwargs)
+            decoder._decoder = CountingDecoder()
+            items = []
+            for i in range(0, len(body), 100):
+                items += decoder.feed(body[i:i + 100])
+            items += decoder.close()
+            self.assertEqual(items, [item, 1] if not kwargs else [item, item])
+            # item in hundreds of chunks is not decoded on every chunk
+            self.assertLess(CountingDecoder.calls, 10)
+            self.assertFalse(decoder.feed(''))
+
+        decoder = JSONStreamDecoder()
+        self.assertEqual(decoder.feed('["a\\'), [])
+        self.assertEqual(decoder.feed(''), [])
+        self.assertEqual(decoder.feed('"]"'), [])
+        self.assertEqual(decoder.feed(']'), ['a"]'])
+
+    def test_client_stream(self):
+        from microservices.http.client import Client, ResponseError
+
+        def handler(request):
+            if request.path.startswith('/array/'):
+                return 200, json.dumps({'response': list(range(1000))}).encode('utf8')
+            if request.path.startswith('/broken/'):
+                return 200, b'{"response": [1, 2, '
+            return int(request.path.split('/')[2]), b'{"response": []}'
+
+        server, endpoint = start_server(handler)
+        client = Client(endpoint)
+        client.stream_chunk_size = 7
+        try:
+            items = client.get('array', stream=True, key='response')
+            self.assertEqual(list(items), list(range(1000)))
+            resource = client.resource('array')
+            self.assertEqual(next(resource.get(stream=True))['response'][:2], [0, 1])
+            self.assertEqual(list(client.get('status', '404', stream=True,
+                                             key='response')), [])
+            self.assertRaises(ResponseError, client.get, 'status', '500',
+                              stream=True, key='response')
+            items = client.get('broken', stream=True, key='response')
+            self.assertEqual(next(items), 1)
+            self.assertRaises(ResponseError, list, items)
+        finally:
+            client.close()
+            server.shutdown()
+
+
+class TestRunners(unittest.TestCase):
+    def test_prefork(self):
+        import os
+        import time
+        from threading import Thread
+        from microservices.http.runners import prefork_run
+        from microservices.http.service import Microservice
+
+        app = Microservice(__name__)
+
+        @app.route('/')
+        def pid():
+            return {'pid': os.getpid()}
+
+        supervisor = prefork_run(app, port=0, address='127.0.0.1', workers=2,
+                                 max_requests=2, timeout=10, start=False)
+        if hasattr(supervisor.context, 'get_start_method'):
+            # app is not picklable, workers are forked on every platform
+            self.assertEqual(supervisor.context.get_start_method(), 'fork')
+        supervisor.check_interval = 0.01
+        supervisor.stop_timeout = 5
+        endpoint = 'http://127.0.0.1:{}/'.format(
+            supervisor.socket.getsockname()[1])
+        run_thread = Thread(target=supervisor.run)
+        run_thread.start()
+
+        def wait(condition):
+            start = time.time()
+            while not condition():
+                if time.time() - start > 10:  # pragma: no cover
+                    supervisor.stop()
+                    raise AssertionError('Timeout error')
+                time.sleep(0.01)
+
+        try:
+            pids = set()
+            for _ in range(8):
+                response = requests.get(endpoint, timeout=5)
+                self.assertEqual(response.status_code, 200)
+                pids.add(response.json()['pid'])
+            # workers were recycled after 2 requests
+            self.assertGreater(len(pids), 2)
+            self.assertNotIn(os.getpid(), pids)
+            wait(lambda: supervisor.restarts >= 3)
+
+            old = set(process.pid for process in supervisor.children)
+            supervisor.reload()
+            wait(lambda: supervisor.reloads == 1)
+            self.assertFalse(old & set(process.pid
+                                       for process in supervisor.children))
+            self.assertEqual(requests.get(endpoint, timeout=5).status_code, 200)
+        finally:
+            supervisor.stop()
+            run_thread.join(timeout=10)
+            supervisor.socket.close()
+        self.assertTrue(supervisor.stopped)
+        self.assertTrue(all(not process.is_alive()
+                            for process in supervisor.children))
+
+    def test_prefork_context(self):
+        from microservices.helpers.prefork import PreforkSupervisor
+
+        self.assertRaises(ValueError, PreforkSupervisor, max, processes=1,
+                          context='unknown')
+
+    def test_limiter(self):
+        import threading
+        from microservices.http.runners import InFlightLimiter, service_unavailable
+
+        self.assertRaises(ValueError, InFlightLimiter, 1, overload='drop')
+        limiter = InFlightLimiter(2)
+        self.assertTrue(limiter.acquire())
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+        limiter.release()
+        self.assertTrue(limiter.acquire())
+        self.assertEqual(limiter.stats(), {
+            'in_flight': 2, 'max_in_flight': 2, 'accepted': 3,
+            'rejected': 1, 'completed': 1,
+        })
+
+        limiter = InFlightLimiter(1, overload='block')
+        self.assertTrue(limiter.acquire())
+        acquired = threading.Event()
+        thread = threading.Thread(
+            target=lambda: limiter.acquire() and acquired.set())
+        thread.start()
+        self.assertFalse(acquired.wait(0.05))
+        limiter.release()
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+        self.assertEqual(limiter.in_flight, 1)
+        self.assertEqual(limiter.rejected, 0)
+
+        statuses = []
+        body = service_unavailable(
+            {}, lambda status, headers: statuses.append(status))
+        self.assertEqual(statuses, ['503 Service Unavailable'])
+        self.assertIn(b'Service Unavailable', body[0])
+
+
+class TestAsyncClient(unittest.TestCase):
+    def setUp(self):
+        skip_without_aiohttp(self)
+
+    def test_async_client(self):
+        import asyncio
+        from microservices.http.async_client import AsyncClient
+        from microservices.http.client import ResponseError
+
+        def handler(request):
+            length = int(request.headers.get('Content-Length') or 0)
+            data = request.rfile.read(length) if length else b''
+            if request.path.startswith('/api/missing/'):
+                return 404, b'{"response": "missing"}'
+            if request.path.startswith('/api/error/'):
+                return 500, b'{"response": "error"}'
+            return 200, json.dumps({
+                'response': {'method': request.command,
+                             'path': request.path,
+                             'data': data.decode('utf8')},
+            }).encode('utf8')
+
+        server, endpoint = start_server(handler)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        client = AsyncClient(endpoint + '/api/')
+
+        try:
+            response = loop.run_until_complete(client.get('one', 'two', key='response'))
+            self.assertEqual(response, {'method': 'GET', 'path': '/api/one/two/', 'data': ''})
+
+            resource = client.resource('one')
+            response = loop.run_until_complete(
+                resource.post('two', query={'test': 'tested'}, data={'a': 1},
+                              response_key='response'))
+            self.assertEqual(response['method'], 'POST')
+            self.assertEqual(response['path'], '/api/one/two/?test=tested')
+            self.assertEqual(json.loads(response['data']), {'a': 1})
+
+            session = client.session
+            responses = loop.run_until_complete(asyncio.gather(*[
+                client.get(str(i), key='response') for i in range(10)
+            ]))
+            self.assertEqual([r['path'] for r in responses],
+                             ['/api/{}/'.format(i) for i in range(10)])
+            self.assertIs(client.session, session)
+
+            self.assertEqual(
+                loop.run_until_complete(client.get('missing', key='response')),
+                None)
+            self.assertRaises(ResponseError, loop.run_until_complete,
+                              client.get('error', key='response'))
+            self.assertRaises(ResponseError, loop.run_until_complete,
+                              client.get('one', key='bad_key'))
+        finally:
+            loop.run_until_complete(client.close())
+            loop.close()
+            asyncio.set_event_loop(None)
+            server.shutdown()
+
+        self.assertRaises(ValueError, AsyncClient, endpoint,
+                          max_requests_per_connection=10)
+
+    def test_async_gather(self):
+        import asyncio
+        import time
+        from microservices.http.async_client import AsyncClient
+        from microservices.http.client import ResponseError
+
+        server, endpoint = start_server(gather_handler)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        client = AsyncClient(endpoint)
+        try:
+            start = time.time()
+            results = loop.run_until_complete(client.gather([
+                ('get', ('sleep', '0.3'), {'key': 'response'}),
+                ('get', ('sleep', '0.1'), {'key': 'response'}),
+                ('get', ('status', '500')),
+            ]))
+            self.assertLess(time.time() - start, 0.6)
+            self.assertEqual(results[:2], ['0.3', '0.1'])
+            self.assertEqual(results[2].status_code, 500)
+
+            results = loop.run_until_complete(client.map(
+                'get', [('sleep', '0'), ('sleep', '1')], timeout=0.5,
+                key='response'))
+            self.assertEqual(results[0], '0')
+            self.assertIsInstance(results[1], ResponseError)
+
+            def collect(stream):
+                items = []
+                iterator = loop.run_until_complete(stream)
+                while True:
+                    try:
+                        items.append(loop.run_until_complete(iterator.__anext__()))
+                    except StopAsyncIteration:
+                        return items
+
+            self.assertEqual(collect(client.get('sleep', '0', stream=True,
+                                                key='response')), ['0'])
+            self.assertEqual(collect(client.get('status', '404', stream=True,
+                                                key='response')), [])
+            self.assertRaises(ResponseError, loop.run_until_complete,
+                              client.get('status', '500', stream=True))
+            # timeout is for connect and every read, not for whole stream
+            start = time.time()
+            self.assertEqual(collect(client.get('slow', '4', '0.15', stream=True,
+                                                key='response', timeout=0.3)),
+                             [0, 1, 2, 3])
+            self.assertGreater(time.time() - start, 0.3)
+            stream = client.get('slow', '2', '0.5', stream=True,
+                                key='response', timeout=0.2)
+            self.assertRaises(asyncio.TimeoutError, collect, stream)
+        finally:
+            loop.run_until_complete(client.close())
+            loop.close()
+            asyncio.set_event_loop(None)
+            server.shutdown()
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'async def is not available')
+class TestAsyncService(unittest.TestCase):
+    def create_app(self):
+        from microservices.http.async_fixtures import create_app
+
+        return create_app()
+
+    def call(self, app, method, path, body=b'', query=b''):
+        from microservices.http.async_fixtures import call
+
+        return call(app, method, path, body=body, query=query)
+
+    def test_asgi(self):
+        import asyncio
+        import time
+
+        app = self.create_app()
+        loop = asyncio.new_event_loop()
+        try:
+            from microservices.http.async_fixtures import gather
+
+            start = time.time()
+            results = loop.run_until_complete(gather(*[
+                self.call(app, 'GET', '/users/{}/'.format(i), query=b'q=test')
+                for i in range(20)
+            ]))
+            # views were awaited at the same time
+            self.assertLess(time.time() - start, 1)
+            self.assertEqual(results[3], (200, {'id': 3, 'query': 'test',
+                                                'kind': 'user'}))
+            status, response = loop.run_until_complete(
+                self.call(app, 'POST', '/echo/', body=b'{"a": 1}'))
+            self.assertEqual(status, 200)
+            self.assertEqual(response, {'method': 'POST', 'request': {'a': 1}})
+            self.assertEqual(loop.run_until_complete(
+                self.call(app, 'GET', '/missing/'))[0], 404)
+            self.assertEqual(loop.run_until_complete(
+                self.call(app, 'GET', '/error/'))[0], 500)
+        finally:
+            loop.close()
+
+        # the same rendering in WSGI mode
+        response = app.test_client().post(
+            '/echo/', data='{"a": 1}', content_type='application/json',
+            headers={'Accept': 'application/json'})
+        self.assertEqual(json.loads(response.data.decode('utf8')),
+                         {'method': 'POST', 'request': {'a': 1}})
+
+    def test_server(self):
+        import asyncio
+        import threading
+        from microservices.http.async_service import ASGIServer
+
+        app = self.create_app()
+        loop = asyncio.new_event_loop()
+        server = ASGIServer(app.asgi)
+        loop.run_until_complete(server.start(0, '127.0.0.1'))
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        endpoint = 'http://127.0.0.1:{}'.format(server.sockets[0].getsockname()[1])
+        try:
+            session = requests.Session()
+            headers = {'Accept': 'application/json'}
+            for i in range(3):
+                response = session.get(endpoint + '/users/{}/'.format(i),
+                                       headers=headers, timeout=5)
+                self.assertEqual(response.json(),
+                                 {'id': i, 'query': None, 'kind': 'user'})
+            response = session.post(endpoint + '/echo/', json={'a': 1},
+                                    headers=headers, timeout=5)
+            self.assertEqual(response.json(), {'method': 'POST', 'request': {'a': 1}})
+            response = session.post(
+                endpoint + '/echo/', data=iter([b'{"b": ', b'2}']), timeout=5,
+                headers=dict(headers, **{'Content-Type': 'application/json'}))
+            self.assertEqual(response.json()['request'], {'b': 2})
+            self.assertEqual(session.get(endpoint + '/error/', timeout=5).status_code,
+                             500)
+            session.close()
+        finally:
+            loop.call_soon_threadsafe(server.close)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+
 
 class TestSchemaRenderer(TestHTTP):
     def test_render(self):
@@ -260,6 +1146,138 @@ class TestSchemaRenderer(TestHTTP):
         schema_renderer.update_by_name(response)
         self.assertEqual(response['test_response'], {'test_data': 'tested'})
 
+    def test_render_plan(self):
+        from microservices.http.resources import ResourceMarker, ResourceSchema
+
+        @self.app.route('/plan/', resource=ResourceMarker(
+            update={'kind': 'plan'},
+            schema=ResourceSchema(status_code='code',
+                                  ignore_for_methods=['DELETE'])))
+        def plan_view():
+            return {'id': 1}
+
+        resource, plan = self.app.render_plans[('/plan/', False)]
+        self.assertIs(resource, self.app.resources['/plan/'])
+        self.assertEqual(plan.steps, ('update_by_name', 'update_by_status_code',
+                                      'update_by_update', 'update_by_data'))
+        self.assertEqual(plan.ignore_for_methods, frozenset(['DELETE']))
+        browser_plan = self.app.render_plans[('/plan/', True)][1]
+        self.assertIn('update_by_methods', browser_plan.steps)
+        self.assertNotIn('update_by_resources', browser_plan.steps)
+
+        response = self.app.test_client().get(
+            '/plan/', headers={'Accept': 'application/json'})
+        self.assertEqual(json.loads(response.data.decode('utf8')),
+                         {'id': 1, 'code': 200, 'kind': 'plan'})
+
+
+class TestJSONSerializer(TestHTTP):
+    def test_settings(self):
+        import datetime
+        from microservices.helpers.serializers import get_serializer
+        from microservices.http.resources import ResourceMarker
+
+        @self.app.route('/', resource=ResourceMarker())
+        def root():
+            return {'name': u'тест', 'when': datetime.date(2016, 6, 20)}
+
+        def get():
+            response = self.app.test_client().get(
+                '/', headers={'Accept': 'application/json'})
+            return json.loads(response.data.decode('utf8'))
+
+        expected = get()
+        self.assertEqual(expected['name'], u'тест')
+        self.app.config['JSON_SERIALIZER'] = 'auto'
+        serializer = self.app.api_settings.JSON_SERIALIZER
+        self.assertIs(serializer, get_serializer('auto', default=serializer.default))
+        self.assertEqual(get(), expected)
+
+
+class TestSettings(TestHTTP):
+    def test_cached_settings(self):
+        from microservices.http.resources import ResourceMarker, ResourceSchema
+
+        settings = self.app.api_settings
+        self.assertIs(settings.DEFAULT_RENDERERS, settings.DEFAULT_RENDERERS)
+        self.assertIs(settings.DEFAULT_PARSERS, settings.DEFAULT_PARSERS)
+        schema = settings.SCHEMA
+        self.assertIs(settings.SCHEMA, schema)
+
+        self.app.config['SCHEMA'] = ResourceSchema(response='result')
+        self.assertEqual(settings.SCHEMA['response'], 'result')
+        self.app.config['SCHEMA']['response'] = 'changed'
+        self.assertEqual(settings.SCHEMA['response'], 'result')
+        settings.invalidate()
+        self.assertEqual(settings.SCHEMA['response'], 'changed')
+
+        self.app.add_resource(ResourceMarker(schema={'status': 'status'}), '/one/')
+        self.app.add_resource(ResourceMarker(schema={'status': 'status'}), '/two/')
+        self.app.resources['/one/']['schema']['browser']['status'] = None
+        self.assertEqual(self.app.resources['/two/']['schema']['browser']['status'],
+                         'status')
+        self.assertEqual(settings.SCHEMA['browser']['status'], 'status')
+
+
+class TestTimings(unittest.TestCase):
+    def test_timings(self):
+        import time
+        from flask import request
+        from microservices.helpers.metrics import MetricsRegistry
+        from microservices.http.resources import ResourceMarker, ResourceSchema
+        from microservices.http.service import Microservice
+
+        metrics = MetricsRegistry()
+        app = Microservice(__name__, metrics=metrics)
+
+        @app.route('/users/<int:user_id>/', methods=['GET', 'POST'],
+                   resource=ResourceMarker(schema=ResourceSchema(request='request')))
+        def user(user_id):
+            time.sleep(0.05)
+            return {'id': user_id, 'data': request.data}
+
+        app.add_metrics_resource()
+        client = app.test_client()
+        headers = {'Accept': 'application/json'}
+        for i in range(3):
+            client.get('/users/{}/'.format(i), headers=headers)
+        client.post('/users/1/', data='{"a": 1}', content_type='application/json',
+                    headers=headers)
+        client.get('/missing/', headers=headers)
+
+        rule = '/users/<int:user_id>/'
+        total = metrics.get('http_request_seconds', rule=rule, method='GET')
+        self.assertEqual(total['count'], 3)
+        self.assertGreaterEqual(total['sum'], 0.15)
+        view = metrics.get('http_request_phase_seconds', rule=rule, phase='view')
+        self.assertEqual(view['count'], 4)
+        self.assertGreaterEqual(view['sum'], 0.2)
+        for phase in ('parse', 'render', 'serialize'):
+            value = metrics.get('http_request_phase_seconds', rule=rule,
+                                phase=phase)
+            self.assertEqual(value['count'], 4)
+            # parsing in view is excluded from view
+            self.assertLess(value['sum'], view['sum'])
+        self.assertEqual(metrics.get('http_requests_total', rule=rule,
+                                     method='POST', status=200), 1)
+        self.assertEqual(metrics.get('http_requests_total', rule='<unmatched>',
+                                     method='GET', status=404), 1)
+
+        response = client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn('http_request_phase_seconds_count{phase="view",'
+                      'rule="/users/<int:user_id>/"} 4',
+                      response.data.decode('utf8'))
+
+    def test_disabled(self):
+        from microservices.http.service import Microservice
+
+        app = Microservice(__name__)
+        self.assertIsNone(app.http_metrics)
+        with self.assertRaises(ValueError):
+            app.add_metrics_resource()
+
 
 class TestHelpers(TestHTTP):
     def test_url_resource(self):
@@ -294,3 +1312,33 @@ class TestHelpers(TestHTTP):
         resource['endpoints'] = ['test_resource']
         url = url_resource(resource)
         self.assertEqual(url, None)
+
+    def test_resources_index(self):
+        from microservices.http.resources import ResourceMarker, ResourceSchema
+
+        resource = ResourceMarker(schema=ResourceSchema(resources='resources'))
+
+        @self.app.route('/', resource=resource)
+        def root():
+            return {}
+
+        @self.app.route('/users/', resource=ResourceMarker())
+        def users():
+            return {}
+
+        def get(host):
+            response = self.app.test_client().get('/', base_url=host, headers={
+                'Accept': 'application/json'})
+            return json.loads(response.data.decode('utf8'))['resources']
+
+        self.assertEqual(get('http://one.example.com')['/users/']['url'],
+                         'http://one.example.com/users/')
+        self.assertEqual(get('http://two.example.com')['/users/']['url'],
+                         'http://two.example.com/users/')
+        # resources are not modified
+        self.assertIs(self.app.resources['/users/']['url'], True)
+
+        self.app.add_resource(ResourceMarker(url='http://example.com/items/'),
+                              '/items/', methods=['GET'])
+        self.assertEqual(get('http://one.example.com')['/items/'],
+                         {'methods': ['GET'], 'url': 'http://example.com/items/'})
@@ -0,0 +1,131 @@
+from time import time
+
+from flask import current_app, request
+from flask_api.request import APIRequest
+
+from microservices.helpers.metrics import PROMETHEUS_CONTENT_TYPE
+
+UNMATCHED_RULE = '<unmatched>'
+
+
+class RequestTimings(object):
+    """Durations of phases of request, seconds
+
+    Phases: parse - parsing of request body, view - view function,
+    render - SchemaRenderer, serialize - JSON serialization.
+    Nested phase is excluded from outer one, ex. parsing of request.data in view.
+
+    >>>started = timings.start()
+    >>>...
+    >>>timings.stop('view', started)
+    """
+
+    __slots__ = ('started', 'parse', 'view', 'render', 'serialize', '_measured')
+
+    phases = ('parse', 'view', 'render', 'serialize')
+
+    def __init__(self):
+        self.started = time()
+        self.parse = 0
+        self.view = 0
+        self.render = 0
+        self.serialize = 0
+        self._measured = 0
+
+    def start(self):
+        return time(), self._measured
+
+    def stop(self, phase, started):
+        started_at, measured = started
+        duration = time() - started_at - (self._measured - measured)
+        setattr(self, phase, getattr(self, phase) + duration)
+        self._measured += duration
+
+    def total(self):
+        return time() - self.started
+
+
+def get_timings():
+    """Timings of current request, None if timing is disabled"""
+    return getattr(request, 'timings', None)
+
+
+class MicroserviceRequest(APIRequest):
+    """APIRequest with timing of parsing of body"""
+
+    timings = None
+
+    def _parse(self):
+        timings = self.timings
+        if timings is None:
+            return super(MicroserviceRequest, self)._parse()
+        started = timings.start()
+        try:
+            return super(MicroserviceRequest, self)._parse()
+        finally:
+            timings.stop('parse', started)
+
+
+class HTTPMetrics(object):
+    """Latency of requests per rule in MetricsRegistry
+
+    http_requests_total{rule, method, status} - counter of responses
+    http_request_seconds{rule, method} - histogram of total time
+    http_request_phase_seconds{rule, phase} - histogram of time of phase
+    """
+
+    def __init__(self, metrics):
+        """Initialization
+
+        :param metrics: MetricsRegistry
+        """
+        self.metrics = metrics
+        # (rule, method): (total histogram, [(phase, histogram)])
+        self._histograms = {}
+        self._counters = {}
+
+    def histograms(self, rule, method):
+        key = (rule, method)
+        histograms = self._histograms.get(key)
+        if histograms is None:
+            histograms = self._histograms[key] = (
+                self.metrics.histogram(
+                    'http_request_seconds', 'Time of request, seconds',
+                    rule=rule, method=method),
+                [(phase, self.metrics.histogram(
+                    'http_request_phase_seconds',
+                    'Time of phase of request, seconds',
+                    rule=rule, phase=phase))
+                 for phase in RequestTimings.phases],
+            )
+        return histograms
+
+    def counter(self, rule, method, status):
+        key = (rule, method, status)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = self.metrics.counter(
+                'http_requests_total', 'Count of responses',
+                rule=rule, method=method, status=status)
+        return counter
+
+    def observe(self, timings, rule, method, status):
+        """Add timings of finished request
+
+        :param timings: RequestTimings
+        :param rule: str, rule of url_map or None if request is not matched
+        :param method: str, http method
+        :param status: int, status code of response
+        """
+        if rule is None:
+            rule = UNMATCHED_RULE
+        total, phases = self.histograms(rule, method)
+        total.observe(timings.total())
+        for phase, histogram in phases:
+            histogram.observe(getattr(timings, phase))
+        self.counter(rule, method, status).inc()
+
+    def view(self):
+        """View with metrics in Prometheus text format"""
+        return current_app.response_class(self.metrics.prometheus(),
+                                          content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,14 @@
+"""Coroutine handlers for tests of AsyncMicroservice, python 3.5+ only"""
+import asyncio
+
+
+def sleeping_handler(running, handled, contexts, seconds=0.2):
+    """Coroutine handler, payloads are appended to running and handled lists"""
+
+    async def handle(payload, context):
+        running.append(payload)
+        await asyncio.sleep(seconds)
+        handled.append(payload)
+        contexts.append(context)
+
+    return handle
@@ -0,0 +1,240 @@
+import asyncio
+import select
+import socket
+from time import time
+
+from kombu.utils import nested
+from microservices.queues.service import HandlerContext, Microservice, Rule
+
+
+class AsyncRule(Rule):
+    """Rule for handler, which is called in event loop
+
+    handler can be a coroutine function: async def handler(payload, context)
+    """
+
+    def __init__(self, name, handler, logger, concurrency=100, **kwargs):
+        """Initialization
+
+        :param name: name of queue
+        :param handler: async def handler(payload, context) or function
+        :param concurrency: max count of running handlers
+        """
+        super(AsyncRule, self).__init__(name, handler, logger, **kwargs)
+        self.concurrency = concurrency
+        self.coroutine = asyncio.iscoroutinefunction(handler)
+        self.tasks = set()
+        self.semaphore = None
+        self.loop = None
+
+    def start(self, loop):
+        """Bind rule to running event loop"""
+        if self.loop is not loop:
+            self.loop = loop
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+    def callback(self, body, message):
+        self.metrics.received.inc()
+        self.logger.debug('Data (len: %s) received', len(body))
+        task = self.loop.create_task(self.handle(body, message))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def handle(self, body, message):
+        async with self.semaphore:
+            context = HandlerContext(message, self)
+            started = time()
+            try:
+                self.logger.debug('Call handler...')
+                result = self.handler(body, context)
+                if self.coroutine:
+                    await result
+            except Exception:
+                self.metrics.failed.inc()
+                self.logger.exception('Something happened in user handler')
+                return
+            finally:
+                self.metrics.handler_seconds.observe(time() - started)
+            if self.autoack:
+                try:
+                    self.logger.debug('Ack message via autoack')
+                    context.ack()
+                except ConnectionError as e:  # pragma: no cover
+                    self.logger.error(
+                        'Connection error: %s when try message.ack',
+                        e.strerror)
+
+
+class AsyncMicroservice(Microservice):
+    """Microservice for queues with asyncio consumer
+
+    Handlers are run concurrently in one event loop, acks are sent from the loop:
+    >>>app = AsyncMicroservice('amqp:///', concurrency=1000)
+    >>>
+    >>>@app.queue('queue')
+    >>>async def handler(payload, context):
+    >>>    await do_something(payload)
+    >>>
+    >>>app.run()
+
+    Not async handlers are called in the loop, they block other handlers.
+    """
+
+    def __init__(self, connection='amqp:///', concurrency=100,
+                 poll_interval=0.01, **kwargs):
+        """Initialization
+
+        :param connection: connection for queues broker
+        :param concurrency: max count of running handlers per rule, default - 100
+        :type concurrency: int
+        :param poll_interval: seconds, sleeping for transports without socket (memory, redis, etc.)
+        :type poll_interval: int or float
+        :param kwargs: params for Microservice, without workers
+        """
+        if kwargs.get('workers'):
+            raise ValueError('AsyncMicroservice does not support workers, '
+                             'use concurrency')
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.rules = []
+        self.prefetch_count = 0
+        self.loop = None
+        super(AsyncMicroservice, self).__init__(connection, **kwargs)
+        self.metrics.gauge('queue_pool_in_flight', 'Running handlers',
+                           function=lambda: self.in_flight)
+
+    def add_queue_rule(self, handler, name, autoack=True, prefetch_size=0,
+                       prefetch_count=0, batch_size=None, batch_timeout=1,
+                       concurrency=None, **kwargs):
+        """Add queue rule to Microservice
+
+        :param handler: async def handler(payload, context) or function
+        :param name: name of queue
+        :param autoack: if True message.ack() after handler
+        :param prefetch_count: count of messages for getting from mq, default - concurrency.
+            Consumers share one channel, so prefetch of channel is a sum for all rules
+        :param prefetch_size: size in bytes for getting data from mq
+        :param concurrency: max count of running handlers, default - concurrency of microservice
+        """
+        if batch_size:
+            raise ValueError('AsyncMicroservice does not support batch handlers')
+        if concurrency is None:
+            concurrency = self.concurrency
+        if not prefetch_count:
+            prefetch_count = concurrency
+        rule = AsyncRule(name, handler, self.logger, autoack=autoack,
+                         concurrency=concurrency, metrics=self.metrics,
+                         **kwargs)
+        self.rules.append(rule)
+        self.prefetch_count += prefetch_count
+        self.add_consumer(rule, prefetch_count=self.prefetch_count,
+                          prefetch_size=prefetch_size)
+
+    @property
+    def in_flight(self):
+        """Count of running handlers"""
+        return sum(len(rule.tasks) for rule in self.rules)
+
+    def _socket(self):
+        return getattr(self.connection.connection, 'sock', None)
+
+    @staticmethod
+    def _readable(sock):
+        pending = getattr(sock, 'pending', None)
+        if pending is not None and pending():
+            return True
+        return bool(select.select([sock], [], [], 0)[0])
+
+    def drain(self):
+        """Handle all received events without blocking of loop"""
+        sock = self._socket()
+        started = time()
+        try:
+            while not self._stop:
+                if sock is not None and not self._readable(sock):
+                    return
+                try:
+                    # socket has data, waiting only for rest of frame
+                    self.connection.drain_events(
+                        timeout=0 if sock is None else self.timeout)
+                except socket.timeout:
+                    return
+        finally:
+            self.service_metrics.drain_events_seconds.inc(time() - started)
+
+    async def wait_events(self):
+        """Wait data in socket of broker connection or sleep poll_interval"""
+        sock = self._socket()
+        if sock is None:
+            await asyncio.sleep(self.poll_interval)
+            return
+        future = self.loop.create_future()
+
+        def readable():
+            if not future.done():
+                future.set_result(None)
+
+        self.loop.add_reader(sock, readable)
+        try:
+            await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.loop.remove_reader(sock)
+
+    async def wait_handlers(self):
+        """Wait all running handlers"""
+        tasks = [task for rule in self.rules for task in rule.tasks]
+        if tasks:
+            self.logger.info('Waiting %s running handlers', len(tasks))
+            await asyncio.wait(tasks)
+
+    async def serve(self):
+        """Consume queues in running event loop until stop()"""
+        self._start()
+        self.loop = asyncio.get_event_loop()
+        for rule in self.rules:
+            rule.start(self.loop)
+        with nested(*self.consumers):
+            while not self._stop:
+                try:
+                    self.drain()
+                    await self.wait_events()
+                except ConnectionError as e:  # pragma no cover
+                    self.logger.error(
+                        'Connection to mq has broken off because: %s. '
+                        'Try to reconnect', e)
+                    self.service_metrics.reconnects.inc()
+                    self.connect()
+                    self.revive()
+                    break
+                except Exception:  # pragma no cover
+                    if self._stop:
+                        self.logger.exception('Something wrong! And stopping...')
+                        break
+                    self.logger.exception(
+                        'Something wrong! Try to restart the loop')
+                    self.revive()
+                    break
+        if self._stop:
+            await self.wait_handlers()
+            self._stopped = True
+            self.logger.info('Stopped draining events.')
+
+    def run(self, debug=False):
+        """Run microservice in new event loop, until stop()
+
+        :param debug: enable/disable debug mode
+        :type debug: bool
+        """
+        if debug:
+            from microservices.utils import set_logging
+
+            set_logging('DEBUG')
+
+        loop = asyncio.new_event_loop()
+        try:
+            while not self._stopped:
+                loop.run_until_complete(self.serve())
+        finally:
+            loop.close()
@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+
 from kombu import Connection
 from kombu import Exchange, Queue, pools
 from microservices.utils import get_logger
@@ -7,6 +9,69 @@ import six
 _logger = get_logger(__file__)
 
 
+class PublishError(Exception):
+    """Error of batch publishing
+
+    exception instance has:
+        published - count of published messages before error, index of failed message
+        error - original exception
+    """
+
+    def __init__(self, published, error):
+        self.published = published
+        self.error = error
+        super(PublishError, self).__init__(
+            'Publishing failed after {} published messages: {!r}'.format(
+                published, error))
+
+
+class _batch(object):
+    """Batch publisher, one connection, channel and producer for all messages"""
+
+    def __init__(self, client, producer):
+        """Initialization
+
+        :param client: instance of client
+        :type client: Client
+        :param producer: kombu Producer
+        """
+        self.client = client
+        self.producer = producer
+        self.published = 0
+
+    def _publish(self, message, **options):
+        try:
+            self.producer.publish(message, **options)
+        except Exception as e:
+            raise PublishError(self.published, e)
+        self.published += 1
+
+    def publish_to_exchange(self, name, routing_key, message, **properties):
+        """Publish message to exchange in batch
+
+        :param name: name of exchange
+        :type name: str
+        :param routing_key: routing key
+        :type routing_key: str
+        :param message: payload for publishing
+        :type message: any serializable object
+        :param properties: additional properties for Producer.publish()
+        """
+        self._publish(message, exchange=self.client.exchanges[name],
+                      routing_key=routing_key, **properties)
+
+    def publish_to_queue(self, name, message, **properties):
+        """Publish message to queue in batch
+
+        :param name: name of queue
+        :type name: str
+        :param message: payload for publishing
+        :type message: any serializable object
+        :param properties: additional properties for Producer.publish()
+        """
+        self._publish(message, routing_key=name, **properties)
+
+
 class _exchange(object):
     """Exchange helper"""
 
@@ -241,3 +306,57 @@ class Client(object):
             result = producer.publish(message, routing_key=name, **properties)
             self.logger.info('Message (len: %s) was published to queue "%s"', len(message), name)
             return result
+
+    @contextmanager
+    def batch(self):
+        """Publish many messages with one connection, channel and producer
+
+        >>>with client.batch() as batch:
+        >>>    batch.publish_to_queue('queue', message)
+        >>>    batch.publish_to_exchange('exchange', 'routing_key', message)
+
+        PublishError is raised with count of published messages, if publishing failed
+        """
+        with self.connections[self.connection].acquire() as conn:
+            batch = _batch(self, conn.Producer())
+            try:
+                yield batch
+            except Exception:
+                self.logger.error('Batch failed after %s published messages',
+                                  batch.published)
+                raise
+            self.logger.info('Batch of %s messages was published',
+                             batch.published)
+
+    def confirmed(self, window=100, timeout=30, callback=None):
+        """Publisher with pipelined publisher confirms
+
+        >>>with client.confirmed(window=1000) as publisher:
+        >>>    future = publisher.publish_to_queue('queue', message)
+
+        :param window: max count of unconfirmed messages
+        :type window: int
+        :param timeout: seconds for waiting confirms, None - without limit
+        :param callback: function(future), called for every confirmed or failed message
+        :return: microservices.queues.confirms.ConfirmedPublisher
+        """
+        from microservices.queues.confirms import ConfirmedPublisher
+
+        return ConfirmedPublisher(self, window=window, timeout=timeout,
+                                  callback=callback)
+
+    def publish_many(self, name, messages, **properties):
+        """Publish many messages to queue with one producer
+
+        :param name: name of queue
+        :type name: str
+        :param messages: payloads for publishing
+        :type messages: iterable of serializable objects
+        :param properties: additional properties for Producer publish
+        :return: count of published messages
+        :raise PublishError: if publishing failed, with count of published messages
+        """
+        with self.batch() as batch:
+            for message in messages:
+                batch.publish_to_queue(name, message, **properties)
+        return batch.published
@@ -0,0 +1,219 @@
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from kombu import Producer
+
+
+class ConfirmError(Exception):
+    """Message was not confirmed by broker: nack, timeout or publishing error"""
+
+
+class ConfirmedPublisher(object):
+    """Publisher with pipelined publisher confirms
+
+    Messages are published without waiting, broker confirms (basic.ack/basic.nack)
+    are handled asynchronously. Count of unconfirmed messages is limited by window,
+    publishing waits confirms when window is full.
+
+    Every publish returns concurrent.futures.Future:
+        result - delivery tag of message, failed messages do not get tags
+        exception - ConfirmError
+
+    Transports without publisher confirms (memory, redis, etc.) confirm
+    message immediately after successful publishing.
+
+    Publisher is not thread safe, use one publisher per thread.
+
+    >>>with client.confirmed(window=1000, callback=on_confirm) as publisher:
+    >>>    for event in events:
+    >>>        publisher.publish_to_queue('events', event)
+    >>># all messages are confirmed or failed here
+    """
+
+    def __init__(self, client, window=100, timeout=30, callback=None):
+        """Initialization
+
+        :param client: instance of client
+        :type client: microservices.queues.client.Client
+        :param window: max count of unconfirmed messages
+        :type window: int
+        :param timeout: seconds for waiting confirms, None - without limit
+        :type timeout: int, float or None
+        :param callback: function(future), called for every confirmed or failed message
+        """
+        self.client = client
+        self.window = window
+        self.timeout = timeout
+        self.callback = callback
+        self.logger = client.logger
+        self.published = 0
+        # delivery tag of the last sent message, failed messages are not counted by broker
+        self.delivery_tag = 0
+        self.confirmed = 0
+        self.failed = 0
+        self.confirms = False
+        self.pending = OrderedDict()
+        self._connection = None
+        self.channel = None
+        self.producer = None
+
+    @property
+    def in_flight(self):
+        return len(self.pending)
+
+    def open(self):
+        """Acquire connection and open channel in confirm mode"""
+        self._connection = self.client.connections[
+            self.client.connection].acquire()
+        self.channel = self._connection.channel()
+        self.producer = Producer(self.channel)
+        self.confirms = hasattr(self.channel, 'confirm_select')
+        if self.confirms:
+            self.channel.events['basic_ack'].add(self.on_ack)
+            self.channel.events['basic_nack'].add(self.on_nack)
+            self.channel.confirm_select()
+        self.logger.debug('Confirmed publisher opened, confirms: %s',
+                          self.confirms)
+        return self
+
+    def close(self):
+        """Wait all confirms, close channel and release connection"""
+        try:
+            self.wait()
+        finally:
+            try:
+                self.channel.close()
+            finally:
+                self._connection.release()
+            self.logger.info(
+                'Confirmed publisher closed, published: %s, confirmed: %s, '
+                'failed: %s', self.published, self.confirmed, self.failed)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _new_future(self):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        if self.callback is not None:
+            future.add_done_callback(self.callback)
+        return future
+
+    def _resolve(self, delivery_tag, multiple, error=None):
+        if multiple:
+            tags = [tag for tag in self.pending if tag <= delivery_tag]
+        else:
+            tags = [delivery_tag] if delivery_tag in self.pending else []
+        for tag in tags:
+            future = self.pending.pop(tag)
+            if error is None:
+                self.confirmed += 1
+                future.set_result(tag)
+            else:
+                self.failed += 1
+                future.set_exception(error)
+
+    def on_ack(self, delivery_tag, multiple=False):
+        self._resolve(delivery_tag, multiple)
+
+    def on_nack(self, delivery_tag, multiple=False):
+        self.logger.error('Message %s was nacked by broker', delivery_tag)
+        self._resolve(delivery_tag, multiple,
+                      ConfirmError('Message was nacked by broker'))
+
+    def drain(self, timeout):
+        """Handle confirms from broker
+
+        :param timeout: seconds for waiting
+        """
+        try:
+            self._connection.drain_events(timeout=timeout)
+        except socket.timeout:
+            pass
+
+    def _wait(self, limit, timeout):
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while len(self.pending) > limit:
+            wait = 1
+            if deadline is not None:
+                wait = deadline - time.time()
+                if wait <= 0:
+                    return False
+            self.drain(wait)
+        return True
+
+    def wait(self, timeout=None):
+        """Wait confirms for all published messages
+
+        Unconfirmed messages are failed with ConfirmError after timeout
+
+        :param timeout: seconds, default - publisher timeout
+        :return: True if all messages were confirmed
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if self._wait(0, timeout):
+            return True
+        self.logger.error('%s messages were not confirmed in %s seconds',
+                          len(self.pending), timeout)
+        error = ConfirmError('Confirm timeout')
+        for tag in list(self.pending):
+            self._resolve(tag, False, error)
+        return False
+
+    def _publish(self, message, **options):
+        if self.confirms and len(self.pending) >= self.window:
+            if not self._wait(self.window - 1, self.timeout):
+                self.wait(0)
+        future = self._new_future()
+        self.published += 1
+        tag = self.delivery_tag + 1
+        if self.confirms:
+            self.pending[tag] = future
+        try:
+            self.producer.publish(message, **options)
+        except Exception as e:
+            self.logger.exception('Error when publishing')
+            self.pending.pop(tag, None)
+            self.failed += 1
+            future.set_exception(ConfirmError(e))
+            return future
+        self.delivery_tag = tag
+        if not self.confirms:
+            self.confirmed += 1
+            future.set_result(tag)
+        return future
+
+    def publish_to_exchange(self, name, routing_key, message, **properties):
+        """Publish message to exchange, do not wait confirm
+
+        :param name: name of exchange
+        :type name: str
+        :param routing_key: routing key
+        :type routing_key: str
+        :param message: payload for publishing
+        :type message: any serializable object
+        :param properties: additional properties for Producer.publish()
+        :return: concurrent.futures.Future
+        """
+        return self._publish(message, exchange=self.client.exchanges[name],
+                             routing_key=routing_key, **properties)
+
+    def publish_to_queue(self, name, message, **properties):
+        """Publish message to queue, do not wait confirm
+
+        :param name: name of queue
+        :type name: str
+        :param message: payload for publishing
+        :type message: any serializable object
+        :param properties: additional properties for Producer.publish()
+        :return: concurrent.futures.Future
+        """
+        return self._publish(message, routing_key=name, **properties)
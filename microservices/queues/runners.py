@@ -1,3 +1,10 @@
+import multiprocessing
+import signal
+
+from microservices.helpers.prefork import \
+    PreforkSupervisor as BasePreforkSupervisor
+
+
 def gevent_run(app, monkey_patch=True, start=True, debug=False,
                **kwargs):  # pragma: no cover
     """Run your app in gevent.spawn, run simple loop if start == True
@@ -20,3 +27,106 @@ def gevent_run(app, monkey_patch=True, start=True, debug=False,
     if start:
         while not app.stopped:
             gevent.sleep(0.1)
+
+
+def _prefork_child(app_factory, prefetch_count=None, debug=False,
+                   ready=None):  # pragma: no cover
+    """Build and run app in child process, SIGTERM/SIGINT stop it gracefully
+
+    Signals are handled from the start, stop requested while app is building
+    is applied before app.run. ready (multiprocessing.Event) is set before app.run.
+    """
+    state = {'app': None, 'stop': False}
+
+    def stop(signum, frame):
+        state['stop'] = True
+        if state['app'] is not None:
+            state['app'].stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    app = state['app'] = app_factory()
+    if prefetch_count:
+        for consumer in app.consumers:
+            consumer.qos(prefetch_count=prefetch_count)
+    if state['stop']:
+        app.stop()
+    if ready is not None:
+        ready.set()
+    app.run(debug=debug)
+
+
+def split_prefetch_count(prefetch_count, processes):
+    """Share prefetch_count across processes
+
+    The first prefetch_count % processes processes get one extra,
+    every process gets at least 1, 0 is unlimited prefetch for broker.
+
+    :return: list of prefetch_count of processes
+    """
+    share, extra = divmod(prefetch_count, processes)
+    return [max(1, share + (index < extra)) for index in range(processes)]
+
+
+class PreforkSupervisor(BasePreforkSupervisor):
+    """Supervisor of consumer processes
+
+    Every child builds own app (and broker connection) via app_factory,
+    crashed children are restarted, stop() stops children via app.stop(),
+    ready[index] is set when app of child is built and starts consuming.
+    """
+
+    def __init__(self, app_factory, processes=None, prefetch_count=None,
+                 debug=False, **kwargs):
+        """Initialization
+
+        :param app_factory: importable function without params, returns queues.Microservice instance
+        :param processes: count of consumer processes, default - count of cpu
+        :param prefetch_count: prefetch for all processes, shared exactly, the first prefetch_count % processes children get one extra, at least 1 for every child
+        :param debug: debug mode for app.run
+        :param kwargs: restart_timeout, stop_timeout, check_interval, logger for supervisor
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self.app_factory = app_factory
+        self.prefetch_count = prefetch_count
+        self.prefetch_counts = [None] * processes
+        if prefetch_count:
+            self.prefetch_counts = split_prefetch_count(prefetch_count,
+                                                        processes)
+        self.ready = [None] * processes
+        super(PreforkSupervisor, self).__init__(
+            _prefork_child, args=(app_factory,), kwargs={'debug': debug},
+            processes=processes, **kwargs)
+
+    def child_kwargs(self, index):
+        kwargs = super(PreforkSupervisor, self).child_kwargs(index)
+        kwargs['prefetch_count'] = self.prefetch_counts[index]
+        self.ready[index] = kwargs['ready'] = self.context.Event()
+        return kwargs
+
+
+def prefork_run(app_factory, processes=None, prefetch_count=None, start=True,
+                **kwargs):  # pragma: no cover
+    """Run consumers in processes, SIGTERM/SIGINT stop them gracefully
+
+    >>>def create_app():
+    >>>    app = Microservice('amqp:///')
+    >>>    app.add_queue_rule(handler, 'queue')
+    >>>    return app
+    >>>
+    >>>prefork_run(create_app, processes=4, prefetch_count=100)
+
+    :param app_factory: importable function without params, returns queues.Microservice instance
+    :param processes: count of consumer processes, default - count of cpu
+    :param prefetch_count: prefetch for all processes, shared across processes, see PreforkSupervisor
+    :param start: if True, supervisor will be run in current process until SIGTERM/SIGINT, SIGHUP - reload
+    :param kwargs: other params for PreforkSupervisor
+    :return: PreforkSupervisor
+    """
+    supervisor = PreforkSupervisor(app_factory, processes=processes,
+                                   prefetch_count=prefetch_count, **kwargs)
+    if start:
+        supervisor.handle_signals()
+        supervisor.run()
+    return supervisor
@@ -1,6 +1,10 @@
 import socket
+import threading
+import traceback
+from collections import deque
+from multiprocessing import Pool as ProcessPool
 from multiprocessing.pool import ThreadPool
-from time import sleep
+from time import sleep, time
 
 import six
 
@@ -8,6 +12,7 @@ from kombu import Connection, Consumer, Queue
 from kombu.exceptions import MessageStateError
 from kombu.utils import nested
 from microservices.helpers.logs import InstanceLogger
+from microservices.helpers.metrics import null_metrics
 from microservices.utils import get_logger
 
 _logger = get_logger(__name__)
@@ -17,6 +22,169 @@ class HandlerError(Exception):
     pass
 
 
+def call_in_process(handler, payload, context):
+    """Call handler in worker process
+
+    Exception can be not picklable, so it is returned as formatted traceback
+
+    :return: (True, result of handler) or (False, traceback)
+    """
+    try:
+        return True, handler(payload, context)
+    except Exception:
+        return False, traceback.format_exc()
+
+
+class ProcessContext(object):
+    """Picklable context for handler in worker process"""
+
+    def __init__(self, queue, headers=None, properties=None,
+                 delivery_info=None):
+        """Initialization
+
+        :param queue: name of queue
+        :param headers: headers of message
+        :param properties: properties of message
+        :param delivery_info: delivery info of message
+        """
+        self.queue = queue
+        self.headers = headers or {}
+        self.properties = properties or {}
+        self.delivery_info = delivery_info or {}
+
+    @classmethod
+    def from_message(cls, queue, message):
+        delivery_info = dict(message.delivery_info)
+        # exchange, routing key, etc., without channel objects
+        delivery_info = {
+            key: value for key, value in delivery_info.items()
+            if isinstance(value, (six.string_types, six.integer_types, bool))
+        }
+        return cls(queue, headers=dict(message.headers or {}),
+                   properties=dict(message.properties or {}),
+                   delivery_info=delivery_info)
+
+
+class ProcessBatchContext(object):
+    """Picklable context for batch handler in worker process"""
+
+    def __init__(self, queue, contexts):
+        """Initialization
+
+        :param queue: name of queue
+        :param contexts: contexts of messages in batch
+        :type contexts: list of ProcessContext
+        """
+        self.queue = queue
+        self.contexts = contexts
+
+
+class RuleMetrics(object):
+    """Metrics of rule, label: queue"""
+
+    def __init__(self, metrics, queue):
+        """Initialization
+
+        :param metrics: MetricsRegistry or null_metrics
+        :param queue: name of queue
+        """
+        self.received = metrics.counter(
+            'queue_messages_received_total', 'Received messages', queue=queue)
+        self.acked = metrics.counter(
+            'queue_messages_acked_total', 'Acked messages', queue=queue)
+        self.rejected = metrics.counter(
+            'queue_messages_rejected_total', 'Rejected messages', queue=queue)
+        self.failed = metrics.counter(
+            'queue_messages_failed_total', 'Messages with error in handler',
+            queue=queue)
+        self.handler_seconds = metrics.histogram(
+            'queue_handler_seconds', 'Latency of handler (of batch for batch '
+            'handlers), for processes - with waiting in pool', queue=queue)
+
+
+class ServiceMetrics(object):
+    """Metrics of consumer loop"""
+
+    def __init__(self, metrics):
+        """Initialization
+
+        :param metrics: MetricsRegistry or null_metrics
+        """
+        self.drain_events_seconds = metrics.counter(
+            'queue_drain_events_seconds_total',
+            'Time of waiting and handling of broker events, '
+            'handlers without pool are called here')
+        self.drain_results_seconds = metrics.counter(
+            'queue_drain_results_seconds_total',
+            'Time of callbacks from workers: acks, results of handlers')
+        self.reconnects = metrics.counter(
+            'queue_reconnects_total', 'Reconnects to broker')
+        self.revives = metrics.counter(
+            'queue_revives_total', 'Revives of consumers')
+
+
+def _messages_count(context):
+    contexts = getattr(context, 'contexts', None)
+    return 1 if contexts is None else len(contexts)
+
+
+class CompletionQueue(object):
+    """Thread safe queue of deferred callbacks (ack, reject, etc.) from workers
+
+    Consumer loop is woken up by a new callback or by finished handler
+    """
+
+    def __init__(self):
+        self._callbacks = deque()
+        self._condition = threading.Condition()
+        self._events = 0
+        self.in_flight = 0
+
+    def __len__(self):
+        return len(self._callbacks)
+
+    def _notify(self):
+        self._events += 1
+        self._condition.notify_all()
+
+    def append(self, callback):
+        with self._condition:
+            self._callbacks.append(callback)
+            self._notify()
+
+    def pop(self):
+        """Get the oldest callback
+
+        :raise IndexError: if queue is empty
+        """
+        return self._callbacks.popleft()
+
+    def started(self):
+        with self._condition:
+            self.in_flight += 1
+
+    def finished(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._notify()
+
+    def wait(self, timeout=None, limit=None):
+        """Wait a new callback or finished handler
+
+        :param timeout: seconds
+        :param limit: do not wait, if count of running handlers is less than limit
+        :return: True if there are new callbacks or finished handlers
+        """
+        with self._condition:
+            if self._callbacks:
+                return True
+            if limit is not None and self.in_flight < limit:
+                return True
+            events = self._events
+            self._condition.wait(timeout)
+            return self._events != events
+
+
 class DeferredMessage(object):
     _methods_for_callbacks = {
         'ack', 'reject', 'requeue', 'reject_log_error',
@@ -26,18 +194,29 @@ class DeferredMessage(object):
     def __init__(self, message, deferred_callbacks):
         self.message = message
         self.deferred_callbacks = deferred_callbacks
+        self.deferred_acknowledged = False
 
     @property
     def with_deferred_callbacks(self):
         return self.deferred_callbacks is not None
 
+    @property
+    def acknowledged(self):
+        """True if message was acked/rejected or ack/reject is deferred"""
+        return self.deferred_acknowledged or self.message.acknowledged
+
+    def _defer(self, entity):
+        def deferred(*args, **kwargs):
+            self.deferred_acknowledged = True
+            self.deferred_callbacks.append(lambda: entity(*args, **kwargs))
+
+        return deferred
+
     def __getattr__(self, item):
         entity = getattr(self.message, item)
         if self.with_deferred_callbacks:
             if item in self._methods_for_callbacks:
-                return lambda *args, **kwargs: self.deferred_callbacks.append(
-                    lambda: entity(*args, **kwargs)
-                )
+                return self._defer(entity)
             else:
                 return entity
         else:
@@ -49,13 +228,18 @@ class Rule(object):
     """Rule"""
 
     def __init__(self, name, handler, logger, autoack=True,
-                 deferred_callbacks=None, pool=None,
+                 deferred_callbacks=None, pool=None, processes=False,
+                 result_callback=None, error_callback=None, metrics=None,
                  **options):
         """Initialization
 
         :param name: name of queue
         :param handler: handle for queue
         :param autoack: if true, call message.ack()
+        :param processes: if True, handler is called in process pool
+        :param result_callback: result_callback(result, context), called in consumer for result of handler in process
+        :param error_callback: error_callback(error, context), called in consumer for error of handler in process
+        :param metrics: MetricsRegistry, default - without metrics
         """
         self.handler = handler
         self.name = name
@@ -65,6 +249,10 @@ class Rule(object):
         self._name = '<queue: {}>'.format(self.name)
         self.deferred_callbacks = deferred_callbacks
         self.pool = pool
+        self.processes = processes
+        self.result_callback = result_callback
+        self.error_callback = error_callback
+        self.metrics = RuleMetrics(metrics or null_metrics, name)
 
     def __str__(self):
         return self._name
@@ -74,16 +262,79 @@ class Rule(object):
         return self.deferred_callbacks is not None
 
     def add_to_pool(self, handler):
-        self.pool.apply_async(handler)
+        completions = self.deferred_callbacks
+        completions.started()
+
+        def task():
+            try:
+                handler()
+            finally:
+                completions.finished()
+
+        self.pool.apply_async(task)
+
+    def add_to_process_pool(self, payload, context, process_context):
+        """Call handler in process pool, result is handled in consumer
+
+        :param payload: payload or list of payloads for batch
+        :param context: HandlerContext or BatchContext
+        :param process_context: ProcessContext or ProcessBatchContext
+        """
+        completions = self.deferred_callbacks
+        completions.started()
+        started = time()
+
+        def done(result):
+            ok, value = result
+            completions.append(
+                lambda: self.process_done(ok, value, context, started))
+            completions.finished()
+
+        def failed(error):
+            completions.append(
+                lambda: self.process_done(False, repr(error), context,
+                                          started))
+            completions.finished()
+
+        kwargs = {}
+        if six.PY3:
+            kwargs['error_callback'] = failed
+        self.pool.apply_async(call_in_process,
+                              (self.handler, payload, process_context),
+                              callback=done, **kwargs)
+
+    def process_done(self, ok, value, context, started=None):
+        """Handle result of handler from worker process
+
+        :param ok: True if handler returned value
+        :param value: result of handler or traceback of error
+        :param context: HandlerContext or BatchContext
+        :param started: time of sending to pool, for latency
+        """
+        if started is not None:
+            self.metrics.handler_seconds.observe(time() - started)
+        if not ok:
+            self.metrics.failed.inc(_messages_count(context))
+            self.logger.error('Something happened in user handler:\n%s',
+                              value)
+            if self.error_callback is not None:
+                self.error_callback(HandlerError(value), context)
+            return
+        if self.result_callback is not None:
+            self.result_callback(value, context)
+        if self.autoack:
+            context.ack()
 
     def callback(self, body, message):
         message = DeferredMessage(message, self.deferred_callbacks)
+        self.metrics.received.inc()
         self.logger.debug('Data (len: %s) received', len(body))
 
         def autoack():
             try:
                 self.logger.debug('Ack message via autoack')
                 message.ack()
+                self.metrics.acked.inc()
             except ConnectionError as e:  # pragma: no cover
                 self.logger.error('Connection error: %s when try message.ack',
                                   e.strerror)
@@ -92,22 +343,135 @@ class Rule(object):
                     'ACK() was called in handler?')
 
         def handler():
+            started = time()
             try:
                 self.logger.debug('Call handler...')
                 self.handler(body, HandlerContext(message, self))
             except Exception:
+                self.metrics.failed.inc()
                 self.logger.exception('Something happened in user handler')
                 raise HandlerError('Something happened in user handler')
+            finally:
+                self.metrics.handler_seconds.observe(time() - started)
             if self.autoack:
                 autoack()
 
-        if self.with_deferred_callbacks:
+        if self.processes:
+            self.logger.debug('Add handler to process pool')
+            self.add_to_process_pool(
+                body, HandlerContext(message, self),
+                ProcessContext.from_message(self.name, message))
+        elif self.with_deferred_callbacks:
             self.logger.debug('Add handler to pool')
             self.add_to_pool(handler)
         else:
             handler()
 
 
+@six.python_2_unicode_compatible
+class BatchRule(Rule):
+    """Rule for batch handler, handler(payloads, context)"""
+
+    def __init__(self, name, handler, logger, batch_size, batch_timeout=1,
+                 **kwargs):
+        """Initialization
+
+        :param name: name of queue
+        :param handler: handler(payloads, context) for list of payloads and BatchContext
+        :param batch_size: max count of messages in batch
+        :param batch_timeout: seconds, batch is handled if it was not filled after timeout
+        """
+        super(BatchRule, self).__init__(name, handler, logger, **kwargs)
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self._name = '<queue: {}, batch: {}>'.format(self.name, batch_size)
+        self.batch = []
+        self.batch_started = None
+
+    @property
+    def expired(self):
+        return bool(self.batch) and \
+            time() - self.batch_started >= self.batch_timeout
+
+    def callback(self, body, message):
+        message = DeferredMessage(message, self.deferred_callbacks)
+        self.metrics.received.inc()
+        if not self.batch:
+            self.batch_started = time()
+        self.batch.append((body, HandlerContext(message, self)))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Handle collected batch"""
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        payloads = [body for body, _ in batch]
+        context = BatchContext([context for _, context in batch], self)
+        self.logger.debug('Batch (len: %s) collected', len(payloads))
+
+        def handler():
+            started = time()
+            try:
+                self.logger.debug('Call batch handler...')
+                self.handler(payloads, context)
+            except Exception:
+                self.metrics.failed.inc(len(payloads))
+                self.logger.exception('Something happened in user handler')
+                raise HandlerError('Something happened in user handler')
+            finally:
+                self.metrics.handler_seconds.observe(time() - started)
+            if self.autoack:
+                try:
+                    self.logger.debug('Ack batch via autoack')
+                    context.ack()
+                except ConnectionError as e:  # pragma: no cover
+                    self.logger.error(
+                        'Connection error: %s when try batch ack', e.strerror)
+
+        if self.processes:
+            self.logger.debug('Add batch handler to process pool')
+            self.add_to_process_pool(payloads, context, ProcessBatchContext(
+                self.name, [ProcessContext.from_message(self.name,
+                                                        context.message)
+                            for context in context.contexts]))
+        elif self.with_deferred_callbacks:
+            self.logger.debug('Add batch handler to pool')
+            self.add_to_pool(handler)
+        else:
+            handler()
+
+
+class BatchContext(object):
+    """Context for batch handler function"""
+
+    def __init__(self, contexts, rule):
+        """Initialization
+
+        :param contexts: contexts of messages in batch
+        :type contexts: list of HandlerContext
+        :param rule: rule object
+        :type rule: BatchRule
+        """
+        self.contexts = contexts
+        self.rule = rule
+
+    @property
+    def messages(self):
+        return [context.message for context in self.contexts]
+
+    def ack(self):
+        """Ack all messages of batch, which are not acked/rejected yet"""
+        for context in self.contexts:
+            context.ack()
+
+    def reject(self, requeue=False):
+        """Reject all messages of batch, which are not acked/rejected yet"""
+        for context in self.contexts:
+            context.reject(requeue=requeue)
+
+
 class HandlerContext(object):
     """Context for handler function"""
 
@@ -122,6 +486,18 @@ class HandlerContext(object):
         self.message = message
         self.rule = rule
 
+    def ack(self):
+        """Ack message, if it is not acked/rejected yet"""
+        if not self.message.acknowledged:
+            self.message.ack()
+            self.rule.metrics.acked.inc()
+
+    def reject(self, requeue=False):
+        """Reject message, if it is not acked/rejected yet"""
+        if not self.message.acknowledged:
+            self.message.reject(requeue=requeue)
+            self.rule.metrics.rejected.inc()
+
 
 @six.python_2_unicode_compatible
 class Microservice(object):
@@ -130,21 +506,28 @@ class Microservice(object):
     connection = 'amqp:///'
 
     def __init__(self, connection='amqp:///', logger=None, timeout=1, name=None,
-                 workers=None, pool_factory=ThreadPool, reconnect_timeout=1,
+                 workers=None, pool_factory=None, reconnect_timeout=1,
                  reconnect_enable=True, workers_override_prefetch=True,
-                 immediate_connect=True):
+                 immediate_connect=True, ack_interval=0.01, processes=False,
+                 metrics=None):
         """Initialization
 
         :type pool_factory: callable object, pool should has property size
-        :param pool_factory: for pool will by configurated as pool_factory(workers)
+        :param pool_factory: for pool will by configurated as pool_factory(workers), default - ThreadPool or multiprocessing.Pool for processes
         :type workers: int
         :param workers: count of workers in pool
+        :param processes: if True, handlers are called in worker processes, payloads should be picklable, handlers - importable functions
+        :type processes: bool
         :param connection: connection for queues broker
         :type connection: str, None, dict or Connection
         :param logger: logging instance
         :type logger: Logger
         :param timeout: sleeping for loop, default = 0.1
         :type timeout: None, int or float
+        :param ack_interval: max seconds for waiting events, when handlers are running in pool, default = 0.01
+        :type ack_interval: int or float
+        :param metrics: collector of metrics, ex. microservices.helpers.metrics.MetricsRegistry, default - without metrics
+        :type metrics: MetricsRegistry
         """
         if logger is None:
             logger = _logger
@@ -156,6 +539,7 @@ class Microservice(object):
         self.reconnect_timeout = reconnect_timeout
         self.reconnect_enable = reconnect_enable
         self.workers_override_prefetch = workers_override_prefetch
+        self.ack_interval = ack_interval
 
         if name is None:
             try:
@@ -167,12 +551,29 @@ class Microservice(object):
         self.name = name
         self._stop = False
         self._stopped = False
+        self.batch_rules = []
         self.pool = None
         self.workers = workers
+        self.processes = bool(workers) and processes
         self.deferred_callbacks = None
         if workers:
-            self.deferred_callbacks = []
+            if pool_factory is None:
+                pool_factory = ProcessPool if self.processes else ThreadPool
+            self.deferred_callbacks = CompletionQueue()
             self.pool = pool_factory(workers)
+        self.metrics = metrics or null_metrics
+        self.service_metrics = ServiceMetrics(self.metrics)
+        if workers:
+            completions = self.deferred_callbacks
+            self.metrics.gauge('queue_pool_workers', 'Workers in pool').set(
+                workers)
+            self.metrics.gauge(
+                'queue_pool_in_flight', 'Handlers in pool, queued and running',
+                function=lambda: completions.in_flight)
+            self.metrics.gauge(
+                'queue_pool_pending_callbacks',
+                'Callbacks from workers, waiting for consumer loop',
+                function=lambda: len(completions))
         if immediate_connect:
             self.connect()
 
@@ -202,8 +603,25 @@ class Microservice(object):
 
         return connection
 
+    @property
+    def drain_timeout(self):
+        """Timeout for draining events, batches should not wait longer than batch_timeout"""
+        timeouts = [rule.batch_timeout for rule in self.batch_rules]
+        if self.timeout is not None:
+            timeouts.append(self.timeout)
+        if not timeouts:
+            return None
+        return min(timeouts)
+
+    @staticmethod
+    def _importable(handler):
+        name = getattr(handler, '__qualname__',
+                       getattr(handler, '__name__', ''))
+        return bool(name) and '<' not in name
+
     def add_queue_rule(self, handler, name, autoack=True, prefetch_size=0,
-                       prefetch_count=0, **kwargs):
+                       prefetch_count=0, batch_size=None, batch_timeout=1,
+                       result_callback=None, error_callback=None, **kwargs):
         """Add queue rule to Microservice
 
         :param prefetch_count: count of messages for getting from mq
@@ -213,16 +631,57 @@ class Microservice(object):
         :type handler: callable object
         :param name: name of queue
         :type name: str
+        :param batch_size: if set, handler(payloads, context) is called for list of messages
+        :type batch_size: int or None
+        :param batch_timeout: seconds, not filled batch is handled after timeout
+        :type batch_timeout: int or float
+        :param result_callback: for processes, result_callback(result, context) in consumer
+        :param error_callback: for processes, error_callback(error, context) in consumer
         """
+        rule_class = Rule
+        if batch_size:
+            rule_class = BatchRule
+            kwargs['batch_size'] = batch_size
+            kwargs['batch_timeout'] = batch_timeout
 
         if self.with_pool:
             if self.workers_override_prefetch:
                 prefetch_count = self.workers
-            rule = Rule(name, handler, self.logger, autoack=autoack,
-                        deferred_callbacks=self.deferred_callbacks,
-                        pool=self.pool, **kwargs)
+                if batch_size:
+                    # every worker handles a batch, and one batch is filling
+                    prefetch_count = batch_size * (self.workers + 1)
+            if self.processes and not self._importable(handler):
+                raise ValueError(
+                    'Handler for "{}" can not be sent to worker process, '
+                    'it should be importable function'.format(name))
+            rule = rule_class(name, handler, self.logger, autoack=autoack,
+                              deferred_callbacks=self.deferred_callbacks,
+                              pool=self.pool, processes=self.processes,
+                              result_callback=result_callback,
+                              error_callback=error_callback,
+                              metrics=self.metrics, **kwargs)
         else:
-            rule = Rule(name, handler, self.logger, autoack=autoack, **kwargs)
+            rule = rule_class(name, handler, self.logger, autoack=autoack,
+                              metrics=self.metrics, **kwargs)
+        if batch_size:
+            if prefetch_count and prefetch_count < batch_size:
+                self.logger.warning(
+                    'prefetch_count %s < batch_size %s for "%s", '
+                    'prefetch_count = batch_size', prefetch_count,
+                    batch_size, name)
+                prefetch_count = batch_size
+            self.batch_rules.append(rule)
+        self.add_consumer(rule, prefetch_count=prefetch_count,
+                          prefetch_size=prefetch_size)
+
+    def add_consumer(self, rule, prefetch_count=0, prefetch_size=0):
+        """Create consumer for queue of rule
+
+        :param rule: rule object
+        :type rule: Rule
+        :param prefetch_count: count of messages for getting from mq
+        :param prefetch_size: size in bytes for getting data from mq
+        """
         self.connect()
         consumer = Consumer(self.connection, queues=[Queue(rule.name)],
                             callbacks=[rule.callback], auto_declare=True)
@@ -231,8 +690,8 @@ class Microservice(object):
         self.logger.debug('Rule "%s" added!', rule.name)
 
     def _start(self):
+        # stop() could be called before run(), ex. by signal while app is building
         self._stopped = False
-        self._stop = False
         self.connect()
 
     def stop(self):
@@ -240,7 +699,7 @@ class Microservice(object):
         self.logger.info('Try to stop microservice draining events')
 
     def queue(self, name, autoack=True, prefetch_size=0, prefetch_count=0,
-              **kwargs):
+              batch_size=None, batch_timeout=1, **kwargs):
         """Decorator for handler function
 
         >>>app = Microservice()
@@ -248,18 +707,31 @@ class Microservice(object):
         >>>@app.queue('queue')
         >>>def function(payload, context):
         >>>    pass
+        >>>
+        >>>@app.queue('events', batch_size=500, batch_timeout=0.2)
+        >>>def batch_function(payloads, context):
+        >>>    pass
+
+        For Microservice(workers=N, processes=True) handler is called in worker process
+        with ProcessContext (or ProcessBatchContext), result_callback(result, context)
+        and error_callback(error, context) are called in consumer with original context.
 
         :param prefetch_count: count of messages for getting from mq
         :param prefetch_size: size in bytes for getting data from mq
         :param autoack: if True message.ack() after callback
         :param name: name of queue
         :type name: str
+        :param batch_size: if set, handler(payloads, context) is called for list of messages, context - BatchContext
+        :param batch_timeout: seconds, not filled batch is handled after timeout
+        :param kwargs: params for add_queue_rule: result_callback, error_callback, etc.
         """
 
         def decorator(f):
             self.add_queue_rule(f, name, autoack=autoack,
                                 prefetch_size=prefetch_size,
                                 prefetch_count=prefetch_count,
+                                batch_size=batch_size,
+                                batch_timeout=batch_timeout,
                                 **kwargs)
             return f
 
@@ -287,6 +759,8 @@ class Microservice(object):
             sleep(self.reconnect_timeout)
 
     def revive(self):  # pragma no cover
+        self.service_metrics.revives.inc()
+
         def _revive():
             for i, consumer in enumerate(self.consumers):
                 self.logger.debug('Try revive consumer: %s', i)
@@ -314,7 +788,40 @@ class Microservice(object):
     def stopped(self):
         return self._stopped
 
+    @property
+    def workers_busy(self):
+        """All workers are busy, prefetched messages are not acked yet"""
+        return self.with_pool and \
+            self.deferred_callbacks.in_flight >= self.workers
+
+    @property
+    def events_timeout(self):
+        """Timeout for broker events, short while handlers are running"""
+        timeout = self.drain_timeout
+        if self.with_pool and self.deferred_callbacks.in_flight:
+            if timeout is None or timeout > self.ack_interval:
+                timeout = self.ack_interval
+        return timeout
+
+    def wait_events(self):
+        """Wait events from broker or results from workers
+
+        :raise socket.timeout: if nothing happened
+        """
+        started = time()
+        try:
+            if self.workers_busy:
+                # nothing will be received, until results are acked
+                if not self.deferred_callbacks.wait(self.drain_timeout,
+                                                    limit=self.workers):
+                    raise socket.timeout()
+            else:
+                self.connection.drain_events(timeout=self.events_timeout)
+        finally:
+            self.service_metrics.drain_events_seconds.inc(time() - started)
+
     def drain_results(self):
+        started = time()
         while self.deferred_callbacks:
             callback = self.deferred_callbacks.pop()
             try:
@@ -331,20 +838,36 @@ class Microservice(object):
                 self.logger.exception(
                     'Unknown exception when try callback: %s', callback
                 )
+        self.service_metrics.drain_results_seconds.inc(time() - started)
+
+    def flush_batches(self, force=False):
+        """Handle expired batches
+
+        :param force: if True, handle all not empty batches
+        """
+        for rule in self.batch_rules:
+            if force or rule.expired:
+                try:
+                    rule.flush()
+                except HandlerError:
+                    self.logger.exception('Handler error')
 
     def drain_events(self, infinity=True):
 
         with nested(*self.consumers):
             while not self._stop:
                 try:
-                    self.connection.drain_events(timeout=self.timeout)
+                    self.wait_events()
                 except socket.timeout:
+                    if self.batch_rules:
+                        self.flush_batches()
                     if not infinity:
                         break
                 except ConnectionError as e:  # pragma no cover
                     self.logger.error(
                         'Connection to mq has broken off because: %s. Try to reconnect, %s',
                         e)
+                    self.service_metrics.reconnects.inc()
                     self.connect()
                     self.revive()
                     break
@@ -360,6 +883,8 @@ class Microservice(object):
                         self.logger.exception(
                             'Something wrong! And stopping...')
                         break
+                if self.batch_rules:
+                    self.flush_batches()
                 if self.with_pool:
                     try:
                         self.drain_results()
@@ -367,13 +892,15 @@ class Microservice(object):
                         self.logger.exception('Unknown error when '
                                               'draining results')
         if self._stop:
+            if self.batch_rules:
+                self.flush_batches(force=True)
             if self.with_pool:
                 try:
-                    self.pool.join()
-                    self.drain_results()  # pragma: no cover
-                except AssertionError:
-                    pass
-                except Exception: # pragma: no cover
+                    while self.deferred_callbacks.in_flight:
+                        self.deferred_callbacks.wait(self.timeout, limit=1)
+                        self.drain_results()
+                    self.drain_results()
+                except Exception:  # pragma: no cover
                     self.logger.exception(
                         'Unknown error when '
                         'draining results'
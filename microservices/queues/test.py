@@ -1,3 +1,4 @@
+import sys
 import unittest
 from microservices.utils import set_logging
 from threading import Thread, Event
@@ -5,6 +6,24 @@ from threading import Thread, Event
 set_logging()
 
 
+def process_square(payload, context):
+    if payload['value'] is None:
+        raise ValueError('Error in process')
+    return payload['value'] ** 2, context.queue
+
+
+def process_sum(payloads, context):
+    return sum(payload['value'] for payload in payloads), len(context.contexts)
+
+
+def prefork_app():
+    from microservices.queues.service import Microservice
+
+    app = Microservice('memory:///', timeout=0.01)
+    app.add_queue_rule(process_square, 'prefork')
+    return app
+
+
 class TestService(unittest.TestCase):
     def test_service(self):
         from microservices.queues.service import Microservice
@@ -140,3 +159,501 @@ class TestService(unittest.TestCase):
         run_thread.join(timeout=10)
         self.assertTrue(all((context.message.acknowledged for context in handlers_autoacks)))
         self.assertTrue(all((context.message.acknowledged for context in handlers_noacks)))
+
+    def test_workers_busy(self):
+        import time
+        from microservices.queues.service import Microservice
+        from microservices.queues.client import Client
+
+        # long timeout of broker events, consumer should not wait it with busy pool
+        microservice = Microservice('memory:///', timeout=2, workers=1)
+        client = Client('memory:///')
+        started = []
+        contexts = []
+
+        @microservice.queue('workers_busy')
+        def handler(data, context):
+            started.append(time.time())
+            time.sleep(0.02)
+            contexts.append(context)
+
+        run_thread = Thread(target=microservice.run)
+        run_thread.start()
+        start = time.time()
+        client.publish_many('workers_busy', ['data'] * 5)
+        while len(contexts) < 5 or not all(context.message.acknowledged
+                                           for context in contexts):
+            if time.time() - start > 4:  # pragma: no cover
+                microservice.stop()
+                raise AssertionError('Messages were not acked')
+            time.sleep(0.01)
+        # every message waited drain_timeout without wake up by finished handler
+        duration = time.time() - started[0]
+        microservice.stop()
+        run_thread.join(timeout=10)
+        self.assertLess(duration, 1)
+
+    def test_metrics(self):
+        import requests
+        from microservices.helpers.metrics import MetricsRegistry
+        from microservices.queues.service import Microservice
+        from microservices.queues.client import Client
+
+        metrics = MetricsRegistry()
+        microservice = Microservice('memory:///', timeout=0.01, metrics=metrics)
+        client = Client('memory:///')
+
+        @microservice.queue('metrics_ok')
+        def handle_ok(payload, context):
+            pass
+
+        @microservice.queue('metrics_error', autoack=False)
+        def handle_error(payload, context):
+            if payload == 'reject':
+                context.reject()
+                return
+            raise ValueError('tested')
+
+        for _ in range(3):
+            client.publish_to_queue('metrics_ok', 'ok')
+        client.publish_to_queue('metrics_error', 'error')
+        client.publish_to_queue('metrics_error', 'reject')
+        for _ in range(10):
+            microservice.read()
+
+        self.assertEqual(metrics.get('queue_messages_received_total',
+                                     queue='metrics_ok'), 3)
+        self.assertEqual(metrics.get('queue_messages_acked_total',
+                                     queue='metrics_ok'), 3)
+        self.assertEqual(metrics.get('queue_messages_failed_total',
+                                     queue='metrics_error'), 1)
+        self.assertEqual(metrics.get('queue_messages_rejected_total',
+                                     queue='metrics_error'), 1)
+        self.assertEqual(metrics.get('queue_handler_seconds',
+                                     queue='metrics_ok')['count'], 3)
+        self.assertGreater(metrics.get('queue_drain_events_seconds_total'), 0)
+
+        server = metrics.serve(0, '127.0.0.1')
+        try:
+            response = requests.get('http://127.0.0.1:{}/metrics'.format(
+                server.server_address[1]), timeout=5)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn('queue_messages_acked_total{queue="metrics_ok"} 3.0',
+                      response.text)
+        self.assertIn('# TYPE queue_handler_seconds histogram', response.text)
+
+    def test_batch(self):
+        from microservices.queues.service import Microservice
+        from microservices.queues.client import Client
+
+        microservice = Microservice('memory:///', timeout=0.01)
+        client = Client('memory:///')
+        batches = []
+
+        @microservice.queue('batch_autoack', batch_size=4, batch_timeout=0.05)
+        def handle_autoack(payloads, context):
+            batches.append((payloads, context))
+
+        @microservice.queue('batch_reject', batch_size=2, autoack=False)
+        def handle_reject(payloads, context):
+            batches.append((payloads, context))
+            context.contexts[0].message.ack()
+            context.reject()
+
+        self.assertEqual(microservice.drain_timeout, 0.01)
+        client.publish_many('batch_autoack', list(range(6)))
+        client.publish_many('batch_reject', ['a', 'b'])
+
+        for _ in range(60):
+            microservice.read()
+            if len(batches) == 3:
+                break
+        payloads = sorted([payloads for payloads, _ in batches], key=len)
+        self.assertEqual(payloads, [['a', 'b'], [4, 5], [0, 1, 2, 3]])
+        for _, context in batches:
+            self.assertTrue(all(message.acknowledged for message in context.messages))
+        reject_context = [context for _, context in batches
+                          if context.rule.name == 'batch_reject'][0]
+        self.assertEqual([message.message._state for message in reject_context.messages],
+                         ['ACK', 'REJECTED'])
+
+    def test_batch_workers(self):
+        from microservices.queues.service import Microservice
+        from microservices.queues.client import Client
+
+        microservice = Microservice('memory:///', timeout=0.01, workers=2)
+        client = Client('memory:///')
+        contexts = []
+
+        @microservice.queue('batch_workers', batch_size=3, batch_timeout=0.05)
+        def handle(payloads, context):
+            contexts.append(context)
+
+        run_thread = Thread(target=microservice.run)
+        run_thread.start()
+        client.publish_many('batch_workers', list(range(7)))
+
+        import time
+        start = time.time()
+        while sum(len(context.messages) for context in contexts) < 7:
+            if time.time() - start > 5:  # pragma: no cover
+                microservice.stop()
+                raise AssertionError('Timeout error')
+            time.sleep(0.01)
+        time.sleep(0.1)
+        microservice.stop()
+        run_thread.join(timeout=10)
+        self.assertTrue(all(message.message.acknowledged
+                            for context in contexts
+                            for message in context.messages))
+
+    def test_processes(self):
+        from microservices.queues.service import Microservice
+        from microservices.queues.client import Client
+
+        microservice = Microservice('memory:///', timeout=0.01, workers=2,
+                                    processes=True)
+        client = Client('memory:///')
+        results = []
+        errors = []
+
+        with self.assertRaises(ValueError):
+            microservice.queue('processes_lambda')(lambda payload, context: None)
+
+        microservice.add_queue_rule(
+            process_square, 'processes',
+            result_callback=lambda result, context: results.append(
+                (result, context)),
+            error_callback=lambda error, context: errors.append(
+                (error, context)))
+        microservice.add_queue_rule(
+            process_sum, 'processes_batch', batch_size=3, batch_timeout=0.05,
+            result_callback=lambda result, context: results.append(
+                (result, context)))
+
+        run_thread = Thread(target=microservice.run)
+        run_thread.start()
+        for value in (2, 3, None):
+            client.publish_to_queue('processes', {'value': value})
+        client.publish_many('processes_batch',
+                            [{'value': value} for value in (1, 2, 3, 4)])
+
+        import time
+        start = time.time()
+        while len(results) < 4 or not errors:
+            if time.time() - start > 10:  # pragma: no cover
+                microservice.stop()
+                raise AssertionError('Timeout error')
+            time.sleep(0.01)
+        time.sleep(0.1)
+        microservice.stop()
+        run_thread.join(timeout=10)
+        microservice.pool.terminate()
+
+        self.assertEqual(len(results), 4)
+        self.assertEqual(
+            sorted(result for result, _ in results if result[1] == 'processes'),
+            [(4, 'processes'), (9, 'processes')])
+        self.assertEqual(
+            sorted(result for result, _ in results if result[1] != 'processes'),
+            [(4, 1), (6, 3)])
+        self.assertIn('ValueError', str(errors[0][0]))
+        self.assertFalse(errors[0][1].message.acknowledged)
+        self.assertTrue(all(context.message.acknowledged
+                            for result, context in results
+                            if result[1] == 'processes'))
+
+    def test_stop_before_run(self):
+        from microservices.queues.service import Microservice
+
+        microservice = Microservice('memory:///', timeout=0.01)
+        microservice.add_queue_rule(process_square, 'stop_before_run')
+        microservice.stop()
+        # requested stop is not lost, run returns at once
+        microservice.run()
+        self.assertTrue(microservice.stopped)
+
+
+class TestCompletionQueue(unittest.TestCase):
+    def test_queue(self):
+        from microservices.queues.service import CompletionQueue
+
+        completions = CompletionQueue()
+        self.assertRaises(IndexError, completions.pop)
+        completions.append(1)
+        completions.append(2)
+        self.assertEqual(len(completions), 2)
+        # callbacks are waiting, it returns immediately
+        self.assertTrue(completions.wait(10))
+        self.assertEqual([completions.pop(), completions.pop()], [1, 2])
+        self.assertFalse(completions)
+
+    def test_wait(self):
+        import time
+        from threading import Timer
+        from microservices.queues.service import CompletionQueue
+
+        completions = CompletionQueue()
+        completions.started()
+        self.assertEqual(completions.in_flight, 1)
+
+        # not all workers are busy, it does not wait
+        start = time.time()
+        self.assertTrue(completions.wait(10, limit=2))
+        self.assertLess(time.time() - start, 1)
+
+        start = time.time()
+        self.assertFalse(completions.wait(0.1, limit=1))
+        self.assertGreaterEqual(time.time() - start, 0.1)
+
+        # woken up by callback from worker
+        Timer(0.05, completions.append, args=(1,)).start()
+        start = time.time()
+        self.assertTrue(completions.wait(10, limit=1))
+        self.assertLess(time.time() - start, 1)
+        completions.pop()
+
+        # woken up by finished handler
+        Timer(0.05, completions.finished).start()
+        start = time.time()
+        self.assertTrue(completions.wait(10, limit=1))
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(completions.in_flight, 0)
+
+
+class TestRunners(unittest.TestCase):
+    def test_prefork(self):
+        import os
+        import signal
+        import time
+        from microservices.queues.runners import PreforkSupervisor, \
+            split_prefetch_count
+
+        self.assertEqual(split_prefetch_count(3, 2), [2, 1])
+        self.assertEqual(split_prefetch_count(8, 4), [2, 2, 2, 2])
+        self.assertEqual(split_prefetch_count(2, 4), [1, 1, 1, 1])
+
+        supervisor = PreforkSupervisor(prefork_app, processes=2,
+                                       prefetch_count=3, restart_timeout=0,
+                                       check_interval=0.01, stop_timeout=5)
+        self.assertEqual(supervisor.prefetch_counts, [2, 1])
+        run_thread = Thread(target=supervisor.run)
+        run_thread.start()
+
+        def wait(condition):
+            start = time.time()
+            while not condition():
+                if time.time() - start > 10:  # pragma: no cover
+                    supervisor.stop()
+                    raise AssertionError('Timeout error')
+                time.sleep(0.01)
+
+        wait(lambda: all(ready is not None and ready.is_set()
+                         for ready in supervisor.ready))
+        crashed = supervisor.children[0]
+        os.kill(crashed.pid, signal.SIGKILL)
+        # new child is spawned after its ready event
+        wait(lambda: all((supervisor.children[0].pid != crashed.pid,
+                          supervisor.ready[0].is_set())))
+        self.assertEqual(supervisor.restarts, 1)
+
+        supervisor.stop()
+        run_thread.join(timeout=10)
+        self.assertTrue(supervisor.stopped)
+        self.assertEqual([process.exitcode for process in supervisor.children],
+                         [0, 0])
+
+    def test_prefork_stop_on_start(self):
+        import os
+        import signal
+        import time
+        from microservices.helpers.prefork import get_context
+        from microservices.queues.runners import _prefork_child
+
+        context = get_context()
+        building = context.Event()
+        ready = context.Event()
+
+        def slow_app():
+            building.set()
+            time.sleep(0.5)
+            return prefork_app()
+
+        process = context.Process(target=_prefork_child, args=(slow_app,),
+                                  kwargs={'ready': ready})
+        process.start()
+        self.assertTrue(building.wait(5))
+        # stop while app is building is not lost
+        os.kill(process.pid, signal.SIGTERM)
+        process.join(5)
+        self.assertFalse(process.is_alive())
+        self.assertEqual(process.exitcode, 0)
+        self.assertTrue(ready.is_set())
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'async def is not available')
+class TestAsyncService(unittest.TestCase):
+    def test_async_service(self):
+        import time
+        from microservices.queues.async_fixtures import sleeping_handler
+        from microservices.queues.async_service import AsyncMicroservice
+        from microservices.queues.client import Client
+
+        microservice = AsyncMicroservice('memory:///', timeout=0.01,
+                                         concurrency=20, poll_interval=0.001)
+        client = Client('memory:///')
+        running = []
+        handled = []
+        contexts = []
+
+        handle = microservice.queue('async')(
+            sleeping_handler(running, handled, contexts))
+
+        @microservice.queue('async_noack', autoack=False, concurrency=2)
+        def handle_noack(payload, context):
+            contexts.append(context)
+            context.message.reject()
+
+        with self.assertRaises(ValueError):
+            microservice.queue('async_batch', batch_size=10)(handle)
+
+        run_thread = Thread(target=microservice.run)
+        run_thread.start()
+        client.publish_many('async', [{'value': i} for i in range(20)])
+        client.publish_to_queue('async_noack', {'value': 'noack'})
+
+        start = time.time()
+        while len(handled) < 20 or len(contexts) < 21:
+            if time.time() - start > 5:  # pragma: no cover
+                microservice.stop()
+                raise AssertionError('Timeout error')
+            time.sleep(0.01)
+        # all handlers were run at the same time, not one by one
+        self.assertLess(time.time() - start, 2)
+        client.publish_to_queue('async', {'value': 'last'})
+        while 'last' not in [p['value'] for p in running]:
+            if time.time() - start > 5:  # pragma: no cover
+                microservice.stop()
+                raise AssertionError('Timeout error')
+            time.sleep(0.01)
+        microservice.stop()
+        run_thread.join(timeout=10)
+        self.assertTrue(microservice.stopped)
+        self.assertEqual(len(handled), 21)
+        self.assertTrue(all(context.message.acknowledged
+                            for context in contexts))
+
+
+class TestClient(unittest.TestCase):
+    def test_batch(self):
+        import logging
+        from microservices.queues.service import Microservice
+        from microservices.queues.client import Client, PublishError
+
+        microservice = Microservice('memory:///', timeout=0.01)
+        client = Client('memory:///')
+
+        received = []
+
+        @microservice.queue('batch')
+        def handle(data, context):
+            received.append(data)
+
+        @microservice.queue('batch_exchange')
+        def handle_exchange(data, context):
+            received.append(data)
+
+        count = client.publish_many('batch', ['data_{}'.format(i) for i in range(10)])
+        self.assertEqual(count, 10)
+
+        client.declare_exchange('batch_input', queues=[('batch_exchange', 'one')])
+        with client.batch() as batch:
+            batch.publish_to_queue('batch', 'data_10')
+            batch.publish_to_exchange('batch_input', 'one', 'data_11')
+        self.assertEqual(batch.published, 2)
+
+        for _ in range(60):
+            microservice.read()
+            if len(received) == 12:
+                break
+        self.assertEqual(sorted(received),
+                         sorted(['data_{}'.format(i) for i in range(12)]))
+        client.delete_exchange('batch_input')
+
+        class Handler(logging.Handler):
+            def emit(self, record):
+                records.append((record.levelno, record.getMessage()))
+
+        records = []
+        logger = logging.getLogger('test_batch_client')
+        logger.addHandler(Handler())
+        client.logger.logger = logger
+        with self.assertRaises(PublishError) as error:
+            client.publish_many('batch', ['data_12', object(), 'data_13'])
+        self.assertEqual(error.exception.published, 1)
+        # failed batch is not logged as published
+        messages = [message for level, message in records if level >= logging.INFO]
+        self.assertEqual(len(messages), 1)
+        self.assertIn('Batch failed after 1 published messages', messages[0])
+        self.assertEqual(records[-1][0], logging.ERROR)
+
+    def test_confirmed(self):
+        import time
+        from microservices.queues.client import Client
+        from microservices.queues.confirms import ConfirmError
+
+        client = Client('memory:///')
+        done = []
+
+        with client.confirmed(window=2, callback=done.append) as publisher:
+            futures = [publisher.publish_to_queue('confirmed', i) for i in range(5)]
+            error_future = publisher.publish_to_queue('confirmed', object())
+        self.assertFalse(publisher.confirms)
+        self.assertEqual([future.result() for future in futures], [1, 2, 3, 4, 5])
+        self.assertIsInstance(error_future.exception(), ConfirmError)
+        self.assertEqual(len(done), 6)
+        self.assertEqual((publisher.published, publisher.confirmed, publisher.failed), (6, 5, 1))
+        client.purge_queue('confirmed')
+
+        # broker with confirms: acks are delivered only when publisher drains events
+        publisher = client.confirmed(window=3, timeout=0.1).open()
+        publisher.confirms = True
+        max_in_flight = []
+
+        def drain(timeout):
+            max_in_flight.append(publisher.in_flight)
+            tags = list(publisher.pending)
+            if tags[0] == 5:
+                publisher.on_nack(5)
+            elif tags[0] < 7:
+                publisher.on_ack(tags[1], multiple=True)
+
+        publisher.drain = drain
+        futures = [publisher.publish_to_queue('confirmed', i) for i in range(8)]
+        self.assertEqual(max(max_in_flight), 3)
+        self.assertFalse(publisher.wait())
+        publisher.close()
+        self.assertEqual([future.result() for future in futures[:4]], [1, 2, 3, 4])
+        self.assertEqual(str(futures[4].exception()), 'Message was nacked by broker')
+        self.assertEqual(futures[5].result(), 6)
+        self.assertEqual(str(futures[7].exception()), 'Confirm timeout')
+        self.assertEqual(publisher.in_flight, 0)
+        client.purge_queue('confirmed')
+
+        # message is not serialized, broker does not use its delivery tag
+        publisher = client.confirmed(timeout=0.1).open()
+        publisher.confirms = True
+        publisher.drain = lambda timeout: publisher.on_ack(1)
+        error_future = publisher.publish_to_queue('confirmed', object())
+        future = publisher.publish_to_queue('confirmed', 'data')
+        start = time.time()
+        self.assertTrue(publisher.wait())
+        publisher.close()
+        self.assertLess(time.time() - start, 0.1)
+        self.assertIsInstance(error_future.exception(), ConfirmError)
+        self.assertEqual(future.result(), 1)
+        self.assertEqual((publisher.published, publisher.confirmed, publisher.failed),
+                         (2, 1, 1))
+        client.purge_queue('confirmed')
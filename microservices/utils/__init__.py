@@ -1,7 +1,11 @@
-import collections
 import six
 import time
 
+try:
+    from collections.abc import Iterable, Mapping
+except ImportError:  # pragma: no cover
+    from collections import Iterable, Mapping
+
 try:
     import gevent
     use_gevent = True
@@ -44,7 +48,7 @@ def dict_update(d, u):
     :return: new dict
     """
     for k, v in six.iteritems(u):
-        if isinstance(v, collections.Mapping):
+        if isinstance(v, Mapping):
             r = dict_update(d.get(k, {}), v)
             d[k] = r
         else:
@@ -53,7 +57,7 @@ def dict_update(d, u):
 
 
 def is_iterable(obj):  # pragma: no cover
-    return isinstance(obj, collections.Iterable)
+    return isinstance(obj, Iterable)
 
 
 class GeventSleep(object):
@@ -0,0 +1,59 @@
+"""Helpers for benchmarks: local keep-alive http server and timers"""
+import json
+import threading
+import time
+
+from six.moves import BaseHTTPServer, socketserver
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    body = json.dumps({'response': 'ok'}).encode('utf8')
+
+    def _answer(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _answer
+
+    def log_message(self, *args, **kwargs):
+        pass
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def start_server(address='127.0.0.1', port=0, body=None):
+    """Start local http server in thread
+
+    :param body: bytes, body for every response
+    :return: (server, endpoint)
+    """
+    handler = _Handler
+    if body is not None:
+        handler = type('Handler', (_Handler,), {'body': body})
+    server = _Server((address, port), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    endpoint = 'http://{}:{}'.format(*server.server_address[:2])
+    return server, endpoint
+
+
+def bench(name, func, count):
+    """Call func count times and print calls per second"""
+    start = time.time()
+    for _ in range(count):
+        func()
+    duration = time.time() - start
+    print('{:<40} {:>10.0f} calls/s {:>10.3f} ms/call'.format(
+        name, count / duration, duration * 1000.0 / count))
+    return duration
@@ -0,0 +1,36 @@
+"""Compare per-call connections with pooled keep-alive connections
+
+python testing/bench_http_pool.py [count]
+"""
+import sys
+
+import requests
+
+from bench_helpers import start_server, bench
+from microservices.http.client import Client
+
+
+class UnpooledClient(Client):
+    """Client before pooling: new connection for every request"""
+
+    def send(self, method, url, **kwargs):
+        return requests.request(method, url, **kwargs)
+
+
+def main(count=2000):
+    server, endpoint = start_server()
+    unpooled = UnpooledClient(endpoint)
+    pooled = Client(endpoint)
+    recycled = Client(endpoint, max_requests_per_connection=100)
+    try:
+        bench('new connection per request', lambda: unpooled.get(key='response'), count)
+        bench('keep-alive pool', lambda: pooled.get(key='response'), count)
+        bench('keep-alive pool, recycle per 100', lambda: recycled.get(key='response'), count)
+    finally:
+        pooled.close()
+        recycled.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,57 @@
+"""Calls per second for InstanceLogger, before and after lazy messages
+
+python testing/bench_logs.py [count]
+"""
+import io
+import logging
+import sys
+
+from bench_helpers import bench
+from microservices.helpers.logs import InstanceLogger
+
+
+class LegacyInstanceMessage(object):
+
+    def __init__(self, instance, logger, name, delimiter):
+        self.instance = instance
+        self.name = name
+        self.logger = logger
+        self.delimiter = delimiter
+
+    def __call__(self, message, *args, **kwargs):
+        msg = getattr(self.logger, self.name)
+        msg('{}{}{}'.format(self.instance, self.delimiter, message), *args, **kwargs)
+
+
+class LegacyInstanceLogger(InstanceLogger):
+    """InstanceLogger before lazy messages, message is formatted for every call"""
+
+    def __getattribute__(self, item):
+        if item in ('debug', 'info'):
+            return LegacyInstanceMessage(self.instance, self.logger, item,
+                                         self.delimiter)
+        return object.__getattribute__(self, item)
+
+
+class Instance(object):
+    def __str__(self):
+        return '<client: http://localhost:5000>'
+
+
+def main(count=200000):
+    logger = logging.getLogger('bench_logs')
+    logger.propagate = False
+    logger.addHandler(logging.StreamHandler(io.StringIO()))
+    logger.setLevel(logging.INFO)
+    for name, logger_class in (('before', LegacyInstanceLogger),
+                               ('after', InstanceLogger)):
+        instance_logger = logger_class(Instance(), logger)
+        bench('{}: debug, disabled'.format(name),
+              lambda: instance_logger.debug('Url %s built', 'url'), count)
+        bench('{}: info, enabled'.format(name),
+              lambda: instance_logger.info('Request %s for %s', 'GET', 'url'),
+              count // 10)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
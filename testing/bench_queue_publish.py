@@ -0,0 +1,34 @@
+"""Compare per-message publishing with batch publishing on memory transport
+
+python testing/bench_queue_publish.py [count]
+"""
+import logging
+import sys
+import time
+
+from microservices.queues.client import Client
+
+
+def main(count=20000):
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger('microservices.queues.client').setLevel(logging.WARNING)
+    client = Client('memory:///')
+    messages = [{'event': i} for i in range(count)]
+
+    start = time.time()
+    for message in messages:
+        client.publish_to_queue('bench_single', message)
+    single = time.time() - start
+    client.purge_queue('bench_single')
+
+    start = time.time()
+    client.publish_many('bench_batch', messages)
+    batch = time.time() - start
+    client.purge_queue('bench_batch')
+
+    print('publish_to_queue: {:>10.0f} messages/s'.format(count / single))
+    print('publish_many:     {:>10.0f} messages/s'.format(count / batch))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
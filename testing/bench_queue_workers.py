@@ -0,0 +1,61 @@
+"""Throughput and latency of worker pool acks on memory transport
+
+Compare consumer loop, which waits results only after drain_events timeout (before),
+and loop with completion queue (after).
+
+python testing/bench_queue_workers.py [count]
+"""
+import sys
+import threading
+import time
+
+from microservices.queues.client import Client
+from microservices.queues.service import Microservice
+
+
+class LegacyMicroservice(Microservice):
+    """Consumer loop before completion queue"""
+
+    def wait_events(self):
+        self.connection.drain_events(timeout=self.drain_timeout)
+
+
+def run(service_class, workers, count, handler_time=0.002):
+    queue = 'bench_workers_{}_{}'.format(service_class.__name__, workers)
+    service = service_class('memory:///', timeout=0.1, workers=workers)
+    latencies = []
+    done = threading.Event()
+
+    @service.queue(queue)
+    def handle(payload, context):
+        time.sleep(handler_time)
+        latencies.append(time.time() - payload['sent'])
+        if len(latencies) == count:
+            done.set()
+
+    thread = threading.Thread(target=service.run)
+    thread.start()
+    client = Client('memory:///')
+    start = time.time()
+    with client.batch() as batch:
+        for _ in range(count):
+            batch.publish_to_queue(queue, {'sent': time.time()})
+    done.wait(300)
+    duration = time.time() - start
+    service.stop()
+    thread.join()
+    latencies.sort()
+    print('{:<20} workers: {:>3} {:>8.0f} messages/s, p50: {:>7.1f} ms, p99: {:>7.1f} ms'.format(
+        service_class.__name__, workers, count / duration,
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.99)] * 1000))
+
+
+def main(count=500):
+    for workers in (1, 4, 16):
+        run(LegacyMicroservice, workers, count)
+        run(Microservice, workers, count)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,66 @@
+"""Startup time for registration of resource routes, before and after rules index
+
+The rest of the time is compilation of rules by werkzeug, it's linear
+
+python testing/bench_routes.py [routes]
+"""
+import logging
+import sys
+import time
+from functools import reduce
+
+from flask_api import FlaskAPI
+
+from microservices.http.resources import ResourceMarker
+from microservices.http.service import Microservice
+
+
+class LegacyMicroservice(Microservice):
+    """Microservice.add_url_rule before rules index, url_map is scanned for every rule"""
+
+    def add_url_rule(self, rule, endpoint=None, view_func=None, **options):
+        resource = options.pop('resource_marker', options.pop('resource', None))
+        FlaskAPI.add_url_rule(self, rule, endpoint=endpoint,
+                              view_func=view_func, **options)
+        if resource is not None:
+            rule_infos = [
+                rule_info
+                for rule_info in self.url_map.iter_rules()
+                if rule_info.rule == rule
+            ]
+            methods = list(set(reduce(
+                lambda i, j: list(i) + list(j),
+                [rule_info.methods for rule_info in rule_infos])))
+            endpoints = reduce(
+                lambda i, j: [i, j],
+                [rule_info.endpoint for rule_info in rule_infos])
+            if not isinstance(endpoints, list):
+                endpoints = [endpoints]
+            self.add_resource(resource, rule, endpoints=endpoints,
+                              methods=methods)
+
+
+def register(app_class, routes):
+    app = app_class(__name__)
+    start = time.time()
+    for index in range(routes):
+        path = '/resource_{}/<int:id>/'.format(index)
+        app.add_url_rule(path, 'get_{}'.format(index), lambda id: {},
+                         methods=['GET'], resource=ResourceMarker())
+        app.add_url_rule(path, 'update_{}'.format(index), lambda id: {},
+                         methods=['PUT', 'DELETE'], resource=ResourceMarker())
+    return time.time() - start
+
+
+def main(routes=3000):
+    logging.basicConfig(level=logging.ERROR)
+    for name, app_class in (('before', LegacyMicroservice),
+                            ('after', Microservice)):
+        duration = register(app_class, routes)
+        print('{:<40} {:>10.3f} s {:>10.3f} ms/route'.format(
+            '{}: {} resources, {} rules'.format(name, routes, routes * 2),
+            duration, duration * 1000.0 / (routes * 2)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,86 @@
+"""Calls per second for json serializers on typical resource payloads
+
+Serializers: "json" (standard json module), "orjson" if installed,
+render - full MicroserviceJSONRenderer pipeline via flask test client
+
+python testing/bench_serializers.py [count]
+"""
+import datetime
+import logging
+import sys
+
+from bench_helpers import bench
+from microservices.helpers.serializers import get_serializer, serializers
+from microservices.http.renderers import json_default
+from microservices.http.resources import ResourceMarker, ResourceSchema
+from microservices.http.service import Microservice
+
+
+def user(index):
+    return {
+        'id': index,
+        'name': u'user {}'.format(index),
+        'email': 'user{}@example.com'.format(index),
+        'active': index % 2 == 0,
+        'rating': index / 7.0,
+        'created': datetime.datetime(2016, 6, 20, 14, 2, 50),
+        'tags': ['one', 'two', 'three'],
+        'address': {'city': u'Москва', 'street': 'Tverskaya', 'house': index},
+    }
+
+
+payloads = {
+    'small': {'response': 'ok', 'status': 200},
+    'resource': user(1),
+    'list of 100 resources': {'response': [user(index) for index in range(100)]},
+    'resources index': {
+        'resources': {
+            '/resource_{}/<int:id>/'.format(index): {
+                'methods': ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'HEAD'],
+                'url': 'http://localhost:5000/resource_{}/'.format(index),
+            }
+            for index in range(200)
+        },
+    },
+}
+
+
+def installed():
+    for name in serializers:
+        try:
+            yield name, get_serializer(name, default=json_default)
+        except ImportError:
+            print('{} is not installed'.format(name))
+
+
+def create_app(serializer):
+    app = Microservice(__name__)
+    app.config['JSON_SERIALIZER'] = serializer
+
+    @app.route('/', resource=ResourceMarker(
+        schema=ResourceSchema(response='response', status_code='status_code')))
+    def users():
+        return payloads['list of 100 resources']
+
+    return app
+
+
+def main(count=10000):
+    logging.basicConfig(level=logging.ERROR)
+    serializers = list(installed())
+    for payload_name, payload in payloads.items():
+        for name, serializer in serializers:
+            content = serializer.dumps_bytes(payload)
+            bench('{}: dumps_bytes({})'.format(name, payload_name),
+                  lambda: serializer.dumps_bytes(payload), count)
+            bench('{}: loads({})'.format(name, payload_name),
+                  lambda: serializer.loads(content), count)
+    for name, _ in serializers:
+        client = create_app(name).test_client()
+        bench('{}: render 100 resources'.format(name),
+              lambda: client.get('/', headers={'Accept': 'application/json'}),
+              max(count // 10, 1))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,94 @@
+"""Startup and request time, before and after cached MicroserviceAPISettings
+
+python testing/bench_settings.py [count]
+"""
+import logging
+import sys
+import time
+
+from flask_api import settings
+
+from bench_helpers import bench
+from microservices.http.renderers import MicroserviceJSONRenderer, \
+    MicroserviceBrowsableAPIRenderer
+from microservices.http.resources import ResourceMarker, ResourceSchema
+from microservices.http.service import Microservice
+from microservices.http.settings import MicroserviceAPISettings
+
+
+class LegacySettings(MicroserviceAPISettings):
+    """MicroserviceAPISettings before caching, values are resolved on every access"""
+
+    @property
+    def IN_RESOURCES(self):
+        return self.user_config.get('IN_RESOURCES', ['methods', 'url'])
+
+    @property
+    def DEFAULT_PARSERS(self):
+        default = [
+            'flask_api.parsers.JSONParser',
+            'flask_api.parsers.URLEncodedParser',
+            'flask_api.parsers.MultiPartParser'
+        ]
+        val = self.user_config.get('DEFAULT_PARSERS', default)
+        return settings.perform_imports(val, 'DEFAULT_PARSERS')
+
+    @property
+    def DEFAULT_RENDERERS(self):
+        default = [
+            MicroserviceJSONRenderer,
+            MicroserviceBrowsableAPIRenderer,
+        ]
+        val = self.user_config.get('DEFAULT_RENDERERS', default)
+        return settings.perform_imports(val, 'DEFAULT_RENDERERS')
+
+    @property
+    def SCHEMA(self):
+        default = ResourceSchema()
+        user_schema = self.user_config.get('SCHEMA', default)
+        default.update(user_schema)
+        return default
+
+
+def create_app(settings_class, routes=300):
+    app = Microservice(__name__)
+    app.api_settings = settings_class(app.config)
+    # string settings, like in config files
+    app.config['DEFAULT_PARSERS'] = [
+        'flask_api.parsers.JSONParser',
+        'flask_api.parsers.URLEncodedParser',
+    ]
+    app.config['DEFAULT_RENDERERS'] = [
+        'microservices.http.renderers.MicroserviceJSONRenderer',
+        'microservices.http.renderers.MicroserviceBrowsableAPIRenderer',
+    ]
+    for index in range(routes):
+        app.add_url_rule('/resource_{}/'.format(index),
+                         'resource_{}'.format(index),
+                         lambda: {'response': 'ok'},
+                         resource=ResourceMarker())
+    return app
+
+
+def main(count=10000):
+    logging.basicConfig(level=logging.ERROR)
+    for name, settings_class in (('before', LegacySettings),
+                                 ('after', MicroserviceAPISettings)):
+        start = time.time()
+        app = create_app(settings_class)
+        print('{:<40} {:>10.3f} ms'.format(
+            '{}: startup, 300 resources'.format(name),
+            (time.time() - start) * 1000.0))
+        api_settings = app.api_settings
+        bench('{}: DEFAULT_RENDERERS'.format(name),
+              lambda: api_settings.DEFAULT_RENDERERS, count)
+        bench('{}: SCHEMA'.format(name), lambda: api_settings.SCHEMA, count)
+        client = app.test_client()
+        bench('{}: request'.format(name),
+              lambda: client.get('/resource_1/',
+                                 headers={'Accept': 'application/json'}),
+              max(count // 10, 1))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
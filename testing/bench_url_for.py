@@ -0,0 +1,72 @@
+"""Calls per second for Client.url_for, before and after url cache
+
+python testing/bench_url_for.py [count]
+"""
+import logging
+import sys
+
+import six
+import six.moves.urllib.parse as urlparse
+from six.moves.urllib.parse import urlencode
+
+from bench_helpers import bench
+from microservices.http.client import Client
+
+
+class LegacyClient(Client):
+    """Client.url_for before precomputed endpoint and url cache"""
+
+    def build_resource(self, resources):
+        resource = '/'.join(resources)
+        self.logger.debug('Resource "%s" built from %s', resource, resources)
+        return resource
+
+    def url_for(self, resource='', query=None, params='', fragment='',
+                keep_blank_values=None):
+        parsed_url = list(urlparse.urlparse(self.endpoint))
+        if resource:
+            path = self.path + '/' + resource
+        else:
+            path = self.path
+        if self.close_slash:
+            if not path.endswith('/'):
+                path += '/'
+        if not params:
+            params = self.params
+        if not fragment:
+            fragment = self.fragment
+        parsed_url[2] = path
+        parsed_url[3] = params
+        parsed_url[5] = fragment
+        if self.query:
+            parsed_url[4] = urlencode(self.query, doseq=1)
+        if query is not None:
+            if keep_blank_values is None:
+                keep_blank_values = self.keep_blank_values
+            if isinstance(query, six.string_types):
+                query = urlparse.parse_qs(query,
+                                          keep_blank_values=keep_blank_values)
+            req_query = dict(self.query)
+            req_query.update(query)
+            req_query = urlencode(req_query, doseq=1)
+            parsed_url[4] = req_query
+        url = urlparse.urlunparse(parsed_url)
+        self.logger.debug('Url %s built for resource "%s"', url, resource)
+        return url
+
+
+def main(count=100000):
+    logging.basicConfig(level=logging.INFO)
+    endpoint = 'http://localhost:5000/api/v1/?token=secret'
+    resources = ('users', '1', 'orders')
+    for name, client in (('before', LegacyClient(endpoint)),
+                         ('after', Client(endpoint))):
+        bench('{}: url_for(resource)'.format(name),
+              lambda: client.url_for(client.build_resource(resources)), count)
+        bench('{}: url_for(resource, query)'.format(name),
+              lambda: client.url_for(client.build_resource(resources),
+                                     {'page': 2}), count)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])